@@ -15,9 +15,11 @@ VALID_CATEGORIES = [
     "learning Thai", "writing academic papers", "budgeting app", "Personal"
 ]
 
-from rag_agent import RAGAgent
+from task_links import get_task_linker
+from indexing_daemon import start_background_indexer
 from book_agent import BookAgent
 from travel_agent import TravelAgent
+from intervals import describe_calendar
 
 # Load model activation from .config
 MODELS_ENABLED = {
@@ -115,26 +117,33 @@ def openclaw_generate(prompt, model="gpt-3.5-turbo"):
     except Exception as e:
         return f"Error calling OpenClaw: {e}"
 
-def generate_schedule(tasks, busy_slots, morning_mode=False, workspace_dir=None, logseq_dir=None):
+def generate_schedule(tasks, busy_slots, morning_mode=False, workspace_dir=None, logseq_dir=None, index_wait=None, dates=None):
     """
-    Sends tasks and busy slots to the AI to generate a daily schedule.
+    Sends tasks and busy slots to the AI to generate a daily schedule. The calendar
+    shown covers `dates`, by default the day being planned (tomorrow once today's
+    workday is over).
+
+    Interactive callers never wait on indexing. Callers with no file watcher running
+    (cron) pass index_wait: the notes are then caught up by the background indexer
+    first, for at most that many seconds.
     """
     model_to_use = get_routing("scheduling")
     
     rag_context = ""
     if workspace_dir or logseq_dir:
         try:
-            rag_agent = RAGAgent(workspace_dir, logseq_dir)
-            if rag_agent.collection.count() == 0:
-                rag_agent.index_vault()
-            
-            unique_contexts = []
-            for t in tasks[:5]:
-                task_name = t['task'] if isinstance(t, dict) else t
-                ctx = rag_agent.query_context(task_name, n_results=1)
-                if ctx and ctx not in unique_contexts:
-                    unique_contexts.append(ctx)
-            rag_context = "\n".join(unique_contexts)
+            linker = get_task_linker(workspace_dir, logseq_dir)
+            if index_wait:
+                if not start_background_indexer(workspace_dir, logseq_dir).wait_until_drained(index_wait):
+                    print(f"⚠️ Notes index still catching up after {index_wait:.0f}s, planning with it as it is.")
+            elif linker.search.source("markdown_notes").agent.is_empty():
+                # Never index inline: let the background indexer build it for next time
+                start_background_indexer(workspace_dir, logseq_dir)
+
+            # Notes and book passages for the top tasks come from the links the indexer
+            # precomputed (recent journal notes weighted up); only new tasks are searched
+            linker.track(tasks)
+            rag_context = linker.context(tasks[:5], n_results=5)
         except Exception as e:
             print(f"⚠️ RAG Agent error: {e}")
 
@@ -144,6 +153,9 @@ def generate_schedule(tasks, busy_slots, morning_mode=False, workspace_dir=None,
     dw_end = get_config_value("DEEP_WORK_END", "12:00")
     focus_cats = get_config_value("FOCUS_CATEGORIES", "")
 
+    # Merged busy time and precomputed free windows instead of raw event dicts
+    calendar_text = describe_calendar(busy_slots, dates=dates)
+
     mode_instruction = ""
     if morning_mode:
         mode_instruction = f"This is a MORNING PLANNING session. Chronotype: {chronotype}. Deep Work Window: {dw_start}-{dw_end}."
@@ -155,7 +167,8 @@ def generate_schedule(tasks, busy_slots, morning_mode=False, workspace_dir=None,
     USER PROFILE: Chronotype={chronotype}, Deep Work={dw_start}-{dw_end}, Focus={focus_cats}
 
     TASKS: {json.dumps(tasks)}
-    BUSY SLOTS: {json.dumps(busy_slots)}
+    CALENDAR (local time): {calendar_text}
+    Only schedule tasks inside the free windows.
     CONTEXT: {rag_context}
     
     OUTPUT FORMAT: Return a JSON object with a "schedule" array. Each item must have "task", "category", "start" (ISO8601), and "end" (ISO8601).
@@ -10,6 +10,7 @@ from observer import update_markdown_plan
 from config_utils import get_config_value
 from calendar_agent import CalendarAgent
 from planning_agent import PlanningAgent
+from focus_analytics import get_focus_store, refresh_focus_analytics
 
 # Load HF_TOKEN into environment if present
 get_config_value("HF_TOKEN", None)
@@ -151,42 +152,39 @@ with col_h2:
             tasks = get_unified_tasks(obsidian_file)
             service = calendar_manager.get_calendar_service()
             calendar_agent = CalendarAgent()
-            busy_slots = calendar_agent.get_busy_slots_from_yml()
+            busy_slots = calendar_agent.get_fresh_busy_slots()
             result = ai_orchestration.generate_schedule(tasks, busy_slots, workspace_dir=obsidian_file, logseq_dir=logseq_dir)
             if result and "schedule" in result:
                 planning_agent = PlanningAgent(service, cal_id)
-                planning_agent.execute_plan(result["schedule"], obsidian_file)
+                planning_agent.execute_plan(result["schedule"], obsidian_file, replace=True)
                 st.success("Sync complete!")
                 st.rerun()
 
 # --- Analytics Section ---
 st.header("📊 Focus Analytics")
-service = calendar_manager.get_calendar_service()
-if service:
-    managed_events = calendar_manager.get_managed_events(service, calendar_id=cal_id)
-    if managed_events:
-        # Calculate time per category (dummy logic for categories if not in managed_events)
-        # In a real app, we'd pull category from extendedProperties or similar
-        cat_data = {}
-        for event in managed_events:
-            start = datetime.datetime.fromisoformat(event['start'].replace('Z', ''))
-            end = datetime.datetime.fromisoformat(event['end'].replace('Z', ''))
-            duration = (end - start).total_seconds() / 3600
-            cat = "General" # Default
-            # Attempt to guess category from title
-            for c in ["winedragons", "dev", "writing", "learning"]:
-                if c in event['task'].lower(): cat = c.title()
-            
-            cat_data[cat] = cat_data.get(cat, 0) + duration
-        
-        df_chart = pd.DataFrame(list(cat_data.items()), columns=['Category', 'Hours'])
-        st.bar_chart(df_chart, x='Category', y='Hours', color="#4CAF50")
-    else:
-        st.info("No AI-managed events found for analytics yet.")
+# Pre-aggregated rollups kept by the calendar sync: no API calls on a rerun unless the
+# event store is stale (Streamlit runs no background sync)
+refresh_focus_analytics(cal_id, service=calendar_manager.get_calendar_service())
+focus_store = get_focus_store()
+period = st.radio("Period", ["Today", "This Week", "This Month"], horizontal=True)
+cat_data = {"Today": focus_store.day, "This Week": focus_store.week, "This Month": focus_store.month}[period]()
+if cat_data:
+    df_chart = pd.DataFrame(list(cat_data.items()), columns=['Category', 'Hours'])
+    st.bar_chart(df_chart, x='Category', y='Hours', color="#4CAF50")
+else:
+    st.info("No AI-managed events found for analytics yet.")
+
+trend = focus_store.trend(periods=8, by="week")
+if trend:
+    st.caption("Weekly focus hours by category")
+    df_trend = pd.DataFrame(trend, columns=['Week', 'Category', 'Hours']).pivot(index='Week', columns='Category', values='Hours').fillna(0)
+    st.line_chart(df_trend)
 
 st.divider()
 
 # --- Main Columns ---
+# Shared client (built once per process), used by the live calendar view below
+service = calendar_manager.get_calendar_service()
 left_col, right_col = st.columns([1, 1])
 
 with left_col:
@@ -303,7 +301,7 @@ with right_col:
                 
                 service = calendar_manager.get_calendar_service()
                 calendar_agent = CalendarAgent()
-                busy_slots = calendar_agent.get_busy_slots_from_yml()
+                busy_slots = calendar_agent.get_fresh_busy_slots()
                 result = ai_orchestration.generate_schedule(tasks_to_send, busy_slots, morning_mode=True, workspace_dir=obsidian_file, logseq_dir=logseq_dir)
                 if result:
                     st.session_state.suggested_schedule = result.get("schedule", [])
@@ -365,7 +363,7 @@ if prompt := st.chat_input("Ask me about your emails, calendar, or books..."):
                 # Gather context
                 service = calendar_manager.get_calendar_service()
                 calendar_agent = CalendarAgent()
-                busy_slots = calendar_agent.get_busy_slots_from_yml()
+                busy_slots = calendar_agent.get_fresh_busy_slots()
                 backlog = get_unified_tasks(obsidian_file)
                 
                 gmail_service = gmail_agent.get_gmail_service()
@@ -378,7 +376,11 @@ if prompt := st.chat_input("Ask me about your emails, calendar, or books..."):
                         filtered = gmail_agent.get_filtered_emails(gmail_service, filters)
                 
                 book_agent = BookAgent()
-                books_summary = book_agent.get_summary()
+                books_summary = book_agent.get_summary(compact=True)
+
+                # Relevant notes and book passages, searched in parallel
+                from federated_search import get_federated_search
+                relevant_context = get_federated_search(obsidian_file, logseq_dir).context(prompt)
 
                 context_payload = {
                     "backlog": backlog,
@@ -386,6 +388,7 @@ if prompt := st.chat_input("Ask me about your emails, calendar, or books..."):
                     "gmail_snoozed": snoozed,
                     "gmail_filtered": filtered,
                     "books_library": books_summary,
+                    "relevant_context": relevant_context,
                     "current_time": datetime.datetime.now().astimezone().isoformat()
                 }
 
@@ -1,134 +1,337 @@
 import os
-import json
-import datetime
+import shutil
+import threading
 from config_utils import get_config_value
-
-try:
-    import PyPDF2
-except ImportError:
-    PyPDF2 = None
-
-try:
-    import ebooklib
-    from ebooklib import epub
-    from bs4 import BeautifulSoup
-except ImportError:
-    ebooklib = None
-
-try:
-    import chromadb
-    from chromadb.utils import embedding_functions
-except ImportError:
-    chromadb = None
+from lexical_index import BM25Index, hybrid_retrieve
+from query_cache import query_cache, get_index_version, make_key
+from embedding_cache import get_embedding_function
+from vector_store import open_collection, get_vector_backend, backend_available, drop_collection, collection_exists
+from metadata_filter import build_where
+from index_generations import physical_name, get_collection_pointer, blue_green_rebuild
+from book_ingest import IngestPipeline, extractor_for, EXTRACTOR_VERSION
+from book_manifest import ManifestStore, file_hash, is_unchanged, recorded_path
+from book_catalog import get_catalog
+from book_text_store import open_book_text, remove_book_text
 
 class BookAgent:
     """
     Agent responsible for scanning, managing, and indexing books (PDFs, EPUBs, Images).
     """
-    def __init__(self, books_dir=None, db_path="vector_db"):
+    collection_name = "book_library"
+
+    def __init__(self, books_dir=None, db_path="vector_db", retrieval_mode=None, generation=None):
         self.books_dir = books_dir or get_config_value("BOOKS_DIR", None)
         self.supported_extensions = {".pdf", ".jpg", ".jpeg", ".png", ".webp", ".epub"}
         self.db_path = db_path
-        
-        if chromadb:
-            self.chroma_client = chromadb.PersistentClient(path=self.db_path)
-            self.embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
-            self.collection = self.chroma_client.get_or_create_collection(
-                name="book_library",
-                embedding_function=self.embedding_fn
+
+        # "hybrid" (BM25 + vectors), "vector" or "lexical" (BM25 only, never loads the embedding model)
+        self.retrieval_mode = (retrieval_mode or get_config_value("RAG_RETRIEVAL_MODE", "hybrid")).lower()
+        self.vector_backend = get_vector_backend()
+        if not backend_available(self.vector_backend):
+            self.retrieval_mode = "lexical"
+        self.hybrid_alpha = float(get_config_value("RAG_HYBRID_ALPHA", "0.5"))
+
+        # Bumped on every write so cached query results are never stale
+        self.index_version = get_index_version(self.db_path)
+
+        # Which generation of the collection to use; full re-indexes write a new one and
+        # switch the pointer. An explicit generation pins the agent to it (shadow builds).
+        self.pointer = get_collection_pointer(self.db_path)
+        self.pinned = generation is not None
+        self.generation = generation if self.pinned else self.pointer.current(self.collection_name)
+
+        # Persisted catalog of BOOKS_DIR (titles, index status); shared across instances
+        self.catalog = get_catalog(self.books_dir, self.db_path, self.supported_extensions) if self.books_dir else None
+
+        # The lexical index, manifests, vector store and embedding model are all
+        # loaded on first use, so summaries and title lookups stay cheap (the lock keeps
+        # threads racing for the first use from loading two copies)
+        self._load_lock = threading.Lock()
+        self._lexical_index = None
+        self._manifests = None
+        self.embedding_fn = None
+        self._collection = None
+
+    @property
+    def physical_name(self):
+        return physical_name(self.collection_name, self.generation)
+
+    @property
+    def lexical_index(self):
+        """BM25 index over the same passages as the vector store, kept in sync at index time."""
+        with self._load_lock:
+            if self._lexical_index is None:
+                self._lexical_index = BM25Index(os.path.join(self.db_path, f"{self.physical_name}_bm25.json"))
+            return self._lexical_index
+
+    @property
+    def manifests(self):
+        """Per-book manifests: content hash, progress and extractor version (skip / resume / dedupe)."""
+        with self._load_lock:
+            if self._manifests is None:
+                self._manifests = ManifestStore(os.path.join(self.db_path, physical_name("book_manifests", self.generation)))
+            return self._manifests
+
+    def sync_generation(self):
+        """Follows the pointer to the live generation after a rebuild was swapped in."""
+        if self.pinned:
+            return
+        current = self.pointer.current(self.collection_name)
+        if current != self.generation:
+            if self._lexical_index is not None:
+                self._lexical_index.save()
+            self.generation = current
+            self._lexical_index = None
+            self._manifests = None
+            self._collection = None
+
+    @classmethod
+    def drop_generation(cls, db_path, generation, backend=None):
+        """Deletes every file of one generation (BM25 index, manifests, vector collection)."""
+        name = physical_name(cls.collection_name, generation)
+        for suffix in ("_bm25.json", "_bm25.json.lock"):
+            path = os.path.join(db_path, f"{name}{suffix}")
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(os.path.join(db_path, physical_name("book_manifests", generation)), ignore_errors=True)
+        drop_collection(db_path, name, backend)
+
+    def is_empty(self):
+        """Cheap emptiness check against the lexical index (no model load)."""
+        self.sync_generation()
+        if self.lexical_index.count() == 0:
+            self._backfill_lexical()
+        return self.lexical_index.count() == 0
+
+    def _backfill_lexical(self):
+        """
+        Indexes built before the BM25 index existed only have vectors: their passages are
+        copied into a BM25 index once, instead of the library looking empty.
+        """
+        if (not self.use_vectors or os.path.exists(self.lexical_index.path)
+                or not collection_exists(self.db_path, self.physical_name, self.vector_backend)):
+            return
+        copied = self.lexical_index.fill_from(self.collection)
+        # Saved even when nothing was copied, so the vector store is only checked once
+        self.lexical_index.dirty = True
+        self.lexical_index.save()
+        if copied:
+            print(f"🔁 Copied {copied} passages from the vector store into the lexical index.")
+            self.index_version.bump(self.physical_name)
+            self.index_version.flush(self.physical_name)
+
+    @property
+    def use_vectors(self):
+        return self.retrieval_mode != "lexical"
+
+    @property
+    def collection(self):
+        """Opens the vector collection (VECTOR_BACKEND: chroma or numpy) on first use."""
+        if self._collection is None and self.use_vectors:
+            # Lightweight embedding model behind a persistent content-hash cache
+            self.embedding_fn = get_embedding_function(self.db_path)
+            self._collection = open_collection(self.db_path, self.physical_name, self.vector_backend)
+        return self._collection
+
+    def _upsert(self, doc_id, document, metadata):
+        """Writes a passage to the lexical index and, unless lexical-only, the vector store."""
+        self._upsert_many([doc_id], [document], [metadata])
+
+    def _upsert_many(self, ids, documents, metadatas, embeddings=None):
+        """Bulk version of _upsert; embeddings are computed here unless passed in."""
+        self.sync_generation()
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            self.lexical_index.upsert(doc_id, document, metadata)
+        if self.use_vectors:
+            self.collection.upsert(
+                documents=documents,
+                embeddings=embeddings if embeddings is not None else self.embedding_fn(documents),
+                metadatas=metadatas,
+                ids=ids
             )
-        else:
-            self.collection = None
+        self.index_version.bump(self.physical_name)
+
+    def _flush(self):
+        """Persists the lexical index and the new index version after a batch of writes."""
+        self.lexical_index.save()
+        self.index_version.flush(self.physical_name)
+
+    def _delete_book_passages(self, book_path):
+        """Removes every indexed passage that came from book_path."""
+        ids = [doc_id for doc_id, doc in self.lexical_index.docs.items()
+               if (doc["metadata"] or {}).get("path") == book_path]
+        if not ids:
+            return
+        for doc_id in ids:
+            self.lexical_index.delete(doc_id)
+        if self.use_vectors:
+            self.collection.delete(ids=ids)
+        self.index_version.bump(self.physical_name)
 
     def scan_books(self):
         """
-        Recursively scans the books directory and returns a list of book file paths.
+        Returns the books under BOOKS_DIR (name, relative_path, full_path, extension,
+        index status) from the catalog, which only re-lists directories that changed.
         """
-        if not self.books_dir or not os.path.exists(self.books_dir):
+        if not self.catalog:
             return []
+        return self.catalog.list()
+
+    def index_book(self, book_path, workers=None, force=False):
+        """
+        Indexes a book for deep search (BM25 + vectors) through the pipelined
+        ingestion: parallel extraction, chunking, batched embedding, bulk upsert.
 
-        books = []
-        for root, _, files in os.walk(self.books_dir):
-            for file in files:
-                ext = os.path.splitext(file)[1].lower()
-                if ext in self.supported_extensions:
-                    full_path = os.path.join(root, file)
-                    relative_path = os.path.relpath(full_path, self.books_dir)
-                    books.append({
-                        "name": file,
-                        "relative_path": relative_path,
-                        "full_path": full_path,
-                        "extension": ext
-                    })
-        return books
-
-    def index_book(self, book_path):
-        """
-        Reads a book page by page and indexes it into ChromaDB for deep search.
-        """
-        if not self.collection:
-            return "ChromaDB not available."
-        
+        A per-book manifest makes this resumable: unchanged books are skipped,
+        an interrupted run continues from the last committed page, and the same
+        file stored at a second path is not indexed twice. force=True re-indexes.
+        """
         if not os.path.exists(book_path):
             return f"File not found: {book_path}"
 
         ext = os.path.splitext(book_path)[1].lower()
         book_name = os.path.basename(book_path)
-        
-        print(f"📖 Indexing book: {book_name}...")
-        
-        pages_indexed = 0
+        if extractor_for(book_path)[0] is None:
+            return f"Unsupported or missing library for extension {ext}."
+
+        previous = self.manifests.for_path(book_path)
+        if not force and is_unchanged(previous, book_path, EXTRACTOR_VERSION):
+            return f"Skipped '{book_name}' (unchanged since last index)."
+
+        content_hash = file_hash(book_path)
+        if previous and previous["content_hash"] != content_hash:
+            # The file was edited or replaced: its old passages are stale
+            self._delete_book_passages(book_path)
+            self._forget_path(previous, book_path)
+
+        manifest = self.manifests.get(content_hash)
+        if manifest and manifest["extractor_version"] != EXTRACTOR_VERSION:
+            force = True
+        if manifest and not force:
+            if manifest["complete"]:
+                known = recorded_path(manifest, book_path) is not None
+                self.manifests.add_path(manifest, book_path)
+                if known:
+                    # Only the mtime moved (e.g. the file was touched or copied back)
+                    self._set_status(book_path, "indexed", manifest["sections"])
+                    return f"Skipped '{book_name}' (unchanged since last index)."
+                self._set_status(book_path, "duplicate", 0)
+                return f"Skipped '{book_name}' (same content as '{manifest['book']}', already indexed)."
+            if recorded_path(manifest, book_path) is None:
+                # Another path started this run (e.g. the file was moved mid-index): finish it
+                # here, and record the path so its passages are found and removed with the book
+                self.manifests.add_path(manifest, book_path)
+        elif manifest:
+            for path in list(manifest["paths"]):
+                self._delete_book_passages(path)
+            if manifest["extractor_version"] != EXTRACTOR_VERSION:
+                remove_book_text(self.db_path, content_hash, manifest["extractor_version"])
+            self.manifests.delete(content_hash)
+            manifest = None
+        if manifest is None:
+            manifest = self.manifests.create(content_hash, book_path, EXTRACTOR_VERSION)
+            self.manifests.save(manifest)
+
+        start_page = manifest["last_page_committed"] + 1
+        if start_page:
+            print(f"📖 Resuming book: {book_name} from page {start_page}...")
+        else:
+            print(f"📖 Indexing book: {book_name}...")
+
+        # Text extracted once per book version; a forced re-index reads it back instead of re-parsing
+        text = open_book_text(self.db_path, content_hash, EXTRACTOR_VERSION)
+
+        def commit(last_page):
+            # Text and passages must be on disk before the manifest claims them
+            text.flush()
+            self._flush()
+            manifest["last_page_committed"] = last_page
+            self.manifests.save(manifest)
+
+        pipeline = IngestPipeline(self, workers=workers)
         try:
-            if ext == ".pdf" and PyPDF2:
-                with open(book_path, 'rb') as f:
-                    reader = PyPDF2.PdfReader(f)
-                    for i, page in enumerate(reader.pages):
-                        text = page.extract_text()
-                        if text and len(text.strip()) > 50:
-                            doc_id = f"{book_name}_p{i}"
-                            self.collection.upsert(
-                                documents=[text],
-                                metadatas=[{"path": book_path, "page": i, "book": book_name}],
-                                ids=[doc_id]
-                            )
-                            pages_indexed += 1
-            elif ext == ".epub" and ebooklib:
-                book = epub.read_epub(book_path)
-                for i, item in enumerate(book.get_items_of_type(ebooklib.ITEM_DOCUMENT)):
-                    soup = BeautifulSoup(item.get_body_content(), 'html.parser')
-                    text = soup.get_text()
-                    if text and len(text.strip()) > 50:
-                        doc_id = f"{book_name}_i{i}"
-                        self.collection.upsert(
-                            documents=[text],
-                            metadatas=[{"path": book_path, "index": i, "book": book_name}],
-                            ids=[doc_id]
-                        )
-                        pages_indexed += 1
-            else:
-                return f"Unsupported or missing library for extension {ext}."
+            sections = pipeline.run(book_path, start_page=start_page, on_commit=commit, text_store=text)
         except Exception as e:
+            self._set_status(book_path, "partial", manifest["sections"])
             return f"Error indexing book: {e}"
+        finally:
+            # Persist whatever was indexed, even after a partial failure
+            text.flush()
+            self._flush()
+            if pipeline.stats:
+                print(f"📊 {pipeline.report()}")
+
+        text.finish(pipeline.total_pages)
+        manifest["page_count"] = pipeline.total_pages
+        manifest["last_page_committed"] = (pipeline.total_pages or 0) - 1
+        manifest["sections"] += sections
+        manifest["complete"] = True
+        self.manifests.save(manifest)
+        self._set_status(book_path, "indexed", manifest["sections"])
+        return f"Successfully indexed {sections} sections from '{book_name}'."
+
+    def _forget_path(self, manifest, book_path):
+        """Drops a path from its manifest, and the book's stored text once no path is left."""
+        self.manifests.remove_path(manifest, book_path)
+        if self.manifests.get(manifest["content_hash"]) is None:
+            remove_book_text(self.db_path, manifest["content_hash"])
+
+    def _set_status(self, book_path, status, sections=None):
+        if self.catalog:
+            self.catalog.set_status(book_path, status, sections)
 
-        return f"Successfully indexed {pages_indexed} sections from '{book_name}'."
+    def index_library(self, workers=None, force=False):
+        """
+        Indexes every PDF and EPUB under BOOKS_DIR, skipping books that have not
+        changed, and drops passages of books that were removed. Returns status messages.
+
+        force=True rebuilds the whole library into a shadow generation and swaps it
+        in atomically when done; searches keep using the previous index meanwhile.
+        """
+        if force and not self.pinned:
+            results = []
+            blue_green_rebuild(
+                BookAgent, self.db_path,
+                lambda generation: BookAgent(books_dir=self.books_dir, db_path=self.db_path,
+                                             retrieval_mode=self.retrieval_mode, generation=generation),
+                lambda shadow: results.extend(shadow.index_library(workers=workers, force=True))
+            )
+            self.sync_generation()
+            return results
 
-    def search_books(self, query, n_results=5):
+        self.sync_generation()
+        books = [b for b in self.scan_books() if b["extension"] in {".pdf", ".epub"}]
+        results = []
+        for book in books:
+            msg = self.index_book(book["full_path"], workers=workers, force=force)
+            print(f"  {msg}")
+            results.append(msg)
+
+        present = {b["full_path"] for b in books}
+        for manifest in self.manifests.all():
+            for path in list(manifest["paths"]):
+                if path not in present and not os.path.exists(path):
+                    self._delete_book_passages(path)
+                    self._forget_path(manifest, path)
+                    msg = f"Removed '{os.path.basename(path)}' (no longer in the library)."
+                    print(f"  {msg}")
+                    results.append(msg)
+        self._flush()
+        return results
+
+    def search_books(self, query, n_results=5, book=None, path_prefix=None):
         """
-        Searches through indexed books for relevant passages.
+        Searches through indexed books for relevant passages,
+        optionally within one book (file name) or a folder of BOOKS_DIR.
         """
-        if not self.collection or self.collection.count() == 0:
+        if self.is_empty():
             return "No books indexed for deep search yet."
 
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results
-        )
+        hits = self.retrieve(query, n_results=n_results, book=book, path_prefix=path_prefix)
 
         search_report = f"\n📚 DEEP SEARCH RESULTS FOR: '{query}'\n"
-        documents = results.get('documents', [[]])[0]
-        metadatas = results.get('metadatas', [[]])[0]
-        
-        for doc, meta in zip(documents, metadatas):
+        for hit in hits:
+            doc, meta = hit['document'], hit['metadata']
             book = meta.get('book', 'Unknown Book')
             location = f"Page {meta.get('page')}" if 'page' in meta else f"Section {meta.get('index')}"
             snippet = doc[:400].replace("\n", " ")
@@ -136,65 +339,107 @@ class BookAgent:
             
         return search_report
 
-    def get_summary(self):
+    def retrieve(self, query, n_results=5, book=None, path_prefix=None):
+        """
+        Returns ranked hits (dicts with id, document, metadata, score) for a query.
+        Results are cached until the next write to the index.
+        The book filter is pushed down to both indexes; path_prefix is a post-filter.
+        """
+        self.sync_generation()
+        where = build_where(book=book)
+        key = make_key(
+            (os.path.abspath(self.db_path), self.physical_name), query, n_results,
+            filters={"where": where, "path_prefix": path_prefix},
+            version=self.index_version.get(self.physical_name), mode=self.retrieval_mode
+        )
+        hits = query_cache.get(key)
+        if hits is not None:
+            return hits
+
+        collection = self.collection if self.use_vectors else None
+        alpha = 1.0 if self.retrieval_mode == "vector" else self.hybrid_alpha
+        hits = hybrid_retrieve(self.lexical_index, collection, query, n_results=n_results, alpha=alpha,
+                               embed_fn=self.embedding_fn, where=where, path_prefix=path_prefix)
+        query_cache.put(key, hits)
+        return hits
+
+    def get_summary(self, compact=False):
         """
         Returns a human-readable summary of the books found and indexing status.
+        compact=True gives one line for prompts: passages relevant to the question come
+        from federated search, so the prompt only needs to know what the library holds.
         """
-        books = self.scan_books()
-        if not books:
+        summary_data = self.catalog.summary() if self.catalog else None
+        if not summary_data or not summary_data["total"]:
             return "No books found or BOOKS_DIR not configured."
-        
-        summary = f"Found {len(books)} books in your library:\n"
-        # Group by extension
-        stats = {}
-        for b in books:
-            ext = b['extension']
-            stats[ext] = stats.get(ext, 0) + 1
-        
-        for ext, count in stats.items():
+
+        if compact:
+            recent = ", ".join(os.path.splitext(b["name"])[0] for b in summary_data["recent"][:5])
+            return (f"{summary_data['total']} books ({summary_data['indexed']} indexed for deep search). "
+                    f"Recent: {recent}.")
+
+        summary = f"Found {summary_data['total']} books in your library:\n"
+        for ext, count in summary_data["by_extension"].items():
             summary += f"- {ext.upper()}: {count} files\n"
-        
-        if self.collection:
-            indexed_count = self.collection.count()
-            summary += f"\nDeep Search Index: {indexed_count} passages stored.\n"
-        
-        # List first 10 books
+
+        if summary_data["sections"]:
+            summary += (f"\nDeep Search Index: {summary_data['sections']} passages stored "
+                        f"({summary_data['indexed']} books indexed).\n")
+
         summary += "\nRecent Books:\n"
-        for b in books[:10]:
+        for b in summary_data["recent"]:
             summary += f"- {b['name']} (Path: {b['full_path']})\n"
-        
+
         return summary
 
-    def read_book_content(self, book_path, max_chars=5000):
+    def _content_hash(self, book_path):
+        """Content hash from the manifest when the file is untouched, else by hashing it."""
+        manifest = self.manifests.for_path(book_path)
+        if manifest:
+            recorded = manifest["paths"].get(recorded_path(manifest, book_path))
+            stat = os.stat(book_path)
+            if recorded and recorded["size"] == stat.st_size and recorded["mtime"] == stat.st_mtime:
+                return manifest["content_hash"]
+        return file_hash(book_path)
+
+    def read_book_content(self, book_path, max_chars=5000, start=0):
         """
-        Extracts text content from a book file (PDF or EPUB).
+        Extracts text content from a book file (PDF or EPUB), from page/section start on.
+        Pages come from the extracted-text store when available; any page that is not
+        there yet is parsed once and added, so the next read (or index) can seek to it.
         """
         if not os.path.exists(book_path):
             return "File not found."
 
         ext = os.path.splitext(book_path)[1].lower()
-        content = ""
+        if ext in {".jpg", ".jpeg", ".png", ".webp"}:
+            return f"[Image File: {book_path}] Use visual AI to analyze this."
+        extract_fn = extractor_for(book_path)[0]
+        if extract_fn is None:
+            return f"Unsupported or missing library for extension {ext}."
 
+        content = ""
         try:
-            if ext == ".pdf" and PyPDF2:
-                with open(book_path, 'rb') as f:
-                    reader = PyPDF2.PdfReader(f)
-                    # Extract first few pages
-                    for page in reader.pages[:10]:
-                        content += page.extract_text() + "\n"
-                        if len(content) > max_chars:
-                            break
-            elif ext == ".epub" and ebooklib:
-                book = epub.read_epub(book_path)
-                for item in book.get_items_of_type(ebooklib.ITEM_DOCUMENT):
-                    soup = BeautifulSoup(item.get_body_content(), 'html.parser')
-                    content += soup.get_text() + "\n"
+            text = open_book_text(self.db_path, self._content_hash(book_path), EXTRACTOR_VERSION)
+            i = start
+            while len(content) <= max_chars and not (text.complete and i >= text.units):
+                pages = text.read(i, i + 8)
+                if not pages:
+                    # Not stored yet: extract (in order) from the first missing page
+                    first = text.units
+                    pages = extract_fn(book_path, first, first + 8)
+                    if not pages:
+                        text.finish(first)
+                        break
+                    for n, page_text in pages:
+                        text.append(n, page_text)
+                    text.flush()
+                    pages = [p for p in pages if p[0] >= i]
+                for n, page_text in pages:
+                    content += page_text + "\n"
+                    i = n + 1
                     if len(content) > max_chars:
                         break
-            elif ext in {".jpg", ".jpeg", ".png", ".webp"}:
-                return f"[Image File: {book_path}] Use visual AI to analyze this."
-            else:
-                return f"Unsupported or missing library for extension {ext}."
         except Exception as e:
             return f"Error reading book: {e}"
 
@@ -204,10 +449,24 @@ class BookAgent:
         """
         Searches for books matching the query string.
         """
-        books = self.scan_books()
-        matches = [b for b in books if query.lower() in b['name'].lower()]
-        return matches
+        if not self.catalog:
+            return []
+        return self.catalog.search(query)
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Book Agent: manage and index your library")
+    parser.add_argument("command", nargs="?", default="summary", choices=["summary", "index-library", "reindex"],
+                        help="'summary' (default), 'index-library' to index new or changed books in BOOKS_DIR, "
+                             "or 'reindex' to rebuild every book")
+    parser.add_argument("--changed", action="store_true", help="With 'reindex': only books that are new or changed")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: BOOK_INGEST_WORKERS)")
+    args = parser.parse_args()
+
     agent = BookAgent()
-    print(agent.get_summary())
+    if args.command in ("index-library", "reindex"):
+        force = args.command == "reindex" and not args.changed
+        results = agent.index_library(workers=args.workers, force=force)
+        print(f"✅ Processed {len(results)} books.")
+    else:
+        print(agent.get_summary())
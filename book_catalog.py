@@ -0,0 +1,225 @@
+import os
+import json
+import threading
+from file_utils import write_atomic
+
+def trigrams(text):
+    text = (text or "").lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class BookCatalog:
+    """
+    Persisted catalog of the books under BOOKS_DIR, stored at <db_path>/book_catalog.json.
+
+    Instead of walking the whole tree, refresh() stats every known directory and only
+    re-lists the ones whose mtime changed (a directory's mtime moves whenever an entry
+    is added, removed or renamed in it). Each book carries its index status, and a
+    trigram index over titles answers substring searches without scanning every name.
+    """
+    def __init__(self, books_dir, path, extensions):
+        self.books_dir = books_dir
+        self.path = path
+        self.extensions = set(extensions)
+        self.lock = threading.RLock()
+        self.books = {}      # full path -> {"name", "relative_path", "full_path", "extension", "size", "mtime", "status", "sections"}
+        self.dirs = {}       # directory -> mtime when it was last listed
+        self.trigrams = {}   # trigram -> set of full paths
+        self.file_mtime = None
+        self._summary = None
+        self.load()
+
+    # --- persistence -----------------------------------------------------
+
+    def load(self):
+        with self.lock:
+            self.books, self.dirs, self.trigrams = {}, {}, {}
+            self._summary = None
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.file_mtime = os.path.getmtime(self.path)
+            except (OSError, ValueError):
+                return
+            if data.get("books_dir") != self.books_dir:
+                return
+            self.dirs = data.get("dirs", {})
+            for book in data.get("books", {}).values():
+                self._add(book)
+
+    def save(self):
+        """Writes the catalog atomically (temp file + rename)."""
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            write_atomic(self.path, lambda f: json.dump({"books_dir": self.books_dir, "dirs": self.dirs, "books": self.books}, f),
+                         encoding='utf-8')
+            self.file_mtime = os.path.getmtime(self.path)
+
+    # --- maintenance -----------------------------------------------------
+
+    def _add(self, book):
+        self.books[book["full_path"]] = book
+        for gram in trigrams(book["name"]):
+            self.trigrams.setdefault(gram, set()).add(book["full_path"])
+        self._summary = None
+
+    def _remove(self, full_path):
+        book = self.books.pop(full_path, None)
+        if book:
+            for gram in trigrams(book["name"]):
+                paths = self.trigrams.get(gram)
+                if paths:
+                    paths.discard(full_path)
+                    if not paths:
+                        del self.trigrams[gram]
+            self._summary = None
+
+    def _scan_dir(self, directory):
+        """Re-lists one directory: adds and removes its books, descends into new subdirectories."""
+        try:
+            entries = list(os.scandir(directory))
+            self.dirs[directory] = os.stat(directory).st_mtime
+        except OSError:
+            self._drop_dir(directory)
+            return
+        seen = set()
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.path not in self.dirs:
+                    self._scan_dir(entry.path)
+                continue
+            ext = os.path.splitext(entry.name)[1].lower()
+            if ext not in self.extensions:
+                continue
+            seen.add(entry.path)
+            stat = entry.stat()
+            previous = self.books.get(entry.path, {})
+            self._add({
+                "name": entry.name,
+                "relative_path": os.path.relpath(entry.path, self.books_dir),
+                "full_path": entry.path,
+                "extension": ext,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "status": previous.get("status"),
+                "sections": previous.get("sections", 0),
+            })
+        for full_path in [p for p in self.books if os.path.dirname(p) == directory and p not in seen]:
+            self._remove(full_path)
+
+    def _drop_dir(self, directory):
+        """Forgets a directory that no longer exists, with everything below it."""
+        prefix = directory + os.sep
+        for d in [d for d in self.dirs if d == directory or d.startswith(prefix)]:
+            del self.dirs[d]
+        for full_path in [p for p in self.books if p.startswith(prefix)]:
+            self._remove(full_path)
+
+    def refresh(self):
+        """Brings the catalog up to date. Cheap: one stat per directory, no listing unless it changed."""
+        with self.lock:
+            # Pick up status written by another process (Streamlit, cron, CLI)
+            try:
+                if os.path.getmtime(self.path) != self.file_mtime:
+                    self.load()
+            except OSError:
+                pass
+
+            if not self.books_dir or not os.path.isdir(self.books_dir):
+                if self.books or self.dirs:
+                    self.books, self.dirs, self.trigrams = {}, {}, {}
+                    self._summary = None
+                return
+
+            changed = False
+            if not self.dirs:
+                self._scan_dir(self.books_dir)
+                changed = True
+            else:
+                for directory, mtime in list(self.dirs.items()):
+                    if directory not in self.dirs:
+                        continue  # dropped together with its parent
+                    try:
+                        current = os.stat(directory).st_mtime
+                    except OSError:
+                        self._drop_dir(directory)
+                        changed = True
+                        continue
+                    if current != mtime:
+                        self._scan_dir(directory)
+                        changed = True
+            if changed:
+                self.save()
+
+    def set_status(self, full_path, status, sections=None):
+        """Records the index status of a book (e.g. "indexed", "partial", "duplicate")."""
+        with self.lock:
+            book = self.books.get(full_path)
+            if not book:
+                # Possibly added since the last refresh
+                self.refresh()
+                book = self.books.get(full_path)
+            if not book:
+                return
+            book["status"] = status
+            if sections is not None:
+                book["sections"] = sections
+            self._summary = None
+            self.save()
+
+    # --- queries ---------------------------------------------------------
+
+    def list(self):
+        self.refresh()
+        with self.lock:
+            return sorted(self.books.values(), key=lambda b: b["relative_path"])
+
+    def get(self, full_path):
+        self.refresh()
+        return self.books.get(full_path)
+
+    def search(self, query):
+        """Case-insensitive substring search over titles, narrowed down by the trigram index."""
+        self.refresh()
+        query = (query or "").lower()
+        with self.lock:
+            grams = trigrams(query)
+            if grams:
+                candidates = set.intersection(*(self.trigrams.get(g, set()) for g in grams))
+            else:
+                candidates = self.books.keys()
+            matches = [self.books[p] for p in candidates if query in self.books[p]["name"].lower()]
+        return sorted(matches, key=lambda b: b["name"])
+
+    def summary(self):
+        """Counts per extension, index status totals and the most recently added books (cached until the next change)."""
+        self.refresh()
+        with self.lock:
+            if self._summary is None:
+                by_extension = {}
+                indexed = sections = 0
+                for book in self.books.values():
+                    by_extension[book["extension"]] = by_extension.get(book["extension"], 0) + 1
+                    if book.get("status") == "indexed":
+                        indexed += 1
+                    sections += book.get("sections") or 0
+                recent = sorted(self.books.values(), key=lambda b: b["mtime"], reverse=True)[:10]
+                self._summary = {
+                    "total": len(self.books),
+                    "by_extension": by_extension,
+                    "indexed": indexed,
+                    "sections": sections,
+                    "recent": recent,
+                }
+            return self._summary
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+def get_catalog(books_dir, db_path, extensions):
+    """Returns the process-wide catalog for a books directory."""
+    path = os.path.join(db_path, "book_catalog.json")
+    key = (books_dir, os.path.abspath(path))
+    with _catalogs_lock:
+        if key not in _catalogs:
+            _catalogs[key] = BookCatalog(books_dir, path, extensions)
+        return _catalogs[key]
@@ -0,0 +1,301 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from config_utils import get_config_value
+
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
+
+try:
+    import ebooklib
+    from ebooklib import epub
+    from bs4 import BeautifulSoup
+except ImportError:
+    ebooklib = None
+
+_DONE = object()
+
+# Bump whenever extraction or chunking changes, so manifests know to re-index
+EXTRACTOR_VERSION = "2"
+
+# --- Extraction (runs in worker processes, so these must be top-level functions) ---
+
+def extract_pdf_range(book_path, start, end):
+    """Returns [(page index, text)] for pages start..end-1 of a PDF."""
+    pages = []
+    with open(book_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        for i in range(start, min(end, len(reader.pages))):
+            pages.append((i, reader.pages[i].extract_text() or ""))
+    return pages
+
+# Document items of the last EPUB parsed in this process, keyed by (path, mtime): every
+# range task a worker runs for the same book reuses one parse. Holds one book at a time.
+_epub_cache = {}
+_epub_lock = threading.Lock()
+
+def _epub_documents(book_path):
+    key = (os.path.abspath(book_path), os.path.getmtime(book_path))
+    with _epub_lock:
+        if key not in _epub_cache:
+            _epub_cache.clear()
+            _epub_cache[key] = list(epub.read_epub(book_path).get_items_of_type(ebooklib.ITEM_DOCUMENT))
+        return _epub_cache[key]
+
+def extract_epub_range(book_path, start, end):
+    """Returns [(item index, text)] for document items start..end-1 of an EPUB."""
+    items = _epub_documents(book_path)
+    sections = []
+    for i in range(start, min(end, len(items))):
+        soup = BeautifulSoup(items[i].get_body_content(), 'html.parser')
+        sections.append((i, soup.get_text()))
+    return sections
+
+def count_units(book_path):
+    """Number of pages (PDF) or document items (EPUB) in a book."""
+    ext = os.path.splitext(book_path)[1].lower()
+    if ext == ".pdf" and PyPDF2:
+        with open(book_path, 'rb') as f:
+            return len(PyPDF2.PdfReader(f).pages)
+    if ext == ".epub" and ebooklib:
+        return len(_epub_documents(book_path))
+    return None
+
+def extractor_for(book_path):
+    ext = os.path.splitext(book_path)[1].lower()
+    if ext == ".pdf" and PyPDF2:
+        return extract_pdf_range, "page"
+    if ext == ".epub" and ebooklib:
+        return extract_epub_range, "index"
+    return None, None
+
+# --- Pipeline ---
+
+class StageStats:
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.busy = 0.0
+
+    def rate(self):
+        return self.items / self.busy if self.busy else 0.0
+
+    def __str__(self):
+        return f"{self.name}: {self.items} {self.unit} @ {self.rate():.1f} {self.unit}/s"
+
+class IngestPipeline:
+    """
+    Streams a book into the index in four stages connected by bounded queues:
+
+        extract (process pool) -> normalize & chunk -> batch embed -> bulk upsert
+
+    Queues are bounded, so memory stays flat no matter how large the book is,
+    and each stage reports its own throughput.
+    """
+    def __init__(self, agent, workers=None, pages_per_task=16, batch_size=32, queue_size=64, chunk_chars=None):
+        self.agent = agent
+        self.workers = workers if workers is not None else int(get_config_value("BOOK_INGEST_WORKERS", str(max((os.cpu_count() or 2) - 1, 1))))
+        self.pages_per_task = pages_per_task
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.chunk_chars = chunk_chars or int(get_config_value("BOOK_CHUNK_CHARS", "2000"))
+        self.stats = {}
+        self.error = None
+        self.total_pages = None
+
+    def _guard(self, fn, *args):
+        """Runs a stage and records the first failure so the others can stop."""
+        try:
+            fn(*args)
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+
+    def _put(self, q, item):
+        while self.error is None:
+            try:
+                q.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q):
+        while self.error is None:
+            try:
+                return q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _extract(self, book_path, extract_fn, start_page, total, workers, out_q):
+        stats = self.stats["extract"]
+        ranges = [(s, min(s + self.pages_per_task, total)) for s in range(start_page, total, self.pages_per_task)]
+        try:
+            if workers > 1 and len(ranges) > 1:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    # Keep a bounded number of tasks in flight for back-pressure
+                    in_flight = []
+                    for start, end in ranges:
+                        in_flight.append((time.time(), pool.submit(extract_fn, book_path, start, end)))
+                        if len(in_flight) >= workers * 2:
+                            self._emit_extracted(in_flight.pop(0), stats, out_q)
+                    while in_flight:
+                        self._emit_extracted(in_flight.pop(0), stats, out_q)
+            else:
+                for start, end in ranges:
+                    self._emit_extracted((time.time(), _Immediate(extract_fn, book_path, start, end)), stats, out_q)
+        finally:
+            self._put(out_q, _DONE)
+
+    def _emit_extracted(self, task, stats, out_q):
+        submitted, future = task
+        pages = future.result()
+        stats.busy += time.time() - submitted
+        stats.items += len(pages)
+        for page in pages:
+            self._put(out_q, page)
+
+    def _chunk(self, book_path, location_key, start_page, text_store, in_q, out_q):
+        stats = self.stats["chunk"]
+        book_name = os.path.basename(book_path)
+        prefix = "p" if location_key == "page" else "i"
+        try:
+            while True:
+                item = self._get(in_q)
+                if item is _DONE:
+                    break
+                started = time.time()
+                i, text = item
+                text = text or ""
+                if text_store is not None:
+                    text_store.append(i, text)
+                if i >= start_page and len(text.strip()) > 50:
+                    starts = range(0, len(text), self.chunk_chars)
+                    for j, start in enumerate(starts):
+                        doc_id = f"{book_name}_{prefix}{i}" + (f"_c{j}" if j else "")
+                        meta = {"path": book_path, location_key: i, "book": book_name}
+                        # The page only counts as committed once its last chunk is written
+                        page_done = i if j == len(starts) - 1 else None
+                        self._put(out_q, (doc_id, text[start:start + self.chunk_chars], meta, page_done))
+                stats.items += 1
+                stats.busy += time.time() - started
+        finally:
+            self._put(out_q, _DONE)
+
+    def _embed(self, in_q, out_q):
+        stats = self.stats["embed"]
+        embed_fn = self.agent.embedding_fn if self.agent.use_vectors else None
+        batch = []
+
+        def flush():
+            started = time.time()
+            ids, docs, metas, pages_done = zip(*batch)
+            embeddings = embed_fn(list(docs)) if embed_fn else None
+            stats.items += len(batch)
+            stats.busy += time.time() - started
+            done = [p for p in pages_done if p is not None]
+            self._put(out_q, (list(ids), list(docs), list(metas), embeddings, max(done) if done else None))
+            batch.clear()
+
+        try:
+            while True:
+                item = self._get(in_q)
+                if item is _DONE:
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    flush()
+            if batch and self.error is None:
+                flush()
+        finally:
+            self._put(out_q, _DONE)
+
+    def _upsert(self, in_q, on_commit, commit_interval):
+        stats = self.stats["upsert"]
+        last_commit = time.time()
+        committed_page = None
+        while True:
+            item = self._get(in_q)
+            if item is _DONE:
+                break
+            started = time.time()
+            ids, docs, metas, embeddings, page_done = item
+            self.agent._upsert_many(ids, docs, metas, embeddings=embeddings)
+            stats.items += len(ids)
+            stats.busy += time.time() - started
+            if page_done is not None:
+                committed_page = page_done
+            if on_commit and committed_page is not None and time.time() - last_commit >= commit_interval:
+                on_commit(committed_page)
+                last_commit = time.time()
+
+    def run(self, book_path, start_page=0, on_commit=None, commit_interval=10.0, text_store=None):
+        """
+        Indexes one book, starting at start_page. Returns the number of sections (chunks) stored.
+        Pages are committed in order; every commit_interval seconds on_commit(last fully
+        written page) is called so the caller can persist a resume point.
+
+        With a text_store (book_text_store.BookText), pages already extracted are read
+        back from it instead of re-parsing the book, and newly extracted ones are added.
+        """
+        extract_fn, location_key = extractor_for(book_path)
+        if extract_fn is None:
+            raise ValueError(f"Unsupported or missing library for extension {os.path.splitext(book_path)[1].lower()}.")
+        workers = self.workers
+        extract_from = start_page
+        if text_store is not None and text_store.complete:
+            total = text_store.total
+            extract_fn = lambda _path, start, end: text_store.read(start, end)
+            workers = 0  # seeking into the store is cheaper than a process hop
+        else:
+            total = count_units(book_path)
+            if text_store is not None:
+                # Extract from the first page the store is missing so it stays contiguous
+                extract_from = min(start_page, text_store.units)
+        self.total_pages = total
+
+        self.error = None
+        self.stats = {
+            "extract": StageStats("extract", "pages"),
+            "chunk": StageStats("chunk", "pages"),
+            "embed": StageStats("embed", "chunks"),
+            "upsert": StageStats("upsert", "chunks"),
+        }
+        if self.agent.use_vectors:
+            # Open the store (and load the embedding function) before the threads start
+            self.agent.collection
+
+        pages_q = queue.Queue(maxsize=self.queue_size)
+        chunks_q = queue.Queue(maxsize=self.queue_size)
+        batches_q = queue.Queue(maxsize=max(self.queue_size // self.batch_size, 2))
+        threads = [
+            threading.Thread(target=self._guard, args=(self._extract, book_path, extract_fn, extract_from, total, workers, pages_q), daemon=True),
+            threading.Thread(target=self._guard, args=(self._chunk, book_path, location_key, start_page, text_store, pages_q, chunks_q), daemon=True),
+            threading.Thread(target=self._guard, args=(self._embed, chunks_q, batches_q), daemon=True),
+        ]
+        for t in threads:
+            t.start()
+        self._guard(self._upsert, batches_q, on_commit, commit_interval)
+        for t in threads:
+            t.join()
+
+        if self.error is not None:
+            raise self.error
+        return self.stats["upsert"].items
+
+    def report(self):
+        return " | ".join(str(s) for s in self.stats.values())
+
+class _Immediate:
+    """Future-like wrapper used when extraction runs in-process."""
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+    def result(self):
+        return self.fn(*self.args)
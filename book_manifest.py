@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from file_utils import write_atomic
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-256 of a file's bytes, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ManifestStore:
+    """
+    One JSON manifest per book under <db_path>/book_manifests/, keyed by content hash:
+
+        {"content_hash", "book", "paths": {path: {"size", "mtime"}}, "page_count",
+         "last_page_committed", "complete", "sections", "extractor_version", "updated"}
+
+    Keying by content means a book copied to a second path is recognised as a duplicate,
+    and size + mtime per path let unchanged books be skipped without re-hashing them.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.manifests = {}
+        self.by_path = {}
+        self.load()
+
+    def _file(self, content_hash):
+        return os.path.join(self.directory, f"{content_hash}.json")
+
+    def load(self):
+        self.manifests = {}
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                        manifest = json.load(f)
+                    self.manifests[manifest["content_hash"]] = manifest
+                except (OSError, ValueError, KeyError):
+                    # A corrupt manifest only costs a re-index of that book
+                    continue
+        self._reindex_paths()
+
+    def _reindex_paths(self):
+        self.by_path = {}
+        for content_hash, manifest in self.manifests.items():
+            for path in manifest["paths"]:
+                self.by_path[os.path.abspath(path)] = content_hash
+
+    def get(self, content_hash):
+        return self.manifests.get(content_hash)
+
+    def for_path(self, path):
+        content_hash = self.by_path.get(os.path.abspath(path))
+        return self.manifests.get(content_hash) if content_hash else None
+
+    def all(self):
+        return list(self.manifests.values())
+
+    def create(self, content_hash, path, extractor_version):
+        manifest = {
+            "content_hash": content_hash,
+            "book": os.path.basename(path),
+            "paths": {},
+            "page_count": None,
+            "last_page_committed": -1,
+            "complete": False,
+            "sections": 0,
+            "extractor_version": extractor_version,
+            "updated": None,
+        }
+        self.manifests[content_hash] = manifest
+        self.add_path(manifest, path, save=False)
+        return manifest
+
+    def add_path(self, manifest, path, save=True):
+        stat = os.stat(path)
+        manifest["paths"][path] = {"size": stat.st_size, "mtime": stat.st_mtime}
+        self.by_path[os.path.abspath(path)] = manifest["content_hash"]
+        if save:
+            self.save(manifest)
+
+    def remove_path(self, manifest, path):
+        """Forgets a path; the manifest itself is deleted once no path refers to it."""
+        manifest["paths"].pop(path, None)
+        self.by_path.pop(os.path.abspath(path), None)
+        if manifest["paths"]:
+            self.save(manifest)
+        else:
+            self.delete(manifest["content_hash"])
+
+    def delete(self, content_hash):
+        with self.lock:
+            manifest = self.manifests.pop(content_hash, None)
+            if manifest:
+                for path in manifest["paths"]:
+                    self.by_path.pop(os.path.abspath(path), None)
+            if os.path.exists(self._file(content_hash)):
+                os.remove(self._file(content_hash))
+
+    def save(self, manifest):
+        """Atomically writes one manifest (temp file + rename)."""
+        manifest["updated"] = time.time()
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._file(manifest["content_hash"])
+            write_atomic(path, lambda f: json.dump(manifest, f, indent=2), encoding='utf-8')
+
+def recorded_path(manifest, path):
+    """The key under which a manifest records `path` (paths are compared absolute), or None."""
+    target = os.path.abspath(path)
+    return next((p for p in manifest["paths"] if os.path.abspath(p) == target), None)
+
+def is_unchanged(manifest, path, extractor_version):
+    """True when a completed manifest still matches the file's size and mtime."""
+    if not manifest or not manifest["complete"] or manifest["extractor_version"] != extractor_version:
+        return False
+    recorded = manifest["paths"].get(recorded_path(manifest, path))
+    if not recorded:
+        return False
+    stat = os.stat(path)
+    return recorded["size"] == stat.st_size and recorded["mtime"] == stat.st_mtime
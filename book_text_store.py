@@ -0,0 +1,116 @@
+import os
+import json
+import zlib
+import threading
+from file_utils import write_atomic
+
+class BookText:
+    """
+    Extracted text of one book version, stored once and read back by seeking.
+
+    <directory>/<content hash>-v<extractor version>.blob holds one zlib block per
+    page (PDF) or section (EPUB), appended in order; the .json next to it holds the
+    offset table [offset, compressed length] and, once every unit is in, the total.
+    The table is only rewritten on flush(), so after a crash the blob is trimmed back
+    to the last flushed page (by the first append, so readers never touch it) and
+    extraction continues from there.
+    """
+    def __init__(self, directory, content_hash, extractor_version):
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{content_hash}-v{extractor_version}")
+        self.blob_path = f"{base}.blob"
+        self.index_path = f"{base}.json"
+        self.lock = threading.Lock()
+        self.offsets = []
+        self.total = None
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.offsets = data.get("offsets", [])
+            self.total = data.get("total")
+        except (OSError, ValueError):
+            pass
+        self.trimmed = False
+        self.dirty = False
+
+    @property
+    def units(self):
+        """Number of pages/sections stored so far."""
+        return len(self.offsets)
+
+    @property
+    def complete(self):
+        return self.total is not None and self.units >= self.total
+
+    def append(self, i, text):
+        """Stores unit i; units must arrive in order, already-stored ones are ignored."""
+        with self.lock:
+            if i < len(self.offsets):
+                return
+            if i != len(self.offsets):
+                raise ValueError(f"Page {i} arrived before page {len(self.offsets)}.")
+            block = zlib.compress((text or "").encode("utf-8"), 6)
+            with open(self.blob_path, 'ab') as f:
+                if not self.trimmed:
+                    # Drop anything appended after the last flush
+                    end = self.offsets[-1][0] + self.offsets[-1][1] if self.offsets else 0
+                    f.truncate(end)
+                    self.trimmed = True
+                offset = f.seek(0, os.SEEK_END)
+                f.write(block)
+            self.offsets.append([offset, len(block)])
+            self.dirty = True
+
+    def read(self, start, end):
+        """Returns [(index, text)] for units start..end-1 that are stored."""
+        with self.lock:
+            wanted = self.offsets[start:end]
+        if not wanted:
+            return []
+        pages = []
+        with open(self.blob_path, 'rb') as f:
+            for i, (offset, length) in enumerate(wanted, start):
+                f.seek(offset)
+                pages.append((i, zlib.decompress(f.read(length)).decode("utf-8")))
+        return pages
+
+    def flush(self):
+        """Atomically persists the offset table."""
+        with self.lock:
+            if not self.dirty:
+                return
+            write_atomic(self.index_path, lambda f: json.dump({"offsets": self.offsets, "total": self.total}, f), encoding='utf-8')
+            self.dirty = False
+
+    def finish(self, total):
+        """Marks the book as fully extracted."""
+        with self.lock:
+            self.total = total
+            self.dirty = True
+        self.flush()
+
+_texts = {}
+_texts_lock = threading.Lock()
+
+def open_book_text(db_path, content_hash, extractor_version):
+    """Returns the process-wide BookText of a book version, so readers see the writer's pages."""
+    directory = os.path.join(db_path, "book_text")
+    key = (os.path.abspath(directory), content_hash, str(extractor_version))
+    with _texts_lock:
+        if key not in _texts:
+            _texts[key] = BookText(directory, content_hash, extractor_version)
+        return _texts[key]
+
+def remove_book_text(db_path, content_hash, extractor_version=None):
+    """Deletes the stored text of a book (one extractor version, or all of them)."""
+    directory = os.path.join(db_path, "book_text")
+    with _texts_lock:
+        for key in [k for k in _texts if k[0] == os.path.abspath(directory) and k[1] == content_hash
+                    and (extractor_version is None or str(extractor_version) == k[2])]:
+            del _texts[key]
+    if not os.path.isdir(directory):
+        return
+    prefix = f"{content_hash}-v{extractor_version}." if extractor_version else f"{content_hash}-v"
+    for name in os.listdir(directory):
+        if name.startswith(prefix):
+            os.remove(os.path.join(directory, name))
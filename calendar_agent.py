@@ -1,59 +1,305 @@
 import os
+import json
 import yaml
 import time
 import threading
 import calendar_manager
+import focus_analytics
 from config_utils import get_config_value
+from file_utils import write_atomic
+from intervals import planning_dates
 import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Busy-slot snapshots held in memory, shared by every CalendarAgent: path -> (mtime, busy slots)
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+# One fetch-and-store at a time in this process (the refresh thread and planners)
+_fetch_lock = threading.Lock()
 
 class CalendarAgent:
     def __init__(self, data_dir="datainput"):
         self.data_dir = data_dir
+        self.json_path = os.path.join(self.data_dir, "googlecalendar.json")
         self.yml_path = os.path.join(self.data_dir, "googlecalendar.yml")
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
 
     def fetch_and_store_calendar(self):
-        """Fetches calendar data from Google API and stores it in a YAML file."""
+        """
+        Syncs the local event store with Google Calendar and stores the busy slots of
+        today and of the day being planned (tomorrow once today's workday is over)
+        in googlecalendar.json (plus the YAML export). Returns the number of changed
+        events (None without a service).
+        """
+        with _fetch_lock:
+            return self._fetch_and_store()
+
+    def _fetch_and_store(self):
         calendar_id = get_config_value("CALENDAR_ID", "primary")
         service = calendar_manager.get_calendar_service()
         if not service:
             print("CalendarAgent: No service available.")
-            return
+            return None
 
-        print("CalendarAgent: Fetching calendar data to store in YAML...")
-        busy_slots = calendar_manager.get_busy_slots(service, calendar_ids=["primary", calendar_id])
+        # Only the changes since the last tick are transferred; reads below are local
+        changed = calendar_manager.sync_calendars(service, ["primary", calendar_id])
+        try:
+            focus_analytics.refresh_focus_analytics(calendar_id)
+        except Exception as e:
+            print(f"CalendarAgent: Focus analytics update failed: {e}")
+        print(f"CalendarAgent: Synced calendars ({changed} changed events), storing busy slots...")
+        # All busy calendars are covered by one FreeBusy request; titles, when asked
+        # for, come from the user's own calendars only
+        include_summaries = get_config_value("BUSY_SLOT_SUMMARIES", "false").lower() == "true"
+        dates = dict.fromkeys([datetime.date.today()] + planning_dates())
+        busy_slots = [
+            slot
+            for date in dates
+            for slot in calendar_manager.get_busy_slots(
+                service,
+                calendar_ids=calendar_manager.busy_calendar_ids(calendar_id),
+                date_str=date.isoformat(),
+                include_summaries=include_summaries,
+                summary_calendar_ids=["primary", calendar_id]
+            )
+        ]
         
         data = {
             "last_updated": datetime.datetime.now().isoformat(),
             "busy_slots": busy_slots
         }
 
-        with open(self.yml_path, 'w') as f:
-            yaml.dump(data, f, default_flow_style=False)
-        print(f"CalendarAgent: Saved calendar data to {self.yml_path}")
+        # Written atomically: readers in other threads or processes never see half a file
+        write_atomic(self.json_path, lambda f: json.dump(data, f))
+        with _snapshots_lock:
+            _snapshots[os.path.abspath(self.json_path)] = (os.path.getmtime(self.json_path), busy_slots)
+        if get_config_value("CALENDAR_YAML_EXPORT", "true").lower() == "true":
+            # Human-readable copy; nothing in the app reads it back
+            write_atomic(self.yml_path, lambda f: yaml.dump(data, f, default_flow_style=False))
+        print(f"CalendarAgent: Saved calendar data to {self.json_path}")
+        return changed
 
     def get_busy_slots_from_yml(self):
-        """Reads the busy slots from the YAML file."""
+        """
+        Returns the stored busy slots. They are kept in memory and reread from
+        googlecalendar.json only when its mtime changed (one stat per call). A
+        googlecalendar.yml written before the JSON cache existed is read as a fallback.
+        """
+        key = os.path.abspath(self.json_path)
+        try:
+            mtime = os.path.getmtime(self.json_path)
+        except OSError:
+            return self._busy_slots_from_legacy_yml()
+        with _snapshots_lock:
+            cached = _snapshots.get(key)
+            if cached and cached[0] == mtime:
+                return cached[1]
+        try:
+            with open(self.json_path, 'r') as f:
+                busy_slots = json.load(f).get("busy_slots", [])
+        except (OSError, ValueError) as e:
+            print(f"CalendarAgent: Could not read {self.json_path}: {e}")
+            return cached[1] if cached else []
+        with _snapshots_lock:
+            _snapshots[key] = (mtime, busy_slots)
+        return busy_slots
+
+    def get_fresh_busy_slots(self, max_age=None):
+        """
+        Busy slots for planning: when the stored snapshot is older than max_age
+        seconds (PLANNING_BUSY_MAX_AGE), it is refreshed first with an incremental
+        sync. Falls back to the stored slots if the refresh fails.
+        """
+        max_age = max_age if max_age is not None else float(get_config_value("PLANNING_BUSY_MAX_AGE", "60"))
+        try:
+            age = time.time() - os.path.getmtime(self.json_path)
+        except OSError:
+            age = None
+        if age is None or age > max_age:
+            try:
+                self.fetch_and_store_calendar()
+            except Exception as e:
+                print(f"CalendarAgent: Refresh before planning failed, using stored slots: {e}")
+        return self.get_busy_slots_from_yml()
+
+    def _busy_slots_from_legacy_yml(self):
         if not os.path.exists(self.yml_path):
-            print("CalendarAgent: YAML file not found, returning empty slots.")
+            print("CalendarAgent: Calendar cache not found, returning empty slots.")
             return []
         
         with open(self.yml_path, 'r') as f:
             data = yaml.safe_load(f)
             return data.get("busy_slots", [])
 
-def start_background_calendar_sync(interval=300):
-    """Starts a background thread to periodically fetch calendar data."""
-    agent = CalendarAgent()
-    def run_sync():
-        while True:
-            agent.fetch_and_store_calendar()
-            time.sleep(interval)
-            
-    thread = threading.Thread(target=run_sync, daemon=True)
-    thread.start()
-    return thread
+class CalendarRefreshScheduler:
+    """
+    Runs fetch_and_store_calendar on an adaptive interval in a daemon thread.
+
+    After a sync that changed something the interval drops to min_interval; each
+    quiet sync doubles it, up to max_interval. It is also held at min_interval
+    within `lead_minutes` of a planning time (PLANNING_TIMES, e.g. 08:00) or of the
+    next event in the store, so the calendar is current when it is about to matter.
+    trigger() (or a POST to the webhook receiver) refreshes immediately.
+    """
+    def __init__(self, agent=None, min_interval=None, max_interval=None, planning_times=None, lead_minutes=None, clock=time.time):
+        self.agent = agent or CalendarAgent()
+        self.min_interval = min_interval or float(get_config_value("CALENDAR_REFRESH_MIN_SECONDS", "60"))
+        self.max_interval = max(max_interval or float(get_config_value("CALENDAR_REFRESH_MAX_SECONDS", "1800")), self.min_interval)
+        if planning_times is None:
+            planning_times = [t.strip() for t in get_config_value("PLANNING_TIMES", "08:00").split(",") if t.strip()]
+        self.planning_times = planning_times
+        self.lead = 60 * (lead_minutes if lead_minutes is not None else float(get_config_value("CALENDAR_REFRESH_LEAD_MINUTES", "15")))
+        self.clock = clock
+        self.interval = self.min_interval
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.webhook = None
+        self.stats = {"refreshes": 0, "triggered": 0}
+
+    def _next_planning_time(self, now):
+        """Timestamp of the next planning time after now (today or tomorrow)."""
+        moment = datetime.datetime.fromtimestamp(now)
+        upcoming = []
+        for hhmm in self.planning_times:
+            hour, minute = (int(part) for part in hhmm.split(":"))
+            at = moment.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if at.timestamp() <= now:
+                at += datetime.timedelta(days=1)
+            upcoming.append(at.timestamp())
+        return min(upcoming) if upcoming else None
+
+    def _next_event(self, now):
+        try:
+            calendar_id = get_config_value("CALENDAR_ID", "primary")
+            return calendar_manager.get_event_store().next_start(["primary", calendar_id], now)
+        except Exception:
+            return None
+
+    def next_delay(self, changed):
+        """Seconds until the next refresh, given how many events the last one changed."""
+        if changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        now = self.clock()
+        delay = self.interval
+        for moment in (self._next_planning_time(now), self._next_event(now)):
+            if moment is None:
+                continue
+            if moment - now <= self.lead:
+                return self.min_interval
+            # Wake up in time to be fresh for it
+            delay = min(delay, moment - self.lead - now)
+        return max(delay, self.min_interval)
+
+    def trigger(self):
+        """Refreshes as soon as possible (the interval restarts from the minimum)."""
+        self.stats["triggered"] += 1
+        self.interval = self.min_interval
+        self.wakeup.set()
+
+    def refresh(self):
+        try:
+            changed = self.agent.fetch_and_store_calendar()
+        except Exception as e:
+            print(f"CalendarAgent: Background sync failed: {e}")
+            changed = None
+        self.stats["refreshes"] += 1
+        return changed
+
+    def _run(self):
+        while not self.stopped.is_set():
+            delay = self.next_delay(self.refresh())
+            self.wakeup.wait(delay)
+            self.wakeup.clear()
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self.thread
+
+    def start_webhook(self, host="127.0.0.1", port=None, token=None):
+        """Starts the local webhook receiver; any authorized POST triggers a refresh. Returns its port."""
+        port = port if port is not None else int(get_config_value("CALENDAR_WEBHOOK_PORT", "0"))
+        self.webhook = CalendarWebhookServer(self, host, port, token)
+        return self.webhook.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+        if self.webhook is not None:
+            self.webhook.stop()
+
+class CalendarWebhookServer:
+    """
+    Local HTTP receiver for change notifications: Google Calendar push notifications
+    (events.watch, forwarded to this machine) or anything else that knows the calendar
+    changed. When CALENDAR_WEBHOOK_TOKEN is set, the request must carry it in the
+    X-Goog-Channel-Token header.
+    """
+    def __init__(self, scheduler, host="127.0.0.1", port=0, token=None):
+        self.scheduler = scheduler
+        self.token = token if token is not None else get_config_value("CALENDAR_WEBHOOK_TOKEN", "")
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                if receiver.token and self.headers.get("X-Goog-Channel-Token") != receiver.token:
+                    self.send_response(403)
+                    self.end_headers()
+                    return
+                # "sync" is the handshake Google sends when a channel is created
+                if self.headers.get("X-Goog-Resource-State") != "sync":
+                    receiver.scheduler.trigger()
+                self.send_response(202)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.server.server_address[1]
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def start_background_calendar_sync(interval=None):
+    """
+    Starts the process-wide adaptive calendar refresh (see CalendarRefreshScheduler),
+    plus the webhook receiver when CALENDAR_WEBHOOK_PORT is set. `interval` overrides
+    the minimum interval. Returns the scheduler thread.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = CalendarRefreshScheduler(min_interval=interval)
+            if int(get_config_value("CALENDAR_WEBHOOK_PORT", "0")):
+                port = _scheduler.start_webhook()
+                print(f"CalendarAgent: Webhook receiver listening on 127.0.0.1:{port}")
+        return _scheduler.start()
+
+def request_calendar_refresh():
+    """Asks the background sync to refresh now. Returns False if it is not running."""
+    with _scheduler_lock:
+        if _scheduler is None:
+            return False
+        _scheduler.trigger()
+        return True
 
 if __name__ == "__main__":
     agent = CalendarAgent()
@@ -1,169 +1,413 @@
-import os.path
+import time
+import hashlib
 import datetime
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-
-# If modifying these scopes, delete the file token.json.
-SCOPES = [
-    'https://www.googleapis.com/auth/calendar',
-    'https://www.googleapis.com/auth/gmail.readonly'
-]
+from google_clients import get_service
+from config_utils import get_config_value
+from event_store import get_event_store, unique_calendars, day_bounds
+from intervals import merge, to_intervals, parse_time
 
 def get_calendar_service():
-    """Shows basic usage of the Google Calendar API.
-    Lists the next 10 events on the user's calendar.
-    """
-    creds = None
-    # The file token.json stores the user's access and refresh tokens, and is
-    # created automatically when the authorization flow completes for the first
-    # time.
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-    # If there are no (valid) credentials available, let the user log in.
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            if not os.path.exists('credentials.json'):
-                print("Error: 'credentials.json' not found. Please download it from Google Cloud Console.")
-                return None
-            flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
-        # Save the credentials for the next run
-        with open('token.json', 'w') as token:
-            token.write(creds.to_json())
-
-    try:
-        service = build('calendar', 'v3', credentials=creds)
-        return service
-    except HttpError as error:
-        print(f'An error occurred: {error}')
-        if "invalid_scope" in str(error):
-            print("💡 TIP: You likely have an old 'token.json'. Delete it and run the script again to re-authenticate.")
-        return None
-
-
-def get_busy_slots(service, calendar_ids=['primary'], date_str=None):
-    """
-    Fetches events for the specified date and returns a list of busy time slots from multiple calendars.
-    calendar_ids should be a list of calendar IDs.
     """
-    if not service:
-        return []
+    Returns the Calendar API client shared by the whole process (see google_clients):
+    credentials stay in memory and the service is built only once.
+    """
+    return get_service('calendar', 'v3')
 
-    if date_str:
-        day = datetime.datetime.strptime(date_str, '%Y-%m-%d')
-    else:
-        day = datetime.datetime.now()
 
-    # Define the start and end of the day
-    start_of_day = day.replace(hour=0, minute=0, second=0, microsecond=0).isoformat() + 'Z'
-    end_of_day = day.replace(hour=23, minute=59, second=59, microsecond=0).isoformat() + 'Z'
+def sync_calendars(service, calendar_ids):
+    """Pulls the changes since the last sync into the local event store. Returns how many events changed."""
+    if not service:
+        return 0
+    return get_event_store().sync(service, calendar_ids)
 
-    all_busy_slots = []
-    
-    if isinstance(calendar_ids, str):
-        calendar_ids = [calendar_ids]
+def _day_events(service, calendar_ids, date_str=None):
+    """
+    Reads a day's events from the local event store (see event_store), syncing the
+    calendars first when the store is stale. Dates outside the synced window are
+    listed from the API directly.
+    """
+    store = get_event_store()
+    if not store.covers(date_str):
+        return _list_day(service, calendar_ids, date_str)
+    if not store.is_fresh(calendar_ids):
+        store.sync(service, calendar_ids)
+    return store.events(calendar_ids, *day_bounds(date_str))
 
-    for calendar_id in calendar_ids:
-        print(f"Fetching busy slots for {day.date()} from calendar: {calendar_id}...")
+def _list_day(service, calendar_ids, date_str=None):
+    start_ts, end_ts = day_bounds(date_str)
+    time_min = datetime.datetime.fromtimestamp(start_ts).astimezone().isoformat()
+    time_max = datetime.datetime.fromtimestamp(end_ts).astimezone().isoformat()
+    events = []
+    for calendar_id in unique_calendars(calendar_ids):
+        print(f"Fetching events for {time_min[:10]} from calendar: {calendar_id}...")
         try:
-            events_result = service.events().list(calendarId=calendar_id, timeMin=start_of_day,
-                                                timeMax=end_of_day, singleEvents=True,
+            events_result = service.events().list(calendarId=calendar_id, timeMin=time_min,
+                                                timeMax=time_max, singleEvents=True,
                                                 orderBy='startTime').execute()
-            events = events_result.get('items', [])
-
-            for event in events:
-                start = event['start'].get('dateTime', event['start'].get('date'))
-                end = event['end'].get('dateTime', event['end'].get('date'))
-                # Filter out all-day events or format them properly if needed
-                if 'T' in start:  # It's a dateTime event
-                    all_busy_slots.append({
-                        'summary': event.get('summary', 'No Title'),
-                        'start': start,
-                        'end': end,
-                        'source_calendar': calendar_id
-                    })
         except Exception as e:
-            print(f"Error fetching slots from {calendar_id}: {e}")
-    
-    return all_busy_slots
+            print(f"Error fetching events from {calendar_id}: {e}")
+            continue
+        for event in events_result.get('items', []):
+            start = event['start'].get('dateTime', event['start'].get('date'))
+            end = event['end'].get('dateTime', event['end'].get('date'))
+            events.append({
+                "calendar_id": calendar_id,
+                "summary": event.get('summary', 'No Title'),
+                "start": start,
+                "end": end,
+                "all_day": 'T' not in start,
+                "event": event,
+            })
+    return events
+
+# FreeBusy accepts at most 50 calendars per query
+FREEBUSY_MAX_CALENDARS = 50
+
+def busy_calendar_ids(calendar_id=None):
+    """
+    Calendars whose events block time: primary, CALENDAR_ID and the shared calendars
+    listed in BUSY_CALENDAR_IDS (comma-separated), without duplicates.
+    """
+    calendar_id = calendar_id or get_config_value("CALENDAR_ID", "primary")
+    extra = [c.strip() for c in get_config_value("BUSY_CALENDAR_IDS", "").split(",") if c.strip()]
+    return unique_calendars(["primary", calendar_id] + extra)
+
+def merge_busy(intervals):
+    """Merges overlapping or touching {'start', 'end'} intervals (any timezone) into local-time intervals."""
+    return [
+        {'start': start.astimezone().isoformat(), 'end': end.astimezone().isoformat()}
+        for start, end in merge(to_intervals(intervals))
+    ]
+
+def get_free_busy(service, calendar_ids=['primary'], date_str=None):
+    """
+    Busy intervals of the specified date across all calendars, from the FreeBusy
+    endpoint: one request for up to 50 calendars, and no event bodies. Overlapping
+    intervals from different calendars are merged.
+    """
+    if not service:
+        return []
+
+    start_ts, end_ts = day_bounds(date_str)
+    calendar_ids = unique_calendars(calendar_ids)
+    intervals = []
+    for start in range(0, len(calendar_ids), FREEBUSY_MAX_CALENDARS):
+        chunk = calendar_ids[start:start + FREEBUSY_MAX_CALENDARS]
+        print(f"Fetching free/busy for {len(chunk)} calendar(s)...")
+        try:
+            response = service.freebusy().query(body={
+                'timeMin': datetime.datetime.fromtimestamp(start_ts).astimezone().isoformat(),
+                'timeMax': datetime.datetime.fromtimestamp(end_ts).astimezone().isoformat(),
+                'items': [{'id': calendar_id} for calendar_id in chunk],
+            }).execute()
+        except Exception as e:
+            print(f"Error fetching free/busy: {e}")
+            continue
+        for calendar_id, result in response.get('calendars', {}).items():
+            for error in result.get('errors', []):
+                print(f"Error fetching free/busy from {calendar_id}: {error.get('reason')}")
+            intervals.extend(result.get('busy', []))
+    return merge_busy(intervals)
+
+def get_busy_slots(service, calendar_ids=['primary'], date_str=None, include_summaries=True, summary_calendar_ids=None):
+    """
+    Returns the busy time slots of the specified date from multiple calendars.
+    calendar_ids should be a list of calendar IDs; duplicates are read once.
+
+    With include_summaries=False only the merged time intervals are returned
+    (see get_free_busy), which is all the scheduler needs and keeps prompts small.
+    summary_calendar_ids limits the event titles to those calendars; the others
+    only contribute free/busy intervals.
+    """
+    if not service:
+        return []
+    if not include_summaries:
+        return get_free_busy(service, calendar_ids, date_str)
+
+    calendar_ids = unique_calendars(calendar_ids)
+    others = []
+    if summary_calendar_ids is not None:
+        others = [c for c in calendar_ids if c not in summary_calendar_ids]
+        calendar_ids = [c for c in calendar_ids if c in summary_calendar_ids]
+    slots = [
+        {
+            'summary': event['summary'],
+            'start': event['start'],
+            'end': event['end'],
+            'source_calendar': event['calendar_id']
+        }
+        for event in (_day_events(service, calendar_ids, date_str) if calendar_ids else [])
+        # Filter out all-day events
+        if not event['all_day']
+    ]
+    if others:
+        slots.extend(get_free_busy(service, others, date_str))
+    return slots
 
 def get_managed_events(service, calendar_id='primary', date_str=None):
     """
-    Fetches events for the specified date and returns only those prefixed with 'AI: '.
+    Returns the events of the specified date prefixed with 'AI: '.
     """
     if not service:
         return []
 
-    if date_str:
-        day = datetime.datetime.strptime(date_str, '%Y-%m-%d')
-    else:
-        day = datetime.datetime.now()
+    return [
+        {
+            'task': event['summary'].replace("AI: ", "").strip(),
+            'start': event['start'],
+            'end': event['end']
+        }
+        for event in _day_events(service, [calendar_id], date_str)
+        if event['summary'].startswith("AI: ") and not event['all_day']
+    ]
 
-    start_of_day = day.replace(hour=0, minute=0, second=0, microsecond=0).isoformat() + 'Z'
-    end_of_day = day.replace(hour=23, minute=59, second=59, microsecond=0).isoformat() + 'Z'
+# Google accepts up to 1000 calls per batch, but recommends at most 50 for Calendar
+BATCH_SIZE = 50
+RETRIABLE_STATUSES = {403, 429, 500, 502, 503, 504}
 
-    events_result = service.events().list(calendarId=calendar_id, timeMin=start_of_day,
-                                        timeMax=end_of_day, singleEvents=True,
-                                        orderBy='startTime').execute()
-    events = events_result.get('items', [])
+def _local_offset():
+    """Local timezone offset formatted for RFC 3339 (e.g. +07:00)."""
+    local_tz = datetime.datetime.now().astimezone().strftime('%z')
+    if len(local_tz) == 5: # e.g., +0700
+        local_tz = local_tz[:3] + ':' + local_tz[3:]
+    return local_tz
 
-    managed_events = []
-    for event in events:
-        summary = event.get('summary', '')
-        if summary.startswith("AI: "):
-            start = event['start'].get('dateTime', event['start'].get('date'))
-            end = event['end'].get('dateTime', event['end'].get('date'))
-            if 'T' in start:
-                managed_events.append({
-                    'task': summary.replace("AI: ", "").strip(),
-                    'start': start,
-                    'end': end
-                })
-    
-    return managed_events
+def _with_offset(timestamp, local_tz):
+    # Simple check for missing timezone offset
+    # If it has 'T' but no 'Z' and no '+' or '-' after the time part
+    if 'T' in timestamp and 'Z' not in timestamp and '+' not in timestamp[10:] and '-' not in timestamp[10:]:
+        return timestamp + local_tz
+    return timestamp
+
+# extendedProperties.private key holding the stable ID of the task an event books
+MANAGED_TASK_KEY = 'ai_task_id'
+MANAGED_CATEGORY_KEY = 'ai_category'
+
+def managed_task_id(task):
+    """Stable ID of a scheduled task: a hash of its normalized text."""
+    return hashlib.sha1(" ".join(str(task).lower().split()).encode('utf-8')).hexdigest()[:16]
+
+def managed_event_id(calendar_id, task_key, start):
+    """
+    Client-chosen event ID (base32hex) for one booking of a task, derived from the
+    calendar, the task key and the start time. A retried insert reuses it, so an
+    attempt that went through before its response was lost comes back as a 409
+    instead of a second event.
+    """
+    return hashlib.sha1(f"{calendar_id}|{task_key}|{start}".encode('utf-8')).hexdigest()
+
+def build_event(item, local_tz=None, task_key=None, calendar_id='primary'):
+    """Calendar event body for one schedule item."""
+    local_tz = local_tz or _local_offset()
+    task_key = task_key or managed_task_id(item['task'])
+    start = _with_offset(item['start'], local_tz)
+    return {
+        'id': managed_event_id(calendar_id, task_key, start),
+        'summary': f"AI: {item['task']}",
+        'start': {'dateTime': start},
+        'end': {'dateTime': _with_offset(item['end'], local_tz)},
+        'extendedProperties': {'private': dict(
+            {MANAGED_TASK_KEY: task_key},
+            # Focus analytics group booked time by it
+            **({MANAGED_CATEGORY_KEY: item['category']} if item.get('category') else {})
+        )},
+    }
+
+def _status(error):
+    return getattr(getattr(error, 'resp', None), 'status', None)
+
+def _is_retriable(error):
+    status = _status(error)
+    if status is None:
+        return True  # connection-level failure
+    if status == 403:
+        # Only rate limiting is worth retrying, not permission errors
+        return 'ratelimitexceeded' in str(error).lower()
+    return status in RETRIABLE_STATUSES
+
+def execute_batched(service, calls, batch_size=BATCH_SIZE, max_retries=3, backoff=1.0):
+    """
+    Runs API calls through batch requests, batch_size at a time (one HTTP round trip each).
+
+    `calls` is a list of unexecuted requests (e.g. service.events().insert(...)), or
+    of zero-argument factories returning one when the request must be rebuilt for a retry.
+    Returns (response, error) per call, in order. Only calls that failed with a
+    retriable error (rate limits, 5xx, dropped connections) are sent again, with
+    exponential backoff.
+    """
+    results = [(None, None)] * len(calls)
+    pending = list(range(len(calls)))
+    for attempt in range(max_retries + 1):
+        failed = []
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+
+            def callback(request_id, response, exception):
+                index = int(request_id)
+                results[index] = (response, exception)
+                if exception is not None and _is_retriable(exception):
+                    failed.append(index)
+
+            batch = service.new_batch_http_request(callback=callback)
+            for index in chunk:
+                call = calls[index]
+                batch.add(call() if callable(call) else call, request_id=str(index))
+            try:
+                batch.execute()
+            except Exception as e:
+                # The whole batch request failed (e.g. network down): all of it is retried
+                for index in chunk:
+                    results[index] = (None, e)
+                    if index not in failed:
+                        failed.append(index)
+        if not failed or attempt == max_retries:
+            break
+        pending = sorted(failed)
+        time.sleep(backoff * (2 ** attempt))
+    return results
+
+def _settle_conflicts(service, calendar_id, inserts, results):
+    """
+    Settles inserts that failed with 409 (the event ID exists): either an earlier
+    attempt went through before a retry, or that booking was deleted before and
+    deleted events keep their ID. Writing the body over it, confirmed, ends in the
+    same state as a clean insert. `inserts` maps result index to event body.
+    """
+    conflicts = [i for i in inserts if _status(results[i][1]) == 409]
+    calls = [
+        (lambda body=inserts[i]: service.events().update(calendarId=calendar_id, eventId=body['id'],
+                                                          body=dict(body, status='confirmed')))
+        for i in conflicts
+    ]
+    for i, result in zip(conflicts, execute_batched(service, calls) if calls else []):
+        results[i] = result
+    return results
 
 def create_events(service, schedule, calendar_id='primary'):
     """
-    Creates calendar events from a list of scheduled tasks.
+    Creates calendar events from a list of scheduled tasks with batch requests
+    (one round trip for a normal day plan). Returns one result per schedule item:
+    {"item", "event" (the created event or None), "error" (None on success)}.
     """
     if not service or not schedule:
-        return
+        return []
 
     print(f"Syncing {len(schedule)} tasks to Google Calendar: {calendar_id}...")
-    
-    # Get local timezone offset (e.g., +07:00)
-    now = datetime.datetime.now().astimezone()
-    local_tz = now.strftime('%z')
-    if len(local_tz) == 5: # e.g., +0700
-        local_tz = local_tz[:3] + ':' + local_tz[3:]
+    local_tz = _local_offset()
+    bodies = [build_event(item, local_tz, calendar_id=calendar_id) for item in schedule]
+    calls = [(lambda body=body: service.events().insert(calendarId=calendar_id, body=body)) for body in bodies]
+    responses = _settle_conflicts(service, calendar_id, dict(enumerate(bodies)), execute_batched(service, calls))
+
+    results = []
+    for item, (event, error) in zip(schedule, responses):
+        if error is not None:
+            print(f"Error creating event for {item['task']}: {error}")
+        results.append({"item": item, "event": event, "error": str(error) if error is not None else None})
+    created = sum(1 for r in results if r["error"] is None)
+    # Make the new events visible to local reads before the next sync
+    get_event_store().upsert_events(calendar_id, [r["event"] for r in results if r["error"] is None])
+    print(f"Created {created}/{len(schedule)} events.")
+    return results
+
+def _event_key(event):
+    """Task ID of a managed event; events created before IDs were stored fall back to their title."""
+    private = event.get('extendedProperties', {}).get('private', {})
+    return private.get(MANAGED_TASK_KEY) or managed_task_id(event.get('summary', '')[len("AI: "):].strip())
+
+def _same_event(event, body):
+    def times(e):
+        return [parse_time(e[side].get('dateTime', e[side].get('date'))) for side in ('start', 'end')]
+    private = event.get('extendedProperties', {}).get('private', {})
+    return (event.get('summary') == body['summary'] and times(event) == times(body)
+            and all(private.get(key) == value for key, value in body['extendedProperties']['private'].items()))
+
+def reconcile_events(service, schedule, calendar_id='primary', replace=False, now=None):
+    """
+    Makes the calendar's AI-managed events match a schedule, with the fewest calls.
+
+    Events carry the task's stable ID in extendedProperties.private. A task that is
+    already booked at the same time is left alone, a moved or renamed one is patched,
+    and only new tasks are inserted. Duplicate events of one task are deleted. With
+    replace=True the schedule is the whole plan for its days, so managed events of
+    those days that have not started by `now` and are no longer in it are deleted
+    too. All calls go out as batch requests. Returns one result per schedule item,
+    like create_events, with an "action" of insert, patch or unchanged.
+    """
+    if not service or not schedule:
+        return []
+
+    local_tz = _local_offset()
+    existing = {}
+    dates = sorted({parse_time(_with_offset(item['start'], local_tz)).date().isoformat() for item in schedule})
+    for date_str in dates:
+        for day_event in _day_events(service, [calendar_id], date_str):
+            event = day_event['event']
+            if day_event['summary'].startswith("AI: ") and not day_event['all_day']:
+                events = existing.setdefault(_event_key(event), [])
+                if all(e['id'] != event['id'] for e in events):
+                    events.append(event)
 
+    results, calls, deletes, seen = [], [], [], {}
     for item in schedule:
-        start_time = item['start']
-        end_time = item['end']
-        
-        # Simple check for missing timezone offset
-        # If it has 'T' but no 'Z' and no '+' or '-' after the time part
-        if 'T' in start_time and 'Z' not in start_time and '+' not in start_time[10:] and '-' not in start_time[10:]:
-            start_time += local_tz
-        if 'T' in end_time and 'Z' not in end_time and '+' not in end_time[10:] and '-' not in end_time[10:]:
-            end_time += local_tz
-
-        event = {
-            'summary': f"AI: {item['task']}",
-            'start': {'dateTime': start_time},
-            'end': {'dateTime': end_time},
-        }
-        try:
-            event_result = service.events().insert(calendarId=calendar_id, body=event).execute()
-            print(f"Created: {event_result.get('htmlLink')}")
-        except Exception as e:
-            print(f"Error creating event for {item['task']}: {e}")
+        # The same task booked twice in one plan gets a key per occurrence
+        key = managed_task_id(item['task'])
+        seen[key] = seen.get(key, 0) + 1
+        if seen[key] > 1:
+            key = f"{key}-{seen[key]}"
+        body = build_event(item, local_tz, task_key=key, calendar_id=calendar_id)
+        events = existing.pop(key, [])
+        deletes.extend(events[1:])
+        result = {"item": item, "event": None, "error": None}
+        if not events:
+            result["action"] = "insert"
+            result["body"] = body
+            calls.append((result, lambda body=body: service.events().insert(calendarId=calendar_id, body=body)))
+        elif _same_event(events[0], body):
+            result.update(action="unchanged", event=events[0])
+        else:
+            result["action"] = "patch"
+            # The event keeps the ID it was created with
+            body = {k: v for k, v in body.items() if k != 'id'}
+            calls.append((result, lambda body=body, event_id=events[0]['id']:
+                          service.events().patch(calendarId=calendar_id, eventId=event_id, body=body)))
+        results.append(result)
+    if replace:
+        # Only upcoming blocks leave with the plan: what already started is history
+        # (validation never books in the past, so a later replan cannot contain it)
+        now = parse_time(now) if now else datetime.datetime.now().astimezone()
+        deletes.extend(
+            event for events in existing.values() for event in events
+            if parse_time(event['start'].get('dateTime', event['start'].get('date'))) > now
+        )
+    for event in deletes:
+        calls.append((event['id'], lambda event_id=event['id']: service.events().delete(calendarId=calendar_id, eventId=event_id)))
+
+    if calls:
+        print(f"Reconciling {len(schedule)} tasks with Google Calendar: {calendar_id}...")
+    responses = execute_batched(service, [call for _, call in calls])
+    inserts = {i: target.pop("body") for i, (target, _) in enumerate(calls) if isinstance(target, dict) and "body" in target}
+    _settle_conflicts(service, calendar_id, inserts, responses)
+    removed = []
+    for (target, _), (response, error) in zip(calls, responses):
+        if not isinstance(target, dict):
+            # A 404/410 means the event was already gone
+            if error is None or _status(error) in (404, 410):
+                removed.append(target)
+            else:
+                print(f"Error deleting event: {error}")
+        elif error is not None:
+            print(f"Error booking {target['item']['task']}: {error}")
+            target["error"] = str(error)
+        else:
+            target["event"] = response
+
+    # Keep local reads in step until the next sync
+    store = get_event_store()
+    store.upsert_events(calendar_id, [r["event"] for r in results if r["action"] != "unchanged" and r["error"] is None])
+    store.remove_events(calendar_id, removed)
+    counts = {action: sum(1 for r in results if r["action"] == action and r["error"] is None) for action in ("insert", "patch", "unchanged")}
+    print(f"Calendar: {counts['insert']} created, {counts['patch']} updated, {len(removed)} removed, {counts['unchanged']} unchanged.")
+    return results
 
 if __name__ == '__main__':
     service = get_calendar_service()
@@ -0,0 +1,213 @@
+import os
+import time
+import sqlite3
+import threading
+import requests
+from config_utils import get_config_value
+from embedding_cache import text_hash
+from monitoring_agent import MonitoringAgent
+
+# Bump when the prompt changes so old summaries are regenerated
+SUMMARY_PROMPT_VERSION = "1"
+
+SUMMARY_PROMPT = """Summarize this excerpt from the user's notes or books in at most two sentences (under 60 words).
+Keep names, dates, numbers and decisions. Reply with the summary only.
+
+{text}"""
+
+class SummaryStore:
+    """
+    Persistent content-hash -> summary store backed by SQLite (<db_path>/summaries.sqlite3).
+    Keyed by the hash of the normalized text, so a summary is reused until the text changes.
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                text_hash TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                model TEXT NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (text_hash, prompt_version)
+            )
+        """)
+        self.conn.commit()
+
+    def get_many(self, hashes):
+        """Returns {hash: summary} for every hash already summarized."""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self.lock:
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT text_hash, summary FROM summaries WHERE prompt_version=? AND text_hash IN ({placeholders})",
+                    [SUMMARY_PROMPT_VERSION] + chunk
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def put(self, h, summary, model):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?)",
+                              (h, SUMMARY_PROMPT_VERSION, summary, model, time.time()))
+            self.conn.commit()
+
+    def hashes(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT text_hash FROM summaries WHERE prompt_version=?", (SUMMARY_PROMPT_VERSION,))
+            return {h for (h,) in rows}
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+    def snippets(self, hits, snippet_chars=300):
+        """Prompt snippet per hit: its summary when there is one, else the start of the raw text."""
+        hashes = [hit.get("content_hash") or text_hash(hit["document"]) for hit in hits]
+        found = self.get_many(hashes)
+        return [found.get(h) or hit["document"][:snippet_chars] for h, hit in zip(hashes, hits)]
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_summary_store(db_path="vector_db"):
+    """Returns the process-wide summary store for a database directory."""
+    path = os.path.join(db_path, "summaries.sqlite3")
+    key = os.path.abspath(path)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = SummaryStore(path)
+        return _stores[key]
+
+def _ollama(host, model):
+    def generate(prompt):
+        response = requests.post(f"{host}/api/generate", json={
+            "model": model, "prompt": prompt, "stream": False, "options": {"num_predict": 120}
+        }, timeout=120)
+        response.raise_for_status()
+        return response.json().get("response", "")
+    return generate
+
+def _openclaw(endpoint, model):
+    def generate(prompt):
+        response = requests.post(f"{endpoint}/chat/completions", json={
+            "model": model, "messages": [{"role": "user", "content": prompt}], "max_tokens": 120
+        }, headers={"Authorization": f"Bearer {get_config_value('OPENCLAW_API_KEY', '')}"}, timeout=60)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+    return generate
+
+def pick_local_provider(monitor=None):
+    """
+    Cheapest healthy local provider for summaries, as (name, generate), or None.
+    Summaries are only ever generated locally: Ollama first, then an OpenClaw endpoint
+    on this machine. Remote APIs are never used for background work.
+    """
+    monitor = monitor or MonitoringAgent()
+    model = get_config_value("SUMMARY_MODEL", get_config_value("OLLAMA_MODEL", "llama3"))
+    if get_config_value("ENABLE_OLLAMA", "true").lower() == "true" and monitor.check_ollama():
+        return f"ollama/{model}", _ollama(monitor.ollama_host, model)
+    endpoint = monitor.openclaw_endpoint
+    if ("localhost" in endpoint or "127.0.0.1" in endpoint) and monitor.check_openclaw():
+        return f"openclaw/{model}", _openclaw(endpoint, model)
+    return None
+
+class ChunkSummarizer:
+    """
+    Background job that writes a short summary for every note chunk and book section
+    (the documents of each federated SearchSource) long enough to need one. It runs
+    in small passes (see run_pending) from the background indexer, and only when a
+    local model is up.
+    """
+    def __init__(self, sources, db_path="vector_db", min_chars=None, provider=None, health_interval=60.0):
+        self.sources = sources
+        self.store = get_summary_store(db_path)
+        self.min_chars = min_chars or int(get_config_value("SUMMARY_MIN_CHARS", "400"))
+        self.fixed_provider = provider
+        self.health_interval = health_interval
+        self.checked_at = 0.0
+        self.cached_provider = None
+        self.seen_versions = {}
+        self.pending = []      # (hash, text) not summarized yet
+        self.done = None       # hashes already in the store
+        self.hashes = {}       # (source name, doc_id) -> (text, hash)
+        self.stats = {"summarized": 0, "failed": 0}
+
+    def provider(self):
+        if self.fixed_provider is not None:
+            return self.fixed_provider
+        # Re-probe now and then: Ollama may start (or stop) while the app runs
+        if time.time() - self.checked_at > self.health_interval:
+            self.checked_at = time.time()
+            self.cached_provider = pick_local_provider()
+        return self.cached_provider
+
+    def _hash(self, source_name, doc_id, text):
+        cached = self.hashes.get((source_name, doc_id))
+        if cached and cached[0] == text:
+            return cached[1]
+        h = text_hash(text)
+        self.hashes[(source_name, doc_id)] = (text, h)
+        return h
+
+    def _scan(self):
+        """Re-lists unsummarized chunks of every collection whose index version moved."""
+        if self.done is None:
+            self.done = self.store.hashes()
+        changed = False
+        for source in self.sources:
+            version = source.sync()
+            if self.seen_versions.get(source.name) != version:
+                self.seen_versions[source.name] = version
+                changed = True
+        if not changed:
+            return
+        pending, queued, live = [], set(), set()
+        for source in self.sources:
+            for doc_id, doc in list(source.agent.lexical_index.docs.items()):
+                live.add((source.name, doc_id))
+                if len(doc["text"]) < self.min_chars:
+                    continue
+                h = self._hash(source.name, doc_id, doc["text"])
+                if h not in self.done and h not in queued:
+                    queued.add(h)
+                    pending.append((h, doc["text"]))
+        self.hashes = {key: value for key, value in self.hashes.items() if key in live}
+        self.pending = pending
+
+    def run_pending(self, limit=None):
+        """Summarizes up to `limit` chunks (SUMMARIES_PER_PASS). Returns how many were written."""
+        limit = limit or int(get_config_value("SUMMARIES_PER_PASS", "3"))
+        self._scan()
+        if not self.pending:
+            return 0
+        provider = self.provider()
+        if provider is None:
+            return 0
+        model, generate = provider
+        written = 0
+        while self.pending and written < limit:
+            h, text = self.pending.pop()
+            try:
+                summary = " ".join(generate(SUMMARY_PROMPT.format(text=text[:4000])).split())
+            except Exception as e:
+                self.stats["failed"] += 1
+                self.pending.append((h, text))
+                # Probe again on the next pass instead of hammering a broken provider
+                self.checked_at = 0.0
+                self.cached_provider = None
+                print(f"⚠️ Summary generation failed ({model}): {e}")
+                break
+            if summary:
+                self.store.put(h, summary, model)
+                self.done.add(h)
+                written += 1
+        self.stats["summarized"] += written
+        return written
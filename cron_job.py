@@ -39,21 +39,28 @@ def run_sync():
         print("Error: Calendar service not available.")
         return
         
-    busy_slots = calendar_manager.get_busy_slots(service, calendar_id=calendar_id)
+    from calendar_agent import CalendarAgent
+    busy_slots = CalendarAgent().get_fresh_busy_slots()
     
     # 5. AI Orchestration
     print("Consulting AI scheduler...")
     logseq_path = main.get_config_value("LOGSEQ_DIR", None)
-    schedule = ai_orchestration.generate_schedule(
+    result = ai_orchestration.generate_schedule(
         tasks, 
         busy_slots, 
         workspace_dir=obsidian_path, 
-        logseq_dir=logseq_path
+        logseq_dir=logseq_path,
+        # No watcher runs between cron jobs: let the indexer catch up with the notes first
+        index_wait=float(main.get_config_value("CRON_INDEX_WAIT_SECONDS", "120"))
     )
     
+    # Repair overlaps and conflicts locally before anything is booked
+    from planning_agent import PlanningAgent
+    schedule = PlanningAgent(service, calendar_id).validate(result.get("schedule", []), replace=True) if result else []
+    
     if schedule:
-        # 6. Sync to Google Calendar
-        calendar_manager.create_events(service, schedule, calendar_id=calendar_id)
+        # 6. Sync to Google Calendar (a second run the same day changes nothing)
+        calendar_manager.reconcile_events(service, schedule, calendar_id=calendar_id, replace=True)
         
         # 7. Write back to Markdown (Obsidian)
         if os.path.exists(obsidian_path):
@@ -0,0 +1,142 @@
+import os
+import array
+import sqlite3
+import hashlib
+import threading
+from config_utils import get_config_value
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+
+def normalize_text(text):
+    """Collapses whitespace so identical passages from different files share a cache entry."""
+    return " ".join((text or "").split())
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+def get_model_version():
+    """
+    Version string stored with every vector. Reads package metadata only,
+    so the (heavy) sentence-transformers/torch import is not triggered.
+    """
+    override = get_config_value("EMBEDDING_MODEL_VERSION", None)
+    if override:
+        return override
+    try:
+        from importlib.metadata import version
+        return f"sentence-transformers-{version('sentence-transformers')}"
+    except Exception:
+        return "unknown"
+
+class EmbeddingCache:
+    """
+    Persistent content-hash -> vector store backed by SQLite.
+    Keyed by (model name, model version, hash of the normalized text).
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                model_version TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, model_version, text_hash)
+            )
+        """)
+        self.conn.commit()
+
+    def get_many(self, model, model_version, hashes):
+        """Returns {hash: vector} for every hash already in the cache."""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self.lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model=? AND model_version=? AND text_hash IN ({placeholders})",
+                    [model, model_version] + chunk
+                ).fetchall()
+                for h, blob in rows:
+                    vector = array.array('f')
+                    vector.frombytes(blob)
+                    found[h] = vector.tolist()
+        return found
+
+    def put_many(self, model, model_version, items):
+        """Stores (hash, vector) pairs."""
+        rows = []
+        for h, vector in items:
+            packed = array.array('f', [float(x) for x in vector])
+            rows.append((model, model_version, h, len(packed), packed.tobytes()))
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            self.conn.commit()
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+class CachedEmbeddingFunction:
+    """
+    Embedding function with a persistent cache in front of it.
+    The underlying model is only loaded when a text is not cached yet,
+    so full rebuilds of already-seen content cost disk reads instead of inference.
+    """
+    def __init__(self, model_name=DEFAULT_MODEL, cache_path="vector_db/embedding_cache.sqlite3", base_fn=None):
+        self.model_name = model_name
+        self.model_version = get_model_version()
+        self.cache = EmbeddingCache(cache_path)
+        self._base_fn = base_fn
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def base_fn(self):
+        if self._base_fn is None:
+            # Imported here: torch is only loaded when something actually needs embedding
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(self.model_name, device="cpu")
+            self._base_fn = lambda texts: model.encode(list(texts), convert_to_numpy=True)
+        return self._base_fn
+
+    def __call__(self, texts):
+        normalized = [normalize_text(t) for t in texts]
+        hashes = [hashlib.sha256(t.encode("utf-8")).hexdigest() for t in normalized]
+        found = self.cache.get_many(self.model_name, self.model_version, hashes)
+
+        missing = {}
+        for h, text in zip(hashes, normalized):
+            if h not in found and h not in missing:
+                missing[h] = text
+        self.hits += len(hashes) - len([h for h in hashes if h in missing])
+        self.misses += len(missing)
+
+        if missing:
+            with self.lock:
+                vectors = self.base_fn(list(missing.values()))
+            computed = [(h, [float(x) for x in v]) for h, v in zip(missing.keys(), vectors)]
+            self.cache.put_many(self.model_name, self.model_version, computed)
+            found.update(computed)
+
+        return [found[h] for h in hashes]
+
+_functions = {}
+_functions_lock = threading.Lock()
+
+def get_embedding_function(db_path="vector_db", model_name=DEFAULT_MODEL):
+    """Returns the process-wide cached embedding function shared by RAGAgent and BookAgent."""
+    cache_path = os.path.join(db_path, "embedding_cache.sqlite3")
+    key = (os.path.abspath(cache_path), model_name)
+    with _functions_lock:
+        if key not in _functions:
+            _functions[key] = CachedEmbeddingFunction(model_name=model_name, cache_path=cache_path)
+        return _functions[key]
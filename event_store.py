@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import sqlite3
+import datetime
+import threading
+from googleapiclient.errors import HttpError
+from config_utils import get_config_value
+
+def _timestamp(value):
+    """POSIX timestamp of an RFC 3339 dateTime or an all-day date (local midnight)."""
+    if 'T' in value:
+        return datetime.datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    return datetime.datetime.strptime(value, '%Y-%m-%d').timestamp()
+
+def day_bounds(date_str=None):
+    """Local midnight to the next midnight, as timestamps."""
+    if date_str:
+        day = datetime.datetime.strptime(date_str, '%Y-%m-%d')
+    else:
+        day = datetime.datetime.now()
+    start = day.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start.timestamp(), (start + datetime.timedelta(days=1)).timestamp()
+
+def unique_calendars(calendar_ids):
+    """Calendar ids in order, without duplicates (CALENDAR_ID is often 'primary' too)."""
+    if isinstance(calendar_ids, str):
+        calendar_ids = [calendar_ids]
+    return list(dict.fromkeys(calendar_ids))
+
+class CalendarEventStore:
+    """
+    Local copy of the Google Calendar events in a multi-day window, kept in SQLite
+    (<data_dir>/calendar_events.sqlite3) and shared by every process.
+
+    sync() transfers only what changed since the last call, using the calendar's
+    syncToken. The first sync of a calendar lists the whole window. A full resync
+    also happens when the token has expired (410 Gone) and when the window has moved
+    on to a new day. calendar_manager reads busy slots and AI-managed events from here.
+    """
+    def __init__(self, path, past_days=None, future_days=None):
+        self.path = path
+        self.past_days = past_days if past_days is not None else int(get_config_value("CALENDAR_SYNC_PAST_DAYS", "1"))
+        self.future_days = future_days if future_days is not None else int(get_config_value("CALENDAR_SYNC_FUTURE_DAYS", "7"))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                calendar_id TEXT NOT NULL,
+                event_id TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                start TEXT NOT NULL,
+                end TEXT NOT NULL,
+                start_ts REAL NOT NULL,
+                end_ts REAL NOT NULL,
+                all_day INTEGER NOT NULL,
+                event TEXT NOT NULL,
+                PRIMARY KEY (calendar_id, event_id)
+            );
+            CREATE INDEX IF NOT EXISTS events_by_time ON events (calendar_id, start_ts);
+            CREATE TABLE IF NOT EXISTS sync_state (
+                calendar_id TEXT PRIMARY KEY,
+                sync_token TEXT,
+                window_start REAL NOT NULL,
+                window_end REAL NOT NULL,
+                synced_at REAL NOT NULL
+            );
+        """)
+        self.conn.commit()
+        self.stats = {"full_syncs": 0, "incremental_syncs": 0, "changes": 0}
+
+    def window(self):
+        """(start, end) of the synced window: past_days back to future_days ahead, whole local days."""
+        today = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = today - datetime.timedelta(days=self.past_days)
+        end = today + datetime.timedelta(days=self.future_days + 1)
+        return start.astimezone(), end.astimezone()
+
+    def covers(self, date_str=None):
+        """True if the day lies inside the synced window."""
+        day_start, day_end = day_bounds(date_str)
+        start, end = self.window()
+        return start.timestamp() <= day_start and day_end <= end.timestamp()
+
+    def _state(self, calendar_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT sync_token, window_start, window_end, synced_at FROM sync_state WHERE calendar_id=?",
+                (calendar_id,)
+            ).fetchone()
+        return row
+
+    def _apply(self, calendar_id, items):
+        """Upserts changed events and drops cancelled ones. Returns how many rows changed."""
+        changed = 0
+        with self.lock:
+            for event in items:
+                if event.get('status') == 'cancelled':
+                    cursor = self.conn.execute("DELETE FROM events WHERE calendar_id=? AND event_id=?", (calendar_id, event['id']))
+                    changed += cursor.rowcount
+                    continue
+                start = event.get('start', {})
+                end = event.get('end', {})
+                start_value = start.get('dateTime', start.get('date'))
+                end_value = end.get('dateTime', end.get('date'))
+                if not start_value or not end_value:
+                    continue
+                self.conn.execute("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+                    calendar_id, event['id'], event.get('summary', 'No Title'), start_value, end_value,
+                    _timestamp(start_value), _timestamp(end_value), 0 if 'dateTime' in start else 1, json.dumps(event)
+                ))
+                changed += 1
+            self.conn.commit()
+        return changed
+
+    def upsert_events(self, calendar_id, events):
+        """Records events this app just created, so reads see them before the next sync."""
+        return self._apply(calendar_id, [e for e in events if e and e.get('id')])
+
+    def remove_events(self, calendar_id, event_ids):
+        """Forgets events this app just deleted."""
+        return self._apply(calendar_id, [{"id": event_id, "status": "cancelled"} for event_id in event_ids])
+
+    def _list(self, service, calendar_id, **params):
+        """Pages through events.list; returns (items, nextSyncToken)."""
+        items, page_token = [], None
+        while True:
+            response = service.events().list(calendarId=calendar_id, singleEvents=True, showDeleted=True,
+                                             pageToken=page_token, maxResults=250, **params).execute()
+            items.extend(response.get('items', []))
+            next_token = response.get('nextPageToken')
+            if not next_token or next_token == page_token:
+                return items, response.get('nextSyncToken')
+            page_token = next_token
+
+    def _full_sync(self, service, calendar_id):
+        start, end = self.window()
+        items, sync_token = self._list(service, calendar_id, timeMin=start.isoformat(), timeMax=end.isoformat())
+        with self.lock:
+            self.conn.execute("DELETE FROM events WHERE calendar_id=?", (calendar_id,))
+            self.conn.commit()
+        changed = self._apply(calendar_id, items)
+        self._save_state(calendar_id, sync_token, start.timestamp(), end.timestamp())
+        self.stats["full_syncs"] += 1
+        return changed
+
+    def _save_state(self, calendar_id, sync_token, window_start, window_end):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?, ?)",
+                              (calendar_id, sync_token, window_start, window_end, time.time()))
+            self.conn.commit()
+
+    def sync(self, service, calendar_ids):
+        """Brings the local copy of each calendar up to date. Returns the number of changed events."""
+        start, end = self.window()
+        changed = 0
+        for calendar_id in unique_calendars(calendar_ids):
+            state = self._state(calendar_id)
+            try:
+                if not state or not state[0] or state[1] != start.timestamp() or state[2] != end.timestamp():
+                    changed += self._full_sync(service, calendar_id)
+                    continue
+                try:
+                    items, sync_token = self._list(service, calendar_id, syncToken=state[0])
+                except HttpError as e:
+                    if getattr(e.resp, 'status', None) != 410:
+                        raise
+                    # The sync token expired: start over from a full listing
+                    print(f"CalendarEventStore: Sync token for {calendar_id} expired, resyncing.")
+                    changed += self._full_sync(service, calendar_id)
+                    continue
+                changed += self._apply(calendar_id, items)
+                self._save_state(calendar_id, sync_token or state[0], state[1], state[2])
+                self.stats["incremental_syncs"] += 1
+            except Exception as e:
+                print(f"Error syncing calendar {calendar_id}: {e}")
+        self.stats["changes"] += changed
+        return changed
+
+    def is_fresh(self, calendar_ids, max_age=None):
+        """True if every calendar was synced within max_age seconds for the current window."""
+        max_age = max_age if max_age is not None else float(get_config_value("CALENDAR_SYNC_MAX_AGE", "900"))
+        start, end = self.window()
+        for calendar_id in unique_calendars(calendar_ids):
+            state = self._state(calendar_id)
+            if not state or time.time() - state[3] > max_age or (state[1], state[2]) != (start.timestamp(), end.timestamp()):
+                return False
+        return True
+
+    def events(self, calendar_ids, start_ts, end_ts):
+        """Stored events overlapping [start_ts, end_ts), ordered by start."""
+        calendar_ids = unique_calendars(calendar_ids)
+        placeholders = ",".join("?" * len(calendar_ids))
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT calendar_id, summary, start, end, all_day, event FROM events "
+                f"WHERE calendar_id IN ({placeholders}) AND start_ts < ? AND end_ts > ? ORDER BY start_ts",
+                calendar_ids + [end_ts, start_ts]
+            ).fetchall()
+        return [{"calendar_id": c, "summary": s, "start": st, "end": en, "all_day": bool(a), "event": json.loads(ev)}
+                for c, s, st, en, a, ev in rows]
+
+    def next_start(self, calendar_ids, after_ts):
+        """Start timestamp of the first timed event after after_ts, or None."""
+        calendar_ids = unique_calendars(calendar_ids)
+        placeholders = ",".join("?" * len(calendar_ids))
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT MIN(start_ts) FROM events WHERE calendar_id IN ({placeholders}) AND start_ts > ? AND all_day = 0",
+                calendar_ids + [after_ts]
+            ).fetchone()
+        return row[0]
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_event_store(data_dir="datainput"):
+    """Returns the process-wide event store for a data directory."""
+    path = os.path.join(data_dir, "calendar_events.sqlite3")
+    key = os.path.abspath(path)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = CalendarEventStore(path)
+        return _stores[key]
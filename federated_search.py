@@ -0,0 +1,182 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from config_utils import get_config_value
+from chunk_summaries import get_summary_store
+
+class SearchSource:
+    """
+    One searchable collection: wraps an agent exposing `retrieve(query, n_results)`,
+    `sync_generation()` and `lexical_index` (RAGAgent, BookAgent, or any future agent).
+    """
+    def __init__(self, name, label, agent, describe, weight=1.0):
+        self.name = name
+        self.label = label
+        self.agent = agent
+        self.describe = describe
+        self.weight = weight
+        self.lock = threading.Lock()
+
+    def _sync(self):
+        agent = self.agent
+        agent.sync_generation()
+        agent.lexical_index.refresh()
+        return [agent.physical_name, agent.index_version.get(agent.physical_name)]
+
+    def sync(self):
+        """
+        Follows rebuilds and picks up what the indexer (or another process) saved since
+        the last query. Returns the [physical_name, index version] now being searched.
+        """
+        with self.lock:
+            return self._sync()
+
+    def search(self, query, n_results, filters=None):
+        agent = self.agent
+        # The lock is held through the query: a reload by another thread's sync would
+        # otherwise swap the BM25 maps out from under it
+        with self.lock:
+            self._sync()
+            if agent.is_empty():
+                return []
+            return agent.retrieve(query, n_results=n_results, **(filters or {}))
+
+def describe_note(hit):
+    return f"From '{os.path.basename(hit['metadata'].get('path', hit['id']))}'"
+
+def describe_book(hit):
+    meta = hit['metadata']
+    location = f"Page {meta.get('page')}" if 'page' in meta else f"Section {meta.get('index')}"
+    return f"From '{meta.get('book', 'Unknown Book')}' ({location})"
+
+def parse_quotas(value):
+    """Parses "markdown_notes=3,book_library=2" into a dict."""
+    quotas = {}
+    for part in (value or "").split(","):
+        if "=" in part:
+            name, count = part.split("=", 1)
+            quotas[name.strip()] = int(count)
+    return quotas
+
+class FederatedSearch:
+    """
+    Queries every source in parallel and merges the hits into one ranked list.
+
+    Each source already returns scores normalized to 0..1 (see hybrid_retrieve);
+    they are multiplied by the source weight and merged. Every source with a match
+    gets its best hit in, then the rest is filled by score without exceeding the
+    per-source quota. A source that does not answer within `timeout` is left out.
+    With a summary store (chunk_summaries), passages are shown by their summary.
+    """
+    def __init__(self, sources, quotas=None, timeout=None, max_workers=8, summaries=None):
+        self.sources = sources
+        self.summaries = summaries
+        self.quotas = quotas if quotas is not None else parse_quotas(get_config_value("FEDERATED_SEARCH_QUOTAS", ""))
+        self.timeout = timeout or float(get_config_value("FEDERATED_SEARCH_TIMEOUT", "5"))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="federated-search")
+
+    def add_source(self, source):
+        self.sources.append(source)
+
+    def source(self, name):
+        return next((s for s in self.sources if s.name == name), None)
+
+    def search(self, queries, n_results=6, filters=None):
+        """
+        Returns up to n_results hits (each with an added "source" key) for one query
+        or a list of queries. With several queries, a passage keeps its best score.
+        filters maps a source name to keyword filters for its retrieve(), e.g.
+        {"markdown_notes": {"source": "Logseq"}, "book_library": {"book": "Deep Work.pdf"}}.
+        """
+        filters = filters or {}
+        if isinstance(queries, str):
+            queries = [queries]
+        per_query = max(n_results, 3)
+        futures = {
+            self.executor.submit(source.search, query, per_query, filters.get(source.name)): source
+            for source in self.sources for query in queries if query
+        }
+        done, not_done = wait(futures, timeout=self.timeout)
+        for future in not_done:
+            future.cancel()
+            print(f"⚠️ Search in {futures[future].label} timed out, skipping it.")
+
+        best = {}
+        for future in done:
+            source = futures[future]
+            try:
+                hits = future.result()
+            except Exception as e:
+                print(f"⚠️ Search in {source.label} failed: {e}")
+                continue
+            for hit in hits:
+                key = (source.name, hit["id"])
+                score = hit["score"] * source.weight
+                if key not in best or score > best[key]["score"]:
+                    best[key] = dict(hit, score=score, source=source.name)
+        return self._merge(best.values(), n_results)
+
+    def _merge(self, hits, n_results):
+        ranked = sorted(hits, key=lambda h: h["score"], reverse=True)
+        picked, picked_ids, counts = [], set(), {}
+
+        def take(hit):
+            picked.append(hit)
+            picked_ids.add((hit["source"], hit["id"]))
+            counts[hit["source"]] = counts.get(hit["source"], 0) + 1
+
+        for source in self.sources:
+            top = next((h for h in ranked if h["source"] == source.name), None)
+            if top is not None and self.quotas.get(source.name, n_results) > 0:
+                take(top)
+        for hit in ranked:
+            if len(picked) >= n_results:
+                break
+            if (hit["source"], hit["id"]) in picked_ids or counts.get(hit["source"], 0) >= self.quotas.get(hit["source"], n_results):
+                continue
+            take(hit)
+        return sorted(picked[:n_results], key=lambda h: h["score"], reverse=True)
+
+    def context(self, queries, n_results=6, snippet_chars=300, filters=None):
+        """Formats the merged hits as one context block for a prompt ("" when nothing matched)."""
+        return self.format_context(self.search(queries, n_results=n_results, filters=filters), snippet_chars)
+
+    def format_context(self, hits, snippet_chars=300):
+        if not hits:
+            return ""
+        describe = {s.name: s for s in self.sources}
+        if self.summaries is not None:
+            snippets = self.summaries.snippets(hits, snippet_chars)
+        else:
+            snippets = [hit["document"][:snippet_chars] for hit in hits]
+        lines = ["\nRELEVANT CONTEXT FROM YOUR NOTES AND BOOKS:"]
+        for hit, snippet in zip(hits, snippets):
+            source = describe.get(hit["source"])
+            if source is None:
+                continue
+            snippet = snippet.replace("\n", " ")
+            lines.append(f"- [{source.label}] {source.describe(hit)}: ...{snippet}...")
+        return "\n".join(lines) + "\n"
+
+_searches = {}
+_searches_lock = threading.Lock()
+
+def get_federated_search(workspace_dir=None, logseq_dir=None, books_dir=None, db_path="vector_db"):
+    """
+    Returns the process-wide federated search over notes (markdown_notes) and books
+    (book_library). The agents stay loaded between calls, so chat messages do not
+    reload the indexes. Register more collections with add_source().
+    """
+    from rag_agent import RAGAgent
+    from book_agent import BookAgent
+
+    books_dir = books_dir or get_config_value("BOOKS_DIR", None)
+    key = (workspace_dir, logseq_dir, books_dir, os.path.abspath(db_path))
+    with _searches_lock:
+        if key not in _searches:
+            sources = []
+            if workspace_dir or logseq_dir:
+                sources.append(SearchSource("markdown_notes", "Notes", RAGAgent(workspace_dir, logseq_dir, db_path=db_path), describe_note))
+            sources.append(SearchSource("book_library", "Books", BookAgent(books_dir=books_dir, db_path=db_path), describe_book))
+            _searches[key] = FederatedSearch(sources, summaries=get_summary_store(db_path))
+        return _searches[key]
@@ -0,0 +1,43 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, writers are only atomic
+    fcntl = None
+
+def write_atomic(path, write, encoding=None):
+    """
+    Writes a file atomically: write(f) fills a temporary file next to `path`, which
+    then replaces it, so readers never see half a file. Every call gets its own
+    temporary file, so concurrent writers (threads or processes) never share one;
+    the last rename wins.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+@contextmanager
+def file_lock(path):
+    """
+    Exclusive advisory lock on <path>.lock, held for the block. Serializes
+    read-merge-write cycles on one file across processes.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
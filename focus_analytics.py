@@ -0,0 +1,200 @@
+import os
+import sqlite3
+import datetime
+import threading
+from config_utils import get_config_value
+
+# Title keywords used when an event carries no category (events booked before categories were stored)
+CATEGORY_KEYWORDS = ["winedragons", "dev", "writing", "learning"]
+
+def event_category(event):
+    """Category of an AI-managed event: the one stored at booking time, else guessed from the title."""
+    private = event.get('extendedProperties', {}).get('private', {})
+    if private.get('ai_category'):
+        return private['ai_category']
+    title = event.get('summary', '').lower()
+    for keyword in CATEGORY_KEYWORDS:
+        if keyword in title:
+            return keyword.title()
+    return "General"
+
+def week_of(day):
+    """ISO week label of a date, e.g. 2026-W43."""
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+class FocusStore:
+    """
+    Time series of AI-managed focus sessions with per-day and per-week hours by
+    category, in SQLite (<data_dir>/focus_analytics.sqlite3).
+
+    The rollup tables are updated incrementally as sessions are added, moved or
+    removed, so reading a day, week or month is one small query. Sessions older
+    than the synced calendar window are kept, which is what makes trends possible.
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                calendar_id TEXT NOT NULL,
+                event_id TEXT NOT NULL,
+                task TEXT NOT NULL,
+                category TEXT NOT NULL,
+                day TEXT NOT NULL,
+                week TEXT NOT NULL,
+                start_ts REAL NOT NULL,
+                hours REAL NOT NULL,
+                PRIMARY KEY (calendar_id, event_id)
+            );
+            CREATE INDEX IF NOT EXISTS sessions_by_time ON sessions (calendar_id, start_ts);
+            CREATE TABLE IF NOT EXISTS daily (
+                day TEXT NOT NULL,
+                category TEXT NOT NULL,
+                hours REAL NOT NULL,
+                sessions INTEGER NOT NULL,
+                PRIMARY KEY (day, category)
+            );
+            CREATE TABLE IF NOT EXISTS weekly (
+                week TEXT NOT NULL,
+                category TEXT NOT NULL,
+                hours REAL NOT NULL,
+                sessions INTEGER NOT NULL,
+                PRIMARY KEY (week, category)
+            );
+        """)
+        self.conn.commit()
+
+    def _roll(self, day, week, category, hours, sessions):
+        for table, key in (("daily", ("day", day)), ("weekly", ("week", week))):
+            self.conn.execute(
+                f"INSERT INTO {table} ({key[0]}, category, hours, sessions) VALUES (?, ?, ?, ?) "
+                f"ON CONFLICT ({key[0]}, category) DO UPDATE SET hours = hours + excluded.hours, sessions = sessions + excluded.sessions",
+                (key[1], category, hours, sessions)
+            )
+            self.conn.execute(f"DELETE FROM {table} WHERE sessions <= 0")
+
+    def sync(self, calendar_id, events, start_ts, end_ts):
+        """
+        Makes the sessions starting in [start_ts, end_ts) match `events` (the managed
+        events of that range, as stored by the event store). Only the difference
+        touches the rollups. Returns how many sessions changed.
+        """
+        wanted = {}
+        for event in events:
+            start = datetime.datetime.fromisoformat(event['start']['dateTime'].replace('Z', '+00:00')).astimezone()
+            end = datetime.datetime.fromisoformat(event['end']['dateTime'].replace('Z', '+00:00')).astimezone()
+            wanted[event['id']] = (
+                event.get('summary', '').replace("AI: ", "", 1).strip(), event_category(event),
+                start.date().isoformat(), week_of(start.date()), start.timestamp(),
+                max((end - start).total_seconds(), 0) / 3600
+            )
+        changed = 0
+        with self.lock:
+            # The diff is read and applied in one write transaction, so two processes
+            # syncing the same range cannot both apply the same delta to the rollups
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = {
+                    row[0]: row[1:]
+                    for row in self.conn.execute(
+                        "SELECT event_id, task, category, day, week, start_ts, hours FROM sessions "
+                        "WHERE calendar_id=? AND start_ts >= ? AND start_ts < ?", (calendar_id, start_ts, end_ts))
+                }
+                for event_id, row in current.items():
+                    if wanted.get(event_id) != row:
+                        self.conn.execute("DELETE FROM sessions WHERE calendar_id=? AND event_id=?", (calendar_id, event_id))
+                        self._roll(row[2], row[3], row[1], -row[5], -1)
+                        changed += 1
+                for event_id, row in wanted.items():
+                    if current.get(event_id) == row:
+                        continue
+                    previous = self.conn.execute(
+                        "SELECT day, week, category, hours FROM sessions WHERE calendar_id=? AND event_id=?",
+                        (calendar_id, event_id)).fetchone()
+                    if previous:
+                        # Moved in from outside the synced range
+                        self._roll(previous[0], previous[1], previous[2], -previous[3], -1)
+                    self.conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (calendar_id, event_id) + row)
+                    self._roll(row[2], row[3], row[1], row[5], 1)
+                    changed += event_id not in current
+            except Exception:
+                self.conn.rollback()
+                raise
+            self.conn.commit()
+        return changed
+
+    def hours(self, start_day, end_day):
+        """{category: hours} for the days in [start_day, end_day] (dates or ISO strings)."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT category, SUM(hours) FROM daily WHERE day >= ? AND day <= ? GROUP BY category ORDER BY category",
+                (str(start_day), str(end_day))
+            ).fetchall()
+        return dict(rows)
+
+    def day(self, day=None):
+        day = day or datetime.date.today()
+        return self.hours(day, day)
+
+    def week(self, day=None):
+        """{category: hours} of the ISO week containing `day`, from the weekly rollup."""
+        label = week_of(day or datetime.date.today())
+        with self.lock:
+            rows = self.conn.execute("SELECT category, hours FROM weekly WHERE week=? ORDER BY category", (label,)).fetchall()
+        return dict(rows)
+
+    def month(self, year=None, month=None):
+        today = datetime.date.today()
+        first = datetime.date(year or today.year, month or today.month, 1)
+        last = (first + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+        return self.hours(first, last)
+
+    def trend(self, periods=8, by="week"):
+        """[(period, category, hours)] for the last `periods` days or weeks, oldest first."""
+        today = datetime.date.today()
+        if by == "day":
+            start = (today - datetime.timedelta(days=periods - 1)).isoformat()
+            query = "SELECT day, category, hours FROM daily WHERE day >= ? ORDER BY day, category"
+        else:
+            start = week_of(today - datetime.timedelta(weeks=periods - 1))
+            query = "SELECT week, category, hours FROM weekly WHERE week >= ? ORDER BY week, category"
+        with self.lock:
+            return self.conn.execute(query, (start,)).fetchall()
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_focus_store(data_dir="datainput"):
+    """Returns the process-wide focus store for a data directory."""
+    path = os.path.join(data_dir, "focus_analytics.sqlite3")
+    key = os.path.abspath(path)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = FocusStore(path)
+        return _stores[key]
+
+def refresh_focus_analytics(calendar_id=None, event_store=None, focus_store=None, service=None):
+    """
+    Records the AI-managed events of the local event store's window into the focus
+    store; returns how many sessions changed. Local only, unless a service is given
+    and the store is stale (no background sync running): it is then synced first.
+    """
+    from event_store import get_event_store
+
+    calendar_id = calendar_id or get_config_value("CALENDAR_ID", "primary")
+    event_store = event_store or get_event_store()
+    focus_store = focus_store or get_focus_store()
+    if service and not event_store.is_fresh([calendar_id]):
+        event_store.sync(service, [calendar_id])
+    start, end = event_store.window()
+    events = [
+        e["event"] for e in event_store.events([calendar_id], start.timestamp(), end.timestamp())
+        if e["summary"].startswith("AI: ") and not e["all_day"]
+        # Only sessions starting inside the window: those are the ones the store can vouch for
+        and start.timestamp() <= datetime.datetime.fromisoformat(e["start"].replace('Z', '+00:00')).timestamp() < end.timestamp()
+    ]
+    return focus_store.sync(calendar_id, events, start.timestamp(), end.timestamp())
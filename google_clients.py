@@ -0,0 +1,201 @@
+import os
+import json
+import datetime
+import threading
+import httplib2
+import requests
+import google_auth_httplib2
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import HttpRequest
+from config_utils import get_config_value
+from file_utils import write_atomic
+
+# If modifying these scopes, delete the file token.json.
+SCOPES = [
+    'https://www.googleapis.com/auth/calendar',
+    'https://www.googleapis.com/auth/gmail.readonly'
+]
+
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/{api}/{version}/rest"
+
+class GoogleClientManager:
+    """
+    One set of Google credentials and one built service object per API for the whole process.
+
+    Credentials are read from token.json once and kept in memory. A timer refreshes
+    them `refresh_margin` seconds before they expire, so no caller waits on a token
+    refresh. If another process rewrote token.json, it is reloaded.
+
+    Services are built from a local discovery document: the one bundled with
+    google-api-python-client, or one fetched once into `cache_dir`. Every request
+    gets its own AuthorizedHttp, because httplib2 connections are not thread-safe.
+    This makes the shared service objects safe to use from the chat loop, the
+    background sync and Streamlit threads at the same time.
+    """
+    def __init__(self, token_path='token.json', credentials_path='credentials.json', scopes=None,
+                 cache_dir=None, refresh_margin=300):
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.scopes = scopes or SCOPES
+        self.cache_dir = cache_dir or get_config_value("GOOGLE_DISCOVERY_CACHE_DIR", os.path.join("vector_db", "google_discovery"))
+        self.refresh_margin = refresh_margin
+        self.lock = threading.RLock()
+        self.creds = None
+        self.token_mtime = None
+        self.services = {}
+        self.timer = None
+        self.stats = {"loads": 0, "refreshes": 0, "builds": 0}
+
+    def _expiring(self, creds):
+        if creds.expiry is None:
+            return not creds.valid
+        # google-auth keeps expiry as a naive UTC datetime
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return creds.expiry - now < datetime.timedelta(seconds=self.refresh_margin)
+
+    def _save(self, creds):
+        write_atomic(self.token_path, lambda token: token.write(creds.to_json()))
+        self.token_mtime = os.path.getmtime(self.token_path)
+
+    def _load(self):
+        """Reads token.json if it was never read or another process rewrote it."""
+        try:
+            mtime = os.path.getmtime(self.token_path)
+        except OSError:
+            return
+        if mtime == self.token_mtime and self.creds is not None:
+            return
+        creds = Credentials.from_authorized_user_file(self.token_path, self.scopes)
+        self.token_mtime = mtime
+        self.stats["loads"] += 1
+        if self.creds is None:
+            self.creds = creds
+        else:
+            # Update in place: built services hold a reference to this object
+            self.creds.token = creds.token
+            self.creds.expiry = creds.expiry
+
+    def _refresh(self):
+        self.creds.refresh(Request())
+        self.stats["refreshes"] += 1
+        self._save(self.creds)
+
+    def _schedule_refresh(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.creds is None or self.creds.expiry is None or not self.creds.refresh_token:
+            return
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        delay = (self.creds.expiry - now).total_seconds() - self.refresh_margin
+        self.timer = threading.Timer(max(delay, 1.0), self._refresh_in_background)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _refresh_in_background(self):
+        with self.lock:
+            self.timer = None
+            try:
+                self._load()
+                if self._expiring(self.creds):
+                    self._refresh()
+            except Exception as e:
+                print(f"⚠️ Google token refresh failed, retrying in a minute: {e}")
+                self.timer = threading.Timer(60.0, self._refresh_in_background)
+                self.timer.daemon = True
+                self.timer.start()
+                return
+            self._schedule_refresh()
+
+    def credentials(self):
+        """Valid credentials, or None when the user has not authorized the app yet."""
+        with self.lock:
+            self._load()
+            creds = self.creds
+            if creds and not self._expiring(creds):
+                if self.timer is None:
+                    self._schedule_refresh()
+                return creds
+            if creds and creds.refresh_token:
+                try:
+                    self._refresh()
+                except RefreshError as e:
+                    print(f"An error occurred: {e}")
+                    if "invalid_scope" in str(e):
+                        print("💡 TIP: You likely have an old 'token.json'. Delete it and run the script again to re-authenticate.")
+                    return None
+            else:
+                if not os.path.exists(self.credentials_path):
+                    print("Error: 'credentials.json' not found. Please download it from Google Cloud Console.")
+                    return None
+                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, self.scopes)
+                self.creds = flow.run_local_server(port=0)
+                self._save(self.creds)
+                self.services.clear()
+            self._schedule_refresh()
+            return self.creds
+
+    def discovery_document(self, api, version):
+        """The API's discovery document from the bundled copy or the local cache (fetched once)."""
+        doc = get_static_doc(api, version)
+        if doc:
+            return doc
+        path = os.path.join(self.cache_dir, f"{api}.{version}.json")
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return f.read()
+        response = requests.get(DISCOVERY_URL.format(api=api, version=version), timeout=30)
+        response.raise_for_status()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        write_atomic(path, lambda f: f.write(response.text))
+        return response.text
+
+    def service(self, api, version):
+        """The shared service object for an API (built once), or None without credentials."""
+        creds = self.credentials()
+        if creds is None:
+            return None
+        with self.lock:
+            key = (api, version)
+            if key not in self.services:
+                def build_request(http, *args, **kwargs):
+                    # A fresh connection per request: the service is shared between threads
+                    return HttpRequest(google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http()), *args, **kwargs)
+
+                self.services[key] = build_from_document(
+                    json.loads(self.discovery_document(api, version)),
+                    http=google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http()),
+                    requestBuilder=build_request
+                )
+                self.stats["builds"] += 1
+            return self.services[key]
+
+    def close(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_client_manager(token_path='token.json', credentials_path='credentials.json'):
+    """Returns the process-wide client manager for a token file."""
+    key = os.path.abspath(token_path)
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = GoogleClientManager(token_path, credentials_path)
+        return _managers[key]
+
+def get_service(api, version):
+    """Shared, thread-safe service object for a Google API (None if not authorized)."""
+    try:
+        return get_client_manager().service(api, version)
+    except Exception as e:
+        print(f'An error occurred: {e}')
+        return None
@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import threading
+from file_utils import write_atomic
+
+def physical_name(name, generation):
+    """Storage name of one generation: generation 0 keeps the original name."""
+    return name if not generation else f"{name}__v{generation}"
+
+class CollectionPointer:
+    """
+    Which generation of each logical collection (markdown_notes, book_library) is live.
+
+    Stored in <db_path>/collection_pointers.json and switched with an atomic rename,
+    so every reader sees either the old or the new generation, never a mix.
+    Replaced generations are listed under "retired" until they are garbage-collected.
+    Only one rebuild per collection is expected to run at a time.
+    """
+    def __init__(self, db_path):
+        self.path = os.path.join(db_path, "collection_pointers.json")
+        self.lock = threading.Lock()
+        self.data = {"live": {}, "retired": []}
+        self.mtime = None
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self.mtime:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.data = json.load(f)
+            self.mtime = mtime
+        except (OSError, ValueError):
+            pass
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        write_atomic(self.path, lambda f: json.dump(self.data, f))
+        self.mtime = os.path.getmtime(self.path)
+
+    def current(self, name):
+        """Live generation of a collection (one stat when nothing changed)."""
+        with self.lock:
+            self._reload()
+            return self.data["live"].get(name, 0)
+
+    def next_generation(self, name):
+        with self.lock:
+            self._reload()
+            building = self.data.setdefault("building", {})
+            if name in building:
+                # Left over from a rebuild that crashed: collect it with the other retired ones
+                self.data["retired"].append([name, building[name], 0])
+            used = [self.data["live"].get(name, 0)] + [g for n, g, _ in self.data["retired"] if n == name]
+            generation = max(used) + 1
+            building[name] = generation
+            self._save()
+            return generation
+
+    def swap(self, name, generation):
+        """Atomically makes `generation` live and retires the previous one."""
+        with self.lock:
+            self._reload()
+            previous = self.data["live"].get(name, 0)
+            self.data["live"][name] = generation
+            self.data["retired"].append([name, previous, time.time()])
+            self.data.get("building", {}).pop(name, None)
+            self._save()
+            return previous
+
+    def abandon(self, name):
+        """Forgets the shadow generation being built (the caller drops its files)."""
+        with self.lock:
+            self._reload()
+            self.data.get("building", {}).pop(name, None)
+            self._save()
+
+    def collect(self, name, grace_seconds):
+        """Removes and returns the generations of `name` retired more than grace_seconds ago."""
+        with self.lock:
+            self._reload()
+            now = time.time()
+            live = self.data["live"].get(name, 0)
+            expired, kept = [], []
+            for entry in self.data["retired"]:
+                n, g, at = entry
+                if n == name and now - at >= grace_seconds:
+                    if g != live:
+                        expired.append(g)
+                else:
+                    kept.append(entry)
+            if len(kept) != len(self.data["retired"]):
+                self.data["retired"] = kept
+                self._save()
+            return expired
+
+_pointers = {}
+_pointers_lock = threading.Lock()
+
+def get_collection_pointer(db_path):
+    key = os.path.abspath(db_path)
+    with _pointers_lock:
+        if key not in _pointers:
+            _pointers[key] = CollectionPointer(db_path)
+        return _pointers[key]
+
+def blue_green_rebuild(agent_class, db_path, make_shadow, fill, grace_seconds=60):
+    """
+    Rebuilds a collection without touching the live one:
+
+        make_shadow(generation) -> agent writing to a new, empty generation
+        fill(shadow)            -> indexes everything into it
+
+    Once fill() returns, the pointer is switched atomically. If it raises, the
+    shadow is discarded and the live generation stays as it was. Generations
+    retired more than grace_seconds ago are dropped (readers that still hold the
+    old one open get that long to finish); the one just replaced is dropped by a
+    daemon timer once its own grace period is over.
+    """
+    name = agent_class.collection_name
+    pointer = get_collection_pointer(db_path)
+    generation = pointer.next_generation(name)
+    shadow = make_shadow(generation)
+    try:
+        fill(shadow)
+        shadow._flush()
+    except BaseException:
+        pointer.abandon(name)
+        agent_class.drop_generation(db_path, generation)
+        raise
+    # Cached results are keyed by the physical name, so the old ones are never served again
+    pointer.swap(name, generation)
+    collect_garbage(agent_class, db_path, grace_seconds)
+    _collect_later(agent_class, db_path, grace_seconds)
+    return shadow
+
+def _collect_later(agent_class, db_path, grace_seconds):
+    def collect():
+        try:
+            collect_garbage(agent_class, db_path, grace_seconds)
+        except Exception as e:
+            print(f"⚠️ Could not drop retired {agent_class.collection_name} generations: {e}")
+    # A little past the grace period, so the generation just retired has expired
+    timer = threading.Timer(grace_seconds + 1, collect)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+def collect_garbage(agent_class, db_path, grace_seconds=60):
+    """Drops retired generations of a collection that are past the grace period."""
+    expired = get_collection_pointer(db_path).collect(agent_class.collection_name, grace_seconds)
+    for generation in expired:
+        agent_class.drop_generation(db_path, generation)
+    return expired
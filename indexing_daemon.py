@@ -0,0 +1,265 @@
+import os
+import time
+import heapq
+import datetime
+import threading
+from watchdog.events import PatternMatchingEventHandler
+from config_utils import get_config_value
+from rag_agent import RAGAgent
+from task_links import get_task_linker
+from chunk_summaries import ChunkSummarizer
+
+# Queue priorities (lower runs first)
+PRIORITY_URGENT = 0    # deletions, today's journal, the daily note
+PRIORITY_CHANGED = 1   # any other edited note
+PRIORITY_BACKFILL = 2  # files found stale by a full vault scan
+
+class BackgroundIndexer:
+    """
+    Keeps the notes index up to date from file change events in a daemon thread,
+    so scheduling never pays the indexing cost inline.
+
+    Changed paths go into a de-duplicated priority queue. The worker respects a
+    CPU/IO budget: it only spends `duty_cycle` of wall time indexing and never
+    processes more than `max_files_per_second`.
+
+    When the queue drains, the task links (see task_links.TaskLinker) are refreshed,
+    so the scheduler finds each task's context already computed. Chunk summaries
+    (see chunk_summaries.ChunkSummarizer) run in a second thread, so a slow local
+    model never holds up indexing.
+    """
+    def __init__(self, rag_agent, duty_cycle=None, max_files_per_second=None, settle_seconds=1.0, flush_interval=5.0,
+                 task_linker=None, summarizer=None):
+        self.rag_agent = rag_agent
+        self.task_linker = task_linker
+        self.summarizer = summarizer
+        self.duty_cycle = duty_cycle or float(get_config_value("INDEXER_DUTY_CYCLE", "0.25"))
+        self.max_files_per_second = max_files_per_second or float(get_config_value("INDEXER_MAX_FILES_PER_SECOND", "20"))
+        self.settle_seconds = settle_seconds
+        self.flush_interval = flush_interval
+
+        self.heap = []       # (priority, ready_at, seq, path)
+        self.pending = {}    # path -> (priority, seq, deleted)
+        self.seq = 0
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.summary_thread = None
+        self.summaries_due = threading.Event()
+        self.drained = threading.Event()
+        self.unflushed = 0
+        self.last_flush = time.time()
+        self.stats = {"indexed": 0, "removed": 0, "skipped": 0, "links": 0, "summaries": 0}
+
+    def priority_for(self, path):
+        """Today's journal and the daily note jump the queue."""
+        name = os.path.basename(path)
+        today = datetime.date.today()
+        if name in (f"{today.isoformat()}.md", f"{today.strftime('%Y_%m_%d')}.md", "daily_note.md"):
+            return PRIORITY_URGENT
+        return PRIORITY_CHANGED
+
+    def enqueue(self, path, priority=None, deleted=False):
+        """Queues a path for (re)indexing or removal. Re-queuing keeps the most urgent priority."""
+        if not path.endswith(".md"):
+            return
+        if priority is None:
+            priority = PRIORITY_URGENT if deleted else self.priority_for(path)
+        with self.condition:
+            current = self.pending.get(path)
+            if current and current[0] <= priority and current[2] == deleted:
+                return
+            self.seq += 1
+            self.pending[path] = (priority, self.seq, deleted)
+            self.drained.clear()
+            # Let editors finish their save bursts before reading the file
+            heapq.heappush(self.heap, (priority, time.time() + self.settle_seconds, self.seq, path))
+            self.condition.notify()
+
+    def enqueue_vault(self):
+        """Queues every new or modified note found by a full vault scan (low priority)."""
+        queued = 0
+        for root_dir, path in self.rag_agent.iter_vault_files():
+            if self.rag_agent.needs_indexing(path, root_dir):
+                self.enqueue(path, priority=PRIORITY_BACKFILL)
+                queued += 1
+        return queued
+
+    def wait_until_drained(self, timeout):
+        """
+        Blocks until everything queued so far is indexed and saved, or timeout seconds
+        pass. For callers with no watcher running (e.g. cron) that must not plan on a
+        stale index. Returns True if the queue drained.
+        """
+        return self.drained.wait(timeout)
+
+    def queue_size(self):
+        with self.condition:
+            return len(self.pending)
+
+    def _next(self, timeout):
+        """Pops the next ready path, or returns None after timeout."""
+        with self.condition:
+            deadline = time.time() + timeout
+            while self.running:
+                now = time.time()
+                while self.heap:
+                    priority, ready_at, seq, path = self.heap[0]
+                    entry = self.pending.get(path)
+                    if not entry or entry[1] != seq:
+                        heapq.heappop(self.heap)  # superseded by a newer event
+                        continue
+                    if ready_at <= now:
+                        heapq.heappop(self.heap)
+                        del self.pending[path]
+                        return path, entry[2]
+                    break
+                wait = deadline - now
+                if self.heap:
+                    wait = min(wait, self.heap[0][1] - now)
+                if wait <= 0:
+                    return None
+                self.condition.wait(wait)
+            return None
+
+    def process(self, path, deleted=False):
+        """Indexes or removes one path and returns the seconds spent."""
+        started = time.time()
+        if deleted or not os.path.exists(path):
+            if self.rag_agent.remove_file(path):
+                self.stats["removed"] += 1
+                self.unflushed += 1
+        elif self.rag_agent.needs_indexing(path) and self.rag_agent.index_file(path):
+            self.stats["indexed"] += 1
+            self.unflushed += 1
+        else:
+            self.stats["skipped"] += 1
+        return time.time() - started
+
+    def flush(self):
+        if self.unflushed:
+            self.rag_agent._flush()
+            self.unflushed = 0
+        self.last_flush = time.time()
+
+    def refresh_links(self):
+        """Recomputes the task links made stale by what was just indexed (cheap when nothing changed)."""
+        if self.task_linker is None:
+            return
+        try:
+            self.stats["links"] += self.task_linker.refresh()
+        except Exception as e:
+            print(f"⚠️ Task link refresh failed: {e}")
+
+    def summarize(self):
+        """Summarizes a few chunks with a local model (SUMMARIES_PER_PASS at a time). Returns how many."""
+        if self.summarizer is None:
+            return 0
+        try:
+            done = self.summarizer.run_pending()
+        except Exception as e:
+            print(f"⚠️ Summarization failed: {e}")
+            return 0
+        self.stats["summaries"] += done
+        return done
+
+    def run_summaries(self):
+        """Summary worker: after the queue drains, summarizes pass after pass while no edits are waiting."""
+        while self.running:
+            if not self.summaries_due.wait(self.flush_interval):
+                continue
+            self.summaries_due.clear()
+            while self.running and self.queue_size() == 0 and self.summarize():
+                pass
+
+    def run(self):
+        while self.running:
+            item = self._next(timeout=self.flush_interval)
+            if item is None:
+                # Queue drained: persist what we have, then bring the task links up to date
+                # and let the summary worker use the idle time
+                self.flush()
+                self.refresh_links()
+                with self.condition:
+                    if not self.pending:
+                        self.drained.set()
+                self.summaries_due.set()
+                continue
+            path, deleted = item
+            try:
+                spent = self.process(path, deleted)
+            except Exception as e:
+                print(f"⚠️ Background indexer error on {path}: {e}")
+                spent = 0.0
+            if time.time() - self.last_flush > self.flush_interval:
+                self.flush()
+            # Stay within the CPU/IO budget
+            pause = max(spent * (1 - self.duty_cycle) / self.duty_cycle, 1.0 / self.max_files_per_second)
+            time.sleep(pause)
+        self.flush()
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return self.thread
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        if self.summarizer is not None:
+            self.summary_thread = threading.Thread(target=self.run_summaries, daemon=True)
+            self.summary_thread.start()
+        return self.thread
+
+    def stop(self, timeout=5):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.summaries_due.set()
+        if self.thread:
+            self.thread.join(timeout)
+        if self.summary_thread:
+            self.summary_thread.join(timeout)
+
+class IndexingEventHandler(PatternMatchingEventHandler):
+    """Feeds watchdog events (the same ones TaskSyncHandler sees) into a BackgroundIndexer."""
+    patterns = ["*.md"]
+
+    def __init__(self, indexer):
+        super().__init__(patterns=self.patterns)
+        self.indexer = indexer
+
+    def on_created(self, event):
+        self.indexer.enqueue(event.src_path)
+
+    def on_modified(self, event):
+        self.indexer.enqueue(event.src_path)
+
+    def on_deleted(self, event):
+        self.indexer.enqueue(event.src_path, deleted=True)
+
+    def on_moved(self, event):
+        self.indexer.enqueue(event.src_path, deleted=True)
+        self.indexer.enqueue(event.dest_path)
+
+_indexers = {}
+_indexers_lock = threading.Lock()
+
+def start_background_indexer(workspace_dir, logseq_dir=None, scan=True):
+    """
+    Starts (once per vault) a background indexer thread and returns it.
+    With scan=True, stale and new notes are queued for indexing right away.
+    """
+    key = (workspace_dir, logseq_dir)
+    with _indexers_lock:
+        indexer = _indexers.get(key)
+        if indexer is None:
+            linker = get_task_linker(workspace_dir, logseq_dir)
+            summarizer = None
+            if get_config_value("ENABLE_SUMMARIES", "true").lower() == "true":
+                summarizer = ChunkSummarizer(linker.search.sources, db_path=linker.store.db_path)
+            indexer = BackgroundIndexer(RAGAgent(workspace_dir, logseq_dir), task_linker=linker, summarizer=summarizer)
+            _indexers[key] = indexer
+            indexer.start()
+            if scan:
+                queued = indexer.enqueue_vault()
+                print(f"🗂️ Background indexer started ({queued} notes queued).")
+    return indexer
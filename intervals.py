@@ -0,0 +1,162 @@
+import bisect
+import datetime
+from config_utils import get_config_value
+
+def parse_time(value, tz=None):
+    """Aware datetime from an ISO 8601 string (or datetime). Naive times are taken as local (or tz)."""
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        return value.replace(tzinfo=tz) if tz else value.astimezone()
+    return value
+
+def to_intervals(slots):
+    """(start, end) pairs of aware datetimes from {'start', 'end'} dicts, sorted; empty ranges are dropped."""
+    pairs = [(parse_time(slot['start']), parse_time(slot['end'])) for slot in slots if slot.get('start') and slot.get('end')]
+    return sorted((start, end) for start, end in pairs if end > start)
+
+def merge(intervals):
+    """Merges overlapping or touching (start, end) intervals."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+class IntervalSet:
+    """
+    Disjoint, sorted busy intervals. Overlap queries bisect on the start times, so
+    checking a proposed item costs O(log n) (plus the number of conflicts returned).
+    """
+    def __init__(self, intervals=()):
+        self.intervals = merge(intervals)
+        self.starts = [start for start, _ in self.intervals]
+
+    @classmethod
+    def from_slots(cls, slots):
+        return cls(to_intervals(slots))
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def __iter__(self):
+        return iter(self.intervals)
+
+    def conflicts(self, start, end):
+        """Busy intervals overlapping [start, end)."""
+        # Intervals are disjoint: only the one starting before `start` can reach into it
+        i = max(bisect.bisect_right(self.starts, start) - 1, 0)
+        found = []
+        while i < len(self.intervals) and self.intervals[i][0] < end:
+            if self.intervals[i][1] > start:
+                found.append(self.intervals[i])
+            i += 1
+        return found
+
+    def overlaps(self, start, end):
+        i = bisect.bisect_left(self.starts, end)
+        return i > 0 and self.intervals[i - 1][1] > start
+
+    def add(self, start, end):
+        """Marks [start, end) busy, keeping the set merged."""
+        lo = max(bisect.bisect_right(self.starts, start) - 1, 0)
+        hi = bisect.bisect_right(self.starts, end)
+        if lo < len(self.intervals) and self.intervals[lo][1] < start:
+            lo += 1
+        if lo < hi:
+            start = min(start, self.intervals[lo][0])
+            end = max(end, self.intervals[hi - 1][1])
+        self.intervals[lo:hi] = [(start, end)]
+        self.starts[lo:hi] = [start]
+
+    def free_windows(self, start, end, min_minutes=0):
+        """Gaps of at least min_minutes between the busy intervals within [start, end)."""
+        windows, cursor = [], start
+        for busy_start, busy_end in self.conflicts(start, end):
+            if busy_start > cursor:
+                windows.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        if end > cursor:
+            windows.append((cursor, end))
+        minimum = datetime.timedelta(minutes=min_minutes)
+        return [(s, e) for s, e in windows if e - s >= minimum]
+
+def workday(date, start=None, end=None):
+    """Local [WORKDAY_START, WORKDAY_END) of a date, as aware datetimes."""
+    start = start or get_config_value("WORKDAY_START", "08:00")
+    end = end or get_config_value("WORKDAY_END", "20:00")
+    def at(hhmm):
+        hour, minute = (int(part) for part in hhmm.split(":"))
+        return datetime.datetime.combine(date, datetime.time(hour, minute)).astimezone()
+    return at(start), at(end)
+
+def planning_dates(now=None, days=1):
+    """The days a plan made now covers: from today, or from tomorrow once today's workday is over."""
+    now = parse_time(now) if now else datetime.datetime.now().astimezone()
+    first = now.date()
+    if workday(first)[1] <= now:
+        first += datetime.timedelta(days=1)
+    return [first + datetime.timedelta(days=i) for i in range(days)]
+
+def free_windows(busy, days, min_minutes=15, now=None):
+    """{date: [(start, end)]} free time within the workday of each date, from now on."""
+    busy = busy if isinstance(busy, IntervalSet) else IntervalSet.from_slots(busy)
+    now = parse_time(now) if now else datetime.datetime.now().astimezone()
+    windows = {}
+    for date in days:
+        start, end = workday(date)
+        windows[date] = busy.free_windows(max(start, now), end, min_minutes) if end > now else []
+    return windows
+
+def _span(start, end, date):
+    """HH:MM-HH:MM, with the date on a side that falls on another day."""
+    fmt = lambda moment: moment.strftime("%H:%M") if moment.date() == date else moment.strftime("%Y-%m-%d %H:%M")
+    return f"{fmt(start)}-{fmt(end)}"
+
+def describe_calendar(busy_slots, days=1, min_minutes=15, now=None, dates=None):
+    """
+    Compact calendar text for prompts: merged busy time and the free windows the
+    scheduler may use, per day, in local time:
+
+        Timezone +02:00
+        2026-10-19 busy: 09:00-11:00, 14:00-15:00 | free: 11:00-14:00, 15:00-20:00
+
+    Describes `dates` (dates or ISO strings) when given, else the planning days
+    (see planning_dates). busy_slots must cover those days.
+    """
+    now = parse_time(now) if now else datetime.datetime.now().astimezone()
+    busy = IntervalSet.from_slots(busy_slots)
+    local = [(start.astimezone(), end.astimezone()) for start, end in busy]
+    if dates:
+        dates = sorted({datetime.date.fromisoformat(str(date)) for date in dates})
+    else:
+        dates = planning_dates(now, days)
+    lines = [f"Timezone {now.strftime('%z')[:3]}:{now.strftime('%z')[3:]}"]
+    for date, windows in free_windows(busy, dates, min_minutes, now).items():
+        start, end = workday(date)
+        day_busy = [_span(s.astimezone(), e.astimezone(), date) for s, e in local if s < end and e > start]
+        day_free = [_span(s.astimezone(), e.astimezone(), date) for s, e in windows]
+        lines.append(f"{date.isoformat()} busy: {', '.join(day_busy) or 'none'} | free: {', '.join(day_free) or 'none'}")
+    return "\n".join(lines)
+
+def find_conflicts(schedule, busy):
+    """
+    (index, reason) for every schedule item that overlaps a busy interval or an
+    earlier item of the schedule. Each item costs O(log n).
+    """
+    busy = busy if isinstance(busy, IntervalSet) else IntervalSet.from_slots(busy)
+    booked = IntervalSet()
+    conflicts = []
+    for index, item in enumerate(schedule):
+        start, end = parse_time(item['start']), parse_time(item['end'])
+        if end <= start:
+            conflicts.append((index, "ends before it starts"))
+        elif busy.overlaps(start, end):
+            conflicts.append((index, "overlaps a busy slot"))
+        elif booked.overlaps(start, end):
+            conflicts.append((index, "overlaps another scheduled task"))
+        else:
+            booked.add(start, end)
+    return conflicts
@@ -0,0 +1,246 @@
+import os
+import re
+import json
+import math
+import heapq
+from metadata_filter import matches, path_predicate
+from file_utils import write_atomic, file_lock
+
+def tokenize(text):
+    """
+    Splits text into lowercase search terms.
+    CamelCase words like 'WineDragons' are kept whole and also split into their parts,
+    so both 'winedragons' and 'wine dragons' match.
+    """
+    tokens = []
+    for word in re.findall(r"\w+", text or ""):
+        tokens.append(word.lower())
+        parts = re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+", word)
+        if len(parts) > 1:
+            tokens.extend(p.lower() for p in parts)
+    return tokens
+
+class BM25Index:
+    """
+    A lightweight on-disk inverted index scored with Okapi BM25.
+    Documents are stored next to their term frequencies, so the index can answer
+    queries on its own without a vector store or an embedding model.
+    """
+    def __init__(self, path, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.docs = {}       # doc_id -> {"text", "metadata", "tf", "length"}
+        self.postings = {}   # term -> {doc_id: term frequency}
+        self.total_length = 0
+        self.dirty = False
+        self.pending = {}    # doc_id -> (text, metadata, tf), or None if deleted, since the last save
+        self.mtime = None
+        self.load()
+
+    def load(self):
+        """Loads the index from disk and rebuilds the in-memory postings lists."""
+        self.docs = {}
+        self.postings = {}
+        self.total_length = 0
+        if not os.path.exists(self.path):
+            return
+        try:
+            self.mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Lexical index at {self.path} is unreadable, starting fresh: {e}")
+            return
+        for doc_id, doc in data.get("docs", {}).items():
+            self._add(doc_id, doc.get("text", ""), doc.get("metadata", {}), doc.get("tf", {}))
+        self.dirty = False
+
+    def save(self):
+        """
+        Writes the index to disk atomically (only if something changed). If another
+        process saved the file since it was loaded, its version is reloaded and this
+        index's own changes are applied on top, so neither writer drops the other's.
+        """
+        if not self.dirty:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with file_lock(self.path):
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                mtime = None
+            if mtime is not None and mtime != self.mtime:
+                pending = self.pending
+                self.load()
+                for doc_id, doc in pending.items():
+                    self._remove(doc_id)
+                    if doc is not None:
+                        self._add(doc_id, *doc)
+            data = {
+                "docs": {
+                    doc_id: {"text": doc["text"], "metadata": doc["metadata"], "tf": doc["tf"]}
+                    for doc_id, doc in self.docs.items()
+                }
+            }
+            write_atomic(self.path, lambda f: json.dump(data, f), encoding='utf-8')
+            self.mtime = os.path.getmtime(self.path)
+        self.pending = {}
+        self.dirty = False
+
+    def refresh(self):
+        """Reloads the index if another writer saved it since (one stat otherwise)."""
+        if self.dirty:
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self.mtime:
+            self.load()
+
+    def _add(self, doc_id, text, metadata, tf):
+        length = sum(tf.values())
+        self.docs[doc_id] = {"text": text, "metadata": metadata, "tf": tf, "length": length}
+        self.total_length += length
+        for term, count in tf.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+
+    def upsert(self, doc_id, text, metadata=None):
+        """Adds or replaces a document."""
+        self.delete(doc_id)
+        tf = {}
+        for term in tokenize(text):
+            tf[term] = tf.get(term, 0) + 1
+        self._add(doc_id, text, metadata or {}, tf)
+        self.pending[doc_id] = (text, metadata or {}, tf)
+        self.dirty = True
+
+    def delete(self, doc_id):
+        """Removes a document if present."""
+        if self._remove(doc_id):
+            self.pending[doc_id] = None
+            self.dirty = True
+
+    def _remove(self, doc_id):
+        doc = self.docs.pop(doc_id, None)
+        if not doc:
+            return False
+        self.total_length -= doc["length"]
+        for term in doc["tf"]:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        return True
+
+    def count(self):
+        return len(self.docs)
+
+    def fill_from(self, collection):
+        """Copies in every document of a vector collection (built before this index existed). Returns how many."""
+        data = collection.get(include=["documents", "metadatas"])
+        ids = data.get("ids") or []
+        for doc_id, document, metadata in zip(ids, data.get("documents") or [], data.get("metadatas") or []):
+            self.upsert(doc_id, document or "", metadata)
+        return len(ids)
+
+    def get(self, doc_id):
+        return self.docs.get(doc_id)
+
+    def search(self, query, n_results=5, where=None, predicate=None):
+        """
+        Returns up to n_results (doc_id, score) pairs, best first.
+        `where` (Chroma-style metadata filter) and `predicate(metadata)` restrict the
+        documents that are scored at all.
+        """
+        n_docs = len(self.docs)
+        if n_docs == 0:
+            return []
+        avg_length = self.total_length / n_docs or 1
+        allowed = {}
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in posting.items():
+                if where or predicate:
+                    if doc_id not in allowed:
+                        metadata = self.docs[doc_id]["metadata"]
+                        allowed[doc_id] = matches(metadata, where) and (predicate is None or predicate(metadata))
+                    if not allowed[doc_id]:
+                        continue
+                norm = self.k1 * (1 - self.b + self.b * self.docs[doc_id]["length"] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+def _normalize(scored):
+    """Min-max scales a list of (doc_id, score) pairs to 0..1."""
+    if not scored:
+        return {}
+    values = [s for _, s in scored]
+    low, high = min(values), max(values)
+    if high == low:
+        return {doc_id: 1.0 for doc_id, _ in scored}
+    return {doc_id: (s - low) / (high - low) for doc_id, s in scored}
+
+def hybrid_retrieve(lexical_index, collection, query, n_results=3, alpha=0.5, embed_fn=None, where=None, path_prefix=None):
+    """
+    Combines BM25 and vector scores into one ranked list of hits.
+    Pass collection=None for the lexical-only fast path (no embedding model needed).
+    If embed_fn is given, the query is embedded with it instead of the collection's own function.
+    alpha weights the vector score; 1 - alpha weights the lexical score.
+    `where` is a Chroma-style metadata filter pushed down to both stores; path_prefix
+    is applied as a post-filter (over-fetching a little to make up for it).
+    Each hit is a dict with "id", "document", "metadata" and "score".
+    """
+    candidates = n_results * (6 if path_prefix else 3)
+    predicate = path_predicate(path_prefix)
+    lexical = lexical_index.search(query, n_results=candidates, where=where, predicate=predicate)
+
+    vector = []
+    vector_docs = {}
+    if collection is not None and collection.count() > 0:
+        query_args = {"where": where} if where else {}
+        if embed_fn is not None:
+            results = collection.query(query_embeddings=embed_fn([query]), n_results=candidates, **query_args)
+        else:
+            results = collection.query(query_texts=[query], n_results=candidates, **query_args)
+        ids = results.get('ids', [[]])[0]
+        documents = results.get('documents', [[]])[0]
+        metadatas = results.get('metadatas', [[]])[0]
+        distances = (results.get('distances') or [[]])[0] or [0.0] * len(ids)
+        for doc_id, doc, meta, dist in zip(ids, documents, metadatas, distances):
+            if predicate and not predicate(meta):
+                continue
+            # Smaller distance = closer; flip the sign so higher is better like BM25
+            vector.append((doc_id, -dist))
+            vector_docs[doc_id] = (doc, meta)
+    if not vector:
+        alpha = 0.0
+    elif not lexical:
+        alpha = 1.0
+
+    lexical_norm = _normalize(lexical)
+    vector_norm = _normalize(vector)
+    combined = {}
+    for doc_id in set(lexical_norm) | set(vector_norm):
+        combined[doc_id] = alpha * vector_norm.get(doc_id, 0.0) + (1 - alpha) * lexical_norm.get(doc_id, 0.0)
+
+    hits = []
+    for doc_id, score in heapq.nlargest(n_results, combined.items(), key=lambda item: item[1]):
+        if doc_id in vector_docs:
+            doc, meta = vector_docs[doc_id]
+        else:
+            stored = lexical_index.get(doc_id)
+            if not stored:
+                continue
+            doc, meta = stored["text"], stored["metadata"]
+        hits.append({"id": doc_id, "document": doc, "metadata": meta or {}, "score": score})
+    return hits
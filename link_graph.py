@@ -0,0 +1,198 @@
+import os
+import re
+import json
+from urllib.parse import unquote
+from file_utils import write_atomic
+
+_FENCE = re.compile(r"```.*?```", re.DOTALL)
+_WIKILINK = re.compile(r"!?\[\[([^\]\n]+?)\]\]")
+_TAG = re.compile(r"(?<![\w#&/])#(\[\[[^\]\n]+\]\]|[\w][\w/-]*)")
+_BLOCK_REF = re.compile(r"\(\(([0-9a-fA-F-]{36})\)\)")
+_BLOCK_ID = re.compile(r"^\s*id::\s*([0-9a-fA-F-]{36})\s*$", re.MULTILINE)
+_TAGS_PROPERTY = re.compile(r"^\s*tags::\s*(.+)$", re.MULTILINE)
+_TASK_LINE = re.compile(r"^\s*-\s+(?:\[[ xX]\]|LATER|TODO|NOW|DOING)\s+(.*)$", re.MULTILINE)
+
+def note_name(name):
+    """Normalized target of a [[Target#Heading|alias]] link or #tag."""
+    name = name.split("|", 1)[0].split("#", 1)[0]
+    if name.endswith(".md"):
+        name = name[:-3]
+    return " ".join(name.lower().split())
+
+def page_name(doc_id):
+    """Page name of a note file (Logseq namespaces are saved as a___b.md or a%2Fb.md)."""
+    name = os.path.basename(doc_id)
+    if name.endswith(".md"):
+        name = name[:-3]
+    return note_name(unquote(name).replace("___", "/"))
+
+def _aliases(name):
+    """A link also matches by its last path segment ([[folder/Note]] in Obsidian)."""
+    return {name, name.rsplit("/", 1)[-1]}
+
+def task_key(text):
+    """Task text reduced to its words (tags, dates and scheduling markers removed)."""
+    text = re.sub(r"(?:SCHEDULED|DEADLINE):\s*<[^>]*>", " ", text or "")
+    text = _TAG.sub(" ", text)
+    text = re.sub(r"\^\d{4}-\d{2}-\d{2}", " ", text)
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+def extract_links(text):
+    """Outgoing [[links]], #tags, ((block refs)), defined block ids and task lines of a note."""
+    text = _FENCE.sub(" ", text or "")
+    links = {note_name(m) for m in _WIKILINK.findall(text)}
+    tags = set()
+    for tag in _TAG.findall(text):
+        tags.add(note_name(tag[2:-2]) if tag.startswith("[[") else tag.lower())
+    for value in _TAGS_PROPERTY.findall(text):
+        tags.update(note_name(t.strip().strip("[]#")) for t in value.split(",") if t.strip())
+    return {
+        "links": sorted(l for l in links if l),
+        "tags": sorted(t for t in tags if t),
+        "refs": sorted(set(_BLOCK_REF.findall(text))),
+        "blocks": sorted(set(_BLOCK_ID.findall(text))),
+        "tasks": sorted({task_key(t) for t in _TASK_LINE.findall(text)} - {""}),
+    }
+
+class LinkGraph:
+    """
+    Link/tag graph of the vault, kept as adjacency lists on disk next to the BM25 index.
+
+    Only each note's outgoing edges are stored; the reverse maps (backlinks, notes
+    per tag, which note defines a block id or holds a task) are rebuilt in memory
+    on load and kept up to date by upsert()/delete(), so an edit touches one entry.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.notes = {}   # doc_id -> extract_links() output + "name"
+        self.mtime = None
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        self.notes = {}
+        self._reset_maps()
+        if not os.path.exists(self.path):
+            return
+        try:
+            self.mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Link graph at {self.path} is unreadable, starting fresh: {e}")
+            return
+        for doc_id, entry in data.get("notes", {}).items():
+            self._add(doc_id, entry)
+        self.dirty = False
+
+    def _reset_maps(self):
+        self.by_name = {}     # note name -> {doc_id}
+        self.backlinks = {}   # note name -> {doc_id linking to it}
+        self.by_tag = {}      # tag -> {doc_id}
+        self.by_block = {}    # block id -> doc_id
+        self.by_task = {}     # task key -> {doc_id}
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        write_atomic(self.path, lambda f: json.dump({"notes": self.notes}, f), encoding='utf-8')
+        self.mtime = os.path.getmtime(self.path)
+        self.dirty = False
+
+    def refresh(self):
+        """Reloads the graph if another writer saved it since (one stat otherwise)."""
+        if self.dirty:
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self.mtime:
+            self.load()
+
+    def _add(self, doc_id, entry):
+        self.notes[doc_id] = entry
+        self.by_name.setdefault(entry["name"], set()).add(doc_id)
+        for link in entry["links"]:
+            for name in _aliases(link):
+                self.backlinks.setdefault(name, set()).add(doc_id)
+        for tag in entry["tags"]:
+            self.by_tag.setdefault(tag, set()).add(doc_id)
+        for block in entry["blocks"]:
+            self.by_block[block] = doc_id
+        for key in entry.get("tasks", []):
+            self.by_task.setdefault(key, set()).add(doc_id)
+
+    def upsert(self, doc_id, text):
+        self.delete(doc_id)
+        entry = extract_links(text)
+        entry["name"] = page_name(doc_id)
+        self._add(doc_id, entry)
+        self.dirty = True
+
+    def delete(self, doc_id):
+        entry = self.notes.pop(doc_id, None)
+        if not entry:
+            return
+        linked = set().union(*(_aliases(link) for link in entry["links"]))
+        for mapping, keys in ((self.by_name, [entry["name"]]), (self.backlinks, linked),
+                              (self.by_tag, entry["tags"]), (self.by_task, entry.get("tasks", []))):
+            for key in keys:
+                members = mapping.get(key)
+                if members is not None:
+                    members.discard(doc_id)
+                    if not members:
+                        del mapping[key]
+        for block in entry["blocks"]:
+            if self.by_block.get(block) == doc_id:
+                del self.by_block[block]
+        self.dirty = True
+
+    def count(self):
+        return len(self.notes)
+
+    def resolve(self, name):
+        """Doc ids of the note(s) a [[link]] or tag points to."""
+        name = note_name(name)
+        return self.by_name.get(name) or self.by_name.get(name.rsplit("/", 1)[-1], set())
+
+    def notes_with_task(self, text):
+        return self.by_task.get(task_key(text), set())
+
+    def neighbours(self, doc_id, max_tag_fanout=25):
+        """
+        {doc_id: (weight, relation)} one hop away: outgoing links and block refs (1.0),
+        backlinks (0.8), pages named after its tags (0.7) and notes sharing a tag
+        (0.4, skipped for tags used by more than max_tag_fanout notes).
+        """
+        entry = self.notes.get(doc_id)
+        if not entry:
+            return {}
+        found = {}
+
+        def add(target, weight, relation):
+            if target != doc_id and weight > found.get(target, (0, None))[0]:
+                found[target] = (weight, relation)
+
+        for name in entry["links"]:
+            for target in self.resolve(name):
+                add(target, 1.0, "link")
+        for block in entry["refs"]:
+            if block in self.by_block:
+                add(self.by_block[block], 1.0, "block-ref")
+        for source in self.backlinks.get(entry["name"], ()):
+            add(source, 0.8, "backlink")
+        for tag in entry["tags"]:
+            for target in self.by_name.get(tag, ()):
+                add(target, 0.7, "tag-page")
+            members = self.by_tag.get(tag, ())
+            if len(members) <= max_tag_fanout:
+                for target in members:
+                    add(target, 0.4, "shared-tag")
+        return found
+
+    def degree(self, doc_id):
+        """Backlink count, a cheap centrality prior for ranking."""
+        entry = self.notes.get(doc_id)
+        return len(self.backlinks.get(entry["name"], ())) if entry else 0
@@ -17,6 +17,9 @@ from config_utils import get_config_value
 from monitoring_agent import MonitoringAgent
 from calendar_agent import CalendarAgent, start_background_calendar_sync
 from planning_agent import PlanningAgent
+from indexing_daemon import IndexingEventHandler, start_background_indexer
+from federated_search import get_federated_search
+from focus_analytics import get_focus_store, refresh_focus_analytics
 
 def get_unified_tasks(obsidian_path):
     """
@@ -89,25 +92,26 @@ class TaskSyncHandler(PatternMatchingEventHandler):
         # 2. Get Calendar context
         calendar_id = get_config_value("CALENDAR_ID", "primary")
         service = calendar_manager.get_calendar_service()
-        # Fetch busy slots from YAML cache
+        # Busy slots from the cache, refreshed first when stale
         calendar_agent = CalendarAgent()
-        busy_slots = calendar_agent.get_busy_slots_from_yml()
+        busy_slots = calendar_agent.get_fresh_busy_slots()
         
         # 3. AI Orchestration
         print("Consulting the AI scheduler...")
         logseq_path = get_config_value("LOGSEQ_DIR", None)
         obsidian_path = get_config_value("WORKSPACE_DIR", ".")
-        schedule = ai_orchestration.generate_schedule(
+        result = ai_orchestration.generate_schedule(
             tasks, 
             busy_slots, 
             workspace_dir=obsidian_path, 
             logseq_dir=logseq_path
         )
+        schedule = result.get("schedule", []) if result else []
         
         if schedule:
             # 4. Sync back to Google Calendar and Obsidian via Planning Agent
             planning_agent = PlanningAgent(service, calendar_id)
-            planning_agent.execute_plan(schedule, event.src_path)
+            planning_agent.execute_plan(schedule, event.src_path, replace=True)
             print("--- Sync Complete ---\n")
         else:
             print("Failed to generate schedule from AI.")
@@ -223,7 +227,7 @@ def handle_morning_planning(obsidian_path):
     calendar_id = get_config_value("CALENDAR_ID", "primary")
     service = calendar_manager.get_calendar_service()
     calendar_agent = CalendarAgent()
-    busy_slots = calendar_agent.get_busy_slots_from_yml()
+    busy_slots = calendar_agent.get_fresh_busy_slots()
     
     print("AI is processing your backlog for today...")
     logseq_path = get_config_value("LOGSEQ_DIR", None)
@@ -252,7 +256,7 @@ def handle_morning_planning(obsidian_path):
             confirm = input("\nAdd these items to your calendar? (y/n/skip): ").strip().lower()
             if confirm == 'y':
                 planning_agent = PlanningAgent(service, calendar_id)
-                planning_agent.execute_plan(schedule, obsidian_path)
+                planning_agent.execute_plan(schedule, obsidian_path, replace=True)
             else:
                 print("Skipped calendar sync.")
     else:
@@ -396,46 +400,37 @@ def handle_chat_mode(obsidian_path):
                         print("❌ Calendar service not available. Check credentials.")
                         continue
                     calendar_agent = CalendarAgent()
-                    busy_slots = calendar_agent.get_busy_slots_from_yml()
+                    busy_slots = calendar_agent.get_fresh_busy_slots()
                     logseq_path = get_config_value("LOGSEQ_DIR", None)
-                    schedule = ai_orchestration.generate_schedule(
+                    result = ai_orchestration.generate_schedule(
                         tasks, 
                         busy_slots, 
                         workspace_dir=obsidian_path, 
                         logseq_dir=logseq_path
                     )
-                    if confirm == 'y':
+                    schedule = result.get("schedule", []) if result else []
+                    if schedule:
+                        # Re-running /sync updates today's AI events instead of duplicating them
                         planning_agent = PlanningAgent(service, calendar_id)
-                        planning_agent.execute_plan(schedule, obsidian_path)
+                        planning_agent.execute_plan(schedule, obsidian_path, replace=True)
                         print("✅ Scheduled!")
                     else:
                         print("Failed to generate schedule.")
                 elif command == "pull":
                     sync_calendar_to_markdown(obsidian_path)
                 elif command == "stats":
-                    print("\n📊 --- Today's Focus Stats ---")
-                    service = calendar_manager.get_calendar_service()
+                    # Read from the focus rollups (the event store is synced first only when stale)
                     calendar_id = get_config_value("CALENDAR_ID", "primary")
-                    if service:
-                        managed = calendar_manager.get_managed_events(service, calendar_id=calendar_id)
-                        if managed:
-                            cat_hours = {}
-                            total_mins = 0
-                            for m in managed:
-                                start = datetime.datetime.fromisoformat(m['start'].replace('Z', ''))
-                                end = datetime.datetime.fromisoformat(m['end'].replace('Z', ''))
-                                mins = (end - start).total_seconds() / 60
-                                total_mins += mins
-                                cat = m.get('category', 'General')
-                                cat_hours[cat] = cat_hours.get(cat, 0) + mins
-                            
-                            for cat, mins in cat_hours.items():
-                                print(f"  - {cat:20}: {mins/60:4.1f} hours")
-                            print(f"  TOTAL PLANNED FOCUS: {total_mins/60:4.1f} hours")
+                    refresh_focus_analytics(calendar_id, service=calendar_manager.get_calendar_service())
+                    focus = get_focus_store()
+                    for title, cat_hours in (("Today's", focus.day()), ("This Week's", focus.week())):
+                        print(f"\n📊 --- {title} Focus Stats ---")
+                        if cat_hours:
+                            for cat, hours in cat_hours.items():
+                                print(f"  - {cat:20}: {hours:4.1f} hours")
+                            print(f"  TOTAL PLANNED FOCUS: {sum(cat_hours.values()):4.1f} hours")
                         else:
-                            print("No AI-managed events found for today.")
-                    else:
-                        print("Could not connect to Google Calendar.")
+                            print("No AI-managed events found.")
                 elif command == "backlog":
                     tasks = get_unified_tasks(obsidian_path)
                     print(f"\n--- Unified Backlog ({len(tasks)} tasks) ---")
@@ -575,7 +570,7 @@ def handle_chat_mode(obsidian_path):
                         continue
 
                     calendar_agent = CalendarAgent()
-                    busy_slots = calendar_agent.get_busy_slots_from_yml()
+                    busy_slots = calendar_agent.get_fresh_busy_slots()
                     
                     # Get Gmail context
                     gmail_service = gmail_agent.get_gmail_service()
@@ -589,7 +584,10 @@ def handle_chat_mode(obsidian_path):
 
                     # Get Books context
                     book_agent = BookAgent()
-                    books_summary = book_agent.get_summary()
+                    books_summary = book_agent.get_summary(compact=True)
+
+                    # Relevant notes and book passages, searched in parallel
+                    relevant_context = get_federated_search(get_config_value("WORKSPACE_DIR", "."), get_config_value("LOGSEQ_DIR", None)).context(user_input)
 
                     context_payload = {
                         "backlog": tasks,
@@ -597,6 +595,7 @@ def handle_chat_mode(obsidian_path):
                         "gmail_snoozed": snoozed_emails,
                         "gmail_filtered": filtered_emails,
                         "books_library": books_summary,
+                        "relevant_context": relevant_context,
                         "current_time": datetime.datetime.now().astimezone().isoformat()
                     }
                     
@@ -720,14 +719,19 @@ if __name__ == "__main__":
         logseq_path = get_config_value("LOGSEQ_DIR", None)
         
         event_handler = TaskSyncHandler()
+        # Keeps the RAG index fresh from the same file events, off the scheduling path
+        indexer = start_background_indexer(obsidian_path, logseq_path)
+        index_handler = IndexingEventHandler(indexer)
         observer = Observer()
         
         # Watch Obsidian
         if os.path.exists(obsidian_path):
             observer.schedule(event_handler, obsidian_path, recursive=True)
+            observer.schedule(index_handler, obsidian_path, recursive=True)
             print(f"Monitoring Obsidian vault: {os.path.abspath(obsidian_path)}")
         else:
             observer.schedule(event_handler, ".", recursive=False)
+            observer.schedule(index_handler, ".", recursive=False)
             print(f"Monitoring current directory: {os.path.abspath('.')}")
 
         # Watch LogSeq Journals
@@ -735,6 +739,7 @@ if __name__ == "__main__":
             journals_path = os.path.join(logseq_path, "journals")
             if os.path.exists(journals_path):
                 observer.schedule(event_handler, journals_path, recursive=False)
+                observer.schedule(index_handler, journals_path, recursive=False)
                 print(f"Monitoring LogSeq journals: {os.path.abspath(journals_path)}")
 
         print(f"🚀 AI Agent Assistant is active and monitoring for changes...")
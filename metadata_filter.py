@@ -0,0 +1,105 @@
+import re
+import datetime
+
+# Chroma-style `where` filters, e.g. {"$and": [{"source": "Logseq"}, {"last_modified": {"$gte": 1767225600}}]}
+_COMPARATORS = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+_SQL_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+def build_where(**conditions):
+    """
+    Builds a `where` filter from keyword conditions, skipping the ones that are None.
+    A tuple (operator, value) selects the comparison, e.g. last_modified=("$gte", ts).
+    """
+    clauses = []
+    for key, value in conditions.items():
+        if value is None:
+            continue
+        if isinstance(value, tuple):
+            clauses.append({key: {value[0]: value[1]}})
+        else:
+            clauses.append({key: {"$eq": value}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def matches(metadata, where):
+    """Evaluates a `where` filter against one metadata dict."""
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches(metadata, c) for c in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(metadata, c) for c in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, expected in condition.items():
+                if not _COMPARATORS[op](value, expected):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+def to_sql(where, column="metadata"):
+    """Translates a `where` filter into a SQLite clause over a JSON column. Returns (sql, params)."""
+    clauses, params = [], []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [to_sql(c, column) for c in condition]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            for _, p in parts:
+                params.extend(p)
+            continue
+        if not re.fullmatch(r"[A-Za-z0-9_]+", key):
+            raise ValueError(f"Unsupported metadata key in filter: {key}")
+        field = f"json_extract({column}, '$.{key}')"
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            if op in ("$in", "$nin"):
+                placeholders = ",".join("?" * len(expected))
+                clauses.append(f"{field} {'IN' if op == '$in' else 'NOT IN'} ({placeholders})")
+                params.extend(expected)
+            else:
+                clauses.append(f"{field} {_SQL_OPERATORS[op]} ?")
+                params.append(expected)
+    return " AND ".join(clauses) or "1", params
+
+def to_timestamp(value):
+    """Accepts a datetime, a date (midnight local time) or a POSIX timestamp."""
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time()).timestamp()
+    return float(value)
+
+def path_predicate(path_prefix):
+    """Post-filter for path prefixes (not expressible in a Chroma `where`)."""
+    if not path_prefix:
+        return None
+    return lambda metadata: str((metadata or {}).get("path", "")).startswith(path_prefix)
+
+_JOURNAL_DATE = re.compile(r"(\d{4})[-_](\d{2})[-_](\d{2})")
+
+def journal_date(path):
+    """Date of a journal note (Logseq journals/2026_10_19.md, Obsidian 2026-10-19.md), else None."""
+    match = _JOURNAL_DATE.search(str(path).replace("\\", "/").rsplit("/", 1)[-1])
+    if not match:
+        return None
+    try:
+        return datetime.date(*(int(part) for part in match.groups()))
+    except ValueError:
+        return None
@@ -1,6 +1,10 @@
 import os
+import datetime
 import calendar_manager
+from config_utils import get_config_value
 from observer import update_markdown_plan
+from intervals import parse_time
+from schedule_repair import repair_schedule, normalize_item
 
 class PlanningAgent:
     """
@@ -11,17 +15,74 @@ class PlanningAgent:
         self.service = service
         self.calendar_id = calendar_id
 
-    def execute_plan(self, schedule, obsidian_path):
+    def _busy_slots(self, dates, replace=False, now=None):
         """
-        Submits confirmed tasks to Calendar and updates Obsidian.
+        Busy slots of the given days (YYYY-MM-DD). When the schedule replaces the plan,
+        upcoming AI-managed events are not busy time (they are patched or deleted), but
+        the ones that already started stay on the calendar and so stay busy.
+        """
+        calendar_ids = calendar_manager.busy_calendar_ids(self.calendar_id)
+        now = parse_time(now) if now else datetime.datetime.now().astimezone()
+        return [
+            slot
+            for date_str in dates
+            for slot in calendar_manager.get_busy_slots(self.service, calendar_ids=calendar_ids, date_str=date_str,
+                                                        summary_calendar_ids=["primary", self.calendar_id])
+            if not (replace and slot.get('summary', '').startswith("AI: ") and parse_time(slot['start']) > now)
+        ]
+
+    def _replan(self, items, busy_slots, dates):
+        """Asks the LLM to place the items the local repair could not fit on the given days (one extra round trip)."""
+        import ai_orchestration
+        tasks = [{"task": item.get('task'), "category": item.get('category')} for item in items]
+        result = ai_orchestration.generate_schedule(tasks, busy_slots, dates=dates)
+        return result.get("schedule", []) if result else []
+
+    def validate(self, schedule, replace=False, now=None):
+        """
+        Normalizes the schedule and repairs overlaps with busy slots and between items
+        locally (see schedule_repair). Only items that cannot be placed go back to the
+        LLM, once. Returns the schedule to book. Pass the same `replace` as the booking:
+        without it, AI events already on the calendar stay and are busy time.
+        """
+        dates = sorted({item['start'][:10] for item in filter(None, map(normalize_item, schedule))})
+        busy_slots = self._busy_slots(dates, replace=replace, now=now)
+        placed, unplaced = repair_schedule(schedule, busy_slots, now=now)
+        if unplaced and get_config_value("REPAIR_LLM_FALLBACK", "true").lower() == "true":
+            print(f"PlanningAgent: Asking the AI to place {len(unplaced)} task(s) that do not fit...")
+            replanned = self._replan(unplaced, busy_slots + placed, dates)
+            # Only the schedule's days were described (and read for busy time), so
+            # whatever the AI puts on another day is not booked
+            elsewhere = [item for item in replanned if (normalize_item(item) or {}).get('start', '')[:10] not in dates]
+            more, unplaced = repair_schedule([item for item in replanned if item not in elsewhere], busy_slots + placed, now=now)
+            unplaced += elsewhere
+            placed += more
+        if unplaced:
+            print(f"PlanningAgent: ⚠️ Not booking {len(unplaced)} task(s) with no free time: "
+                  f"{', '.join(str(item.get('task')) for item in unplaced)}")
+        return sorted(placed, key=lambda item: parse_time(item['start']))
+
+    def execute_plan(self, schedule, obsidian_path, replace=False):
+        """
+        Validates and repairs the confirmed tasks, submits them to Calendar and updates Obsidian.
+        Tasks already on the calendar are updated rather than booked again. replace=True
+        means the schedule is the full plan for its days: AI events not in it are removed.
         """
         if not schedule:
             print("PlanningAgent: No schedule provided.")
             return False
 
+        schedule = self.validate(schedule, replace=replace)
+        if not schedule:
+            print("PlanningAgent: Nothing left to book.")
+            return False
+
         print(f"PlanningAgent: Booking {len(schedule)} events to calendar...")
-        # 1. Submit to Google Calendar
-        calendar_manager.create_events(self.service, schedule, calendar_id=self.calendar_id)
+        # 1. Reconcile with Google Calendar (only the needed inserts/patches/deletes, batched)
+        results = calendar_manager.reconcile_events(self.service, schedule, calendar_id=self.calendar_id, replace=replace)
+        failed = [r["item"]["task"] for r in results or [] if r["error"]]
+        if failed:
+            print(f"PlanningAgent: ⚠️ {len(failed)} events could not be created: {', '.join(failed)}")
         
         # 2. Update Obsidian task list
         if obsidian_path and os.path.exists(obsidian_path):
@@ -0,0 +1,128 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from config_utils import get_config_value
+from file_utils import write_atomic
+
+class IndexVersion:
+    """
+    Monotonically increasing version number per collection.
+    Every upsert or delete bumps it in memory; flush(collection) persists it to
+    <db_path>/index_versions.json so other processes (Streamlit, cron) see the change.
+    A collection's version is only persisted by its own flush, which runs after its
+    index is saved, so no process can cache old results under the new version.
+    """
+    def __init__(self, db_path):
+        self.path = os.path.join(db_path, "index_versions.json")
+        self.versions = {}
+        self.mtime = None
+        self.dirty = set()
+        self.lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def _reload(self):
+        """Merges versions written by other processes (cheap: one stat when nothing changed)."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self.mtime:
+            return
+        on_disk = self._read()
+        if on_disk is None:
+            return
+        self.mtime = mtime
+        for name, version in on_disk.items():
+            self.versions[name] = max(self.versions.get(name, 0), version)
+
+    def get(self, collection):
+        with self.lock:
+            self._reload()
+            return self.versions.get(collection, 0)
+
+    def bump(self, collection):
+        with self.lock:
+            self._reload()
+            self.versions[collection] = self.versions.get(collection, 0) + 1
+            self.dirty.add(collection)
+            return self.versions[collection]
+
+    def flush(self, collection=None):
+        """Persists the bumped version of one collection (or of all of them)."""
+        with self.lock:
+            names = self.dirty & {collection} if collection else set(self.dirty)
+            if not names:
+                return
+            self._reload()
+            # Start from what is on disk: other collections' unsaved bumps stay in memory
+            versions = self._read() or {}
+            for name in names:
+                versions[name] = max(versions.get(name, 0), self.versions[name])
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            write_atomic(self.path, lambda f: json.dump(versions, f))
+            self.mtime = os.path.getmtime(self.path)
+            self.dirty -= names
+
+class QueryCache:
+    """
+    Thread-safe LRU cache of retrieval results.
+    Keys embed the index version, so entries from an older index are never hit
+    and simply age out. Hit lists are copied in and out, so callers may annotate them.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return [dict(hit) for hit in self.entries[key]]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = [dict(hit) for hit in value]
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+def normalize_query(query):
+    """Lowercases and collapses whitespace so trivially different queries share an entry."""
+    return " ".join((query or "").lower().split())
+
+def make_key(collection, query, n_results, filters=None, version=0, **extra):
+    """Builds a hashable cache key from (collection, normalized query, n_results, filters, version)."""
+    filters_key = json.dumps(filters, sort_keys=True, default=str) if filters else ""
+    extra_key = tuple(sorted(extra.items()))
+    return (collection, normalize_query(query), n_results, filters_key, version, extra_key)
+
+_index_versions = {}
+_versions_lock = threading.Lock()
+
+def get_index_version(db_path):
+    """Returns the shared IndexVersion for a database directory."""
+    key = os.path.abspath(db_path)
+    with _versions_lock:
+        if key not in _index_versions:
+            _index_versions[key] = IndexVersion(db_path)
+        return _index_versions[key]
+
+# Shared by every RAGAgent/BookAgent instance in the process
+query_cache = QueryCache(int(get_config_value("QUERY_CACHE_SIZE", "256")))
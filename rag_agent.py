@@ -1,89 +1,392 @@
 import os
-import chromadb
-from chromadb.utils import embedding_functions
 import datetime
+import threading
+from config_utils import get_config_value
+from lexical_index import BM25Index, hybrid_retrieve
+from query_cache import query_cache, get_index_version, make_key
+from embedding_cache import get_embedding_function
+from chunk_summaries import get_summary_store
+from vector_store import open_collection, get_vector_backend, backend_available, drop_collection, collection_exists
+from metadata_filter import build_where, journal_date, to_timestamp
+from index_generations import physical_name, get_collection_pointer, blue_green_rebuild
+from link_graph import LinkGraph, extract_links
 
 class RAGAgent:
-    def __init__(self, workspace_dir, logseq_dir=None, db_path="vector_db"):
+    collection_name = "markdown_notes"
+
+    def __init__(self, workspace_dir, logseq_dir=None, db_path="vector_db", retrieval_mode=None, generation=None):
         self.workspace_dir = workspace_dir
         self.logseq_dir = logseq_dir
         self.db_path = db_path
         
-        # Initialize Chromadb (Local)
-        self.client = chromadb.PersistentClient(path=self.db_path)
-        
-        # Use a lightweight embedding function
-        self.embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
-        
-        # Collection for notes
-        self.collection = self.client.get_or_create_collection(
-            name="markdown_notes",
-            embedding_function=self.embedding_fn
-        )
+        # "hybrid" (BM25 + vectors), "vector" or "lexical" (BM25 only, never loads the embedding model)
+        self.retrieval_mode = (retrieval_mode or get_config_value("RAG_RETRIEVAL_MODE", "hybrid")).lower()
+        self.vector_backend = get_vector_backend()
+        if not backend_available(self.vector_backend):
+            self.retrieval_mode = "lexical"
+        self.hybrid_alpha = float(get_config_value("RAG_HYBRID_ALPHA", "0.5"))
+        self.recency_boost = float(get_config_value("RAG_RECENCY_BOOST", "0"))
+        self.recency_half_life = float(get_config_value("RAG_RECENCY_HALF_LIFE_DAYS", "7"))
 
-    def index_vault(self):
+        # Bumped on every write so cached query results are never stale
+        self.index_version = get_index_version(self.db_path)
+
+        # Which generation of the collection to use; rebuilds write a new one and switch
+        # the pointer. An explicit generation pins the agent to it (used for shadow builds).
+        self.pointer = get_collection_pointer(self.db_path)
+        self.pinned = generation is not None
+        self.generation = generation if self.pinned else self.pointer.current(self.collection_name)
+
+        # The lexical index, link graph, vector store and embedding model are loaded lazily on first
+        # access, under a lock since the background indexer and readers race for it
+        self._load_lock = threading.Lock()
+        self._lexical_index = None
+        self._link_graph = None
+        self.embedding_fn = None
+        self._collection = None
+
+    @property
+    def physical_name(self):
+        return physical_name(self.collection_name, self.generation)
+
+    @property
+    def lexical_index(self):
+        """BM25 index over the same documents, kept in sync at index time."""
+        with self._load_lock:
+            if self._lexical_index is None:
+                self._lexical_index = BM25Index(os.path.join(self.db_path, f"{self.physical_name}_bm25.json"))
+            return self._lexical_index
+
+    @property
+    def link_graph(self):
+        """[[link]]/#tag graph over the same notes, kept in sync at index time."""
+        with self._load_lock:
+            if self._link_graph is None:
+                self._link_graph = LinkGraph(os.path.join(self.db_path, f"{self.physical_name}_graph.json"))
+            return self._link_graph
+
+    def sync_generation(self):
+        """Follows the pointer to the live generation after a rebuild was swapped in."""
+        if self.pinned:
+            return
+        current = self.pointer.current(self.collection_name)
+        if current != self.generation:
+            if self._lexical_index is not None:
+                self._lexical_index.save()
+            if self._link_graph is not None:
+                self._link_graph.save()
+            self.generation = current
+            self._lexical_index = None
+            self._link_graph = None
+            self._collection = None
+
+    @classmethod
+    def drop_generation(cls, db_path, generation, backend=None):
+        """Deletes every file of one generation (BM25 index, link graph and vector collection)."""
+        name = physical_name(cls.collection_name, generation)
+        for suffix in ("_bm25.json", "_bm25.json.lock", "_graph.json"):
+            path = os.path.join(db_path, f"{name}{suffix}")
+            if os.path.exists(path):
+                os.remove(path)
+        drop_collection(db_path, name, backend)
+
+    @property
+    def use_vectors(self):
+        return self.retrieval_mode != "lexical"
+
+    @property
+    def collection(self):
+        """Opens the vector collection (VECTOR_BACKEND: chroma or numpy) on first use."""
+        if self._collection is None and self.use_vectors:
+            # Lightweight embedding model behind a persistent content-hash cache
+            self.embedding_fn = get_embedding_function(self.db_path)
+            self._collection = open_collection(self.db_path, self.physical_name, self.vector_backend)
+        return self._collection
+
+    def is_empty(self):
+        """Cheap emptiness check against the lexical index (no model load)."""
+        self.sync_generation()
+        if self.lexical_index.count() == 0:
+            self._backfill_lexical()
+        return self.lexical_index.count() == 0
+
+    def _backfill_lexical(self):
         """
-        Scans Obsidian and LogSeq directories and indexes all markdown files.
+        Indexes built before the BM25 index existed only have vectors: their notes are
+        copied into a BM25 index once, instead of the library looking empty.
         """
-        print("🔍 RAG Agent: Indexing vault context...")
-        
+        if (not self.use_vectors or os.path.exists(self.lexical_index.path)
+                or not collection_exists(self.db_path, self.physical_name, self.vector_backend)):
+            return
+        copied = self.lexical_index.fill_from(self.collection)
+        # Saved even when nothing was copied, so the vector store is only checked once
+        self.lexical_index.dirty = True
+        self.lexical_index.save()
+        if copied:
+            print(f"🔁 Copied {copied} notes from the vector store into the lexical index.")
+            self.index_version.bump(self.physical_name)
+            self.index_version.flush(self.physical_name)
+
+    def _upsert(self, doc_id, document, metadata):
+        """Writes a document to the lexical index and, unless lexical-only, the vector store."""
+        self.sync_generation()
+        self.lexical_index.upsert(doc_id, document, metadata)
+        if self.use_vectors:
+            self.collection.upsert(
+                documents=[document],
+                embeddings=self.embedding_fn([document]),
+                metadatas=[metadata],
+                ids=[doc_id]
+            )
+        self.index_version.bump(self.physical_name)
+
+    def _delete(self, doc_id):
+        """Removes a document from both indexes."""
+        self.sync_generation()
+        self.lexical_index.delete(doc_id)
+        if self.use_vectors:
+            self.collection.delete(ids=[doc_id])
+        self.index_version.bump(self.physical_name)
+
+    def _flush(self):
+        """Persists the lexical index, the link graph and the new index version after a batch of writes."""
+        self.lexical_index.save()
+        self.link_graph.save()
+        self.index_version.flush(self.physical_name)
+
+    def _targets(self):
         targets = []
         if self.workspace_dir and os.path.exists(self.workspace_dir):
             targets.append(self.workspace_dir)
         if self.logseq_dir and os.path.exists(self.logseq_dir):
             targets.append(self.logseq_dir)
-            
-        for root_dir in targets:
+        return targets
+
+    def _root_for(self, path):
+        """Returns the vault root (Obsidian or LogSeq) that contains path, if any."""
+        abs_path = os.path.abspath(path)
+        for root_dir in self._targets():
+            if abs_path.startswith(os.path.abspath(root_dir) + os.sep):
+                return root_dir
+        return None
+
+    def iter_vault_files(self):
+        """Yields (root_dir, path) for every markdown file in the vault."""
+        for root_dir in self._targets():
             for root, _, files in os.walk(root_dir):
                 for file in files:
                     if file.endswith(".md"):
-                        path = os.path.join(root, file)
-                        try:
-                            with open(path, 'r', encoding='utf-8') as f:
-                                content = f.read().strip()
-                                if not content: continue
-                                
-                                # Use file path as unique ID
-                                doc_id = os.path.relpath(path, start=root_dir)
-                                
-                                # Metadata for filtering if needed
-                                metadata = {
-                                    "path": path,
-                                    "last_modified": os.path.getmtime(path),
-                                    "source": "Obsidian" if root_dir == self.workspace_dir else "Logseq"
-                                }
-                                
-                                # Upsert into chromadb
-                                self.collection.upsert(
-                                    documents=[content[:5000]], # Limit size per doc
-                                    metadatas=[metadata],
-                                    ids=[doc_id]
-                                )
-                        except Exception as e:
-                            print(f"Error indexing {path}: {e}")
+                        yield root_dir, os.path.join(root, file)
+
+    def doc_id_for(self, path, root_dir=None):
+        root_dir = root_dir or self._root_for(path)
+        if not root_dir:
+            return None
+        # Use file path as unique ID
+        return os.path.relpath(path, start=root_dir)
+
+    def needs_indexing(self, path, root_dir=None):
+        """True if the file is new, modified since it was last indexed, or missing from the link graph."""
+        doc_id = self.doc_id_for(path, root_dir)
+        stored = self.lexical_index.get(doc_id) if doc_id else None
+        if not stored or doc_id not in self.link_graph.notes:
+            return True
+        try:
+            return os.path.getmtime(path) > stored["metadata"].get("last_modified", 0)
+        except OSError:
+            return False
+
+    def index_file(self, path, root_dir=None):
+        """
+        Indexes (or re-indexes) a single markdown file. Call _flush() after a batch.
+        Returns True if the file was written to the index.
+        """
+        root_dir = root_dir or self._root_for(path)
+        if not root_dir:
+            return False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read().strip()
+            if not content:
+                return False
+
+            # Metadata for filtering if needed
+            metadata = {
+                "path": path,
+                "last_modified": os.path.getmtime(path),
+                "source": "Obsidian" if root_dir == self.workspace_dir else "Logseq"
+            }
+
+            doc_id = self.doc_id_for(path, root_dir)
+            self._upsert(doc_id, content[:5000], metadata) # Limit size per doc
+            # Links are read from the whole note, not just the indexed part
+            self.link_graph.upsert(doc_id, content)
+            return True
+        except Exception as e:
+            print(f"Error indexing {path}: {e}")
+            return False
+
+    def remove_file(self, path):
+        """Drops a deleted or moved file from the index."""
+        doc_id = self.doc_id_for(path)
+        if doc_id and self.lexical_index.get(doc_id):
+            self._delete(doc_id)
+            self.link_graph.delete(doc_id)
+            return True
+        return False
+
+    def index_vault(self):
+        """
+        Scans Obsidian and LogSeq directories and indexes all markdown files.
+        The rebuild goes into a shadow generation that replaces the live index
+        atomically once complete, so queries never see a half-built index.
+        """
+        print("🔍 RAG Agent: Indexing vault context...")
         
-        print(f"✅ RAG Agent: Indexed {self.collection.count()} notes.")
+        if self.pinned:
+            self._index_all()
+            return
 
-    def query_context(self, task_query, n_results=3):
+        def fill(shadow):
+            shadow._index_all()
+            # Catch up with notes edited while the rebuild was running
+            for root_dir, path in shadow.iter_vault_files():
+                if shadow.needs_indexing(path, root_dir):
+                    shadow.index_file(path, root_dir)
+
+        shadow = blue_green_rebuild(
+            RAGAgent, self.db_path,
+            lambda generation: RAGAgent(self.workspace_dir, self.logseq_dir, db_path=self.db_path,
+                                        retrieval_mode=self.retrieval_mode, generation=generation),
+            fill
+        )
+        self.sync_generation()
+        print(f"✅ RAG Agent: Indexed {shadow.lexical_index.count()} notes.")
+
+    def _index_all(self):
+        for root_dir, path in self.iter_vault_files():
+            self.index_file(path, root_dir)
+        self._flush()
+
+    def retrieve(self, task_query, n_results=3, source=None, path_prefix=None, modified_after=None, recency_boost=None):
         """
-        Retrieves relevant snippets for a given task.
+        Returns ranked hits (dicts with id, document, metadata, score) for a query.
+        Results are cached until the next write to the index.
+
+        Filters are pushed down to both indexes: source ("Obsidian"/"Logseq"),
+        path_prefix, and modified_after (datetime, date or timestamp).
+        recency_boost (default RAG_RECENCY_BOOST, off) adds boost times a recency signal
+        to the score of journal notes: 1.0 for today, halving every
+        RAG_RECENCY_HALF_LIFE_DAYS. Other notes keep their score (scores stay in 0..1).
         """
-        if self.collection.count() == 0:
+        self.sync_generation()
+        if recency_boost is None:
+            recency_boost = self.recency_boost
+        where = build_where(source=source, last_modified=("$gte", to_timestamp(modified_after)) if modified_after else None)
+        key = make_key(
+            (os.path.abspath(self.db_path), self.physical_name), task_query, n_results,
+            filters={"where": where, "path_prefix": path_prefix, "recency_boost": recency_boost,
+                     # Recency depends on the date, so boosted results expire at midnight
+                     "today": datetime.date.today().isoformat() if recency_boost else None},
+            version=self.index_version.get(self.physical_name), mode=self.retrieval_mode
+        )
+        hits = query_cache.get(key)
+        if hits is not None:
+            return hits
+
+        collection = self.collection if self.use_vectors else None
+        if self.retrieval_mode == "vector":
+            alpha = 1.0
+        else:
+            alpha = self.hybrid_alpha
+        # Over-fetch when re-ranking by recency so a recent note can overtake an older one
+        fetch = n_results * 2 if recency_boost else n_results
+        hits = hybrid_retrieve(self.lexical_index, collection, task_query, n_results=fetch, alpha=alpha,
+                               embed_fn=self.embedding_fn, where=where, path_prefix=path_prefix)
+        if recency_boost:
+            hits = self._boost_recent(hits, recency_boost)[:n_results]
+        query_cache.put(key, hits)
+        return hits
+
+    def _boost_recent(self, hits, boost):
+        """Re-ranks hits so recent journal notes (journals/ or dated file names) come first."""
+        today = datetime.date.today()
+        boosted = []
+        for hit in hits:
+            path = hit['metadata'].get('path', hit['id'])
+            day = journal_date(path)
+            if day is None and f"{os.sep}journals{os.sep}" in path:
+                day = datetime.date.fromtimestamp(hit['metadata'].get('last_modified', 0))
+            if day is None:
+                boosted.append(hit)
+                continue
+            # Additive rather than multiplicative: min-max normalized scores put the
+            # weakest hit at 0, which no multiplier could lift
+            recency = 0.5 ** (max((today - day).days, 0) / self.recency_half_life)
+            boosted.append(dict(hit, score=hit['score'] + boost * recency))
+        # Back into 0..1; hits that got no boost only shrink if a journal note passed 1
+        top = max((hit['score'] for hit in boosted), default=0)
+        if top > 1:
+            boosted = [dict(hit, score=hit['score'] / top) for hit in boosted]
+        return sorted(boosted, key=lambda h: h['score'], reverse=True)
+
+    def related_notes(self, task, n_results=3, exclude=()):
+        """
+        Notes connected to a task through the link graph, without any embedding call:
+        the note(s) holding the task, what they link to, link from or share tags with,
+        and pages the task itself links to or is categorized under. Hits are ranked by
+        relation weight, with a small bonus for well-linked notes.
+        """
+        self.sync_generation()
+        graph = self.link_graph
+        graph.refresh()
+        text = task['task'] if isinstance(task, dict) else str(task)
+        category = task.get('category') if isinstance(task, dict) else None
+        categories = [category.lower()] if category and category != "Uncategorized" else []
+
+        scores = {}
+        def add(doc_id, weight, relation):
+            if doc_id not in exclude and weight > scores.get(doc_id, (0, None))[0]:
+                scores[doc_id] = (weight, relation)
+
+        for doc_id in graph.notes_with_task(text):
+            add(doc_id, 0.9, "task-note")
+            for neighbour, (weight, relation) in graph.neighbours(doc_id).items():
+                add(neighbour, weight * 0.8, relation)
+        targets = extract_links(text)
+        for name in targets["links"] + targets["tags"] + categories:
+            for doc_id in graph.resolve(name):
+                add(doc_id, 1.0, "task-link")
+        for tag in targets["tags"] + categories:
+            for doc_id in list(graph.by_tag.get(tag, ()))[:25]:
+                add(doc_id, 0.5, "task-tag")
+
+        ranked = sorted(scores.items(), key=lambda item: item[1][0] * (1 + 0.05 * min(graph.degree(item[0]), 10)), reverse=True)
+        hits = []
+        for doc_id, (weight, relation) in ranked:
+            doc = self.lexical_index.get(doc_id)
+            if doc is None:
+                continue
+            hits.append({"id": doc_id, "document": doc["text"], "metadata": doc["metadata"], "score": weight, "relation": relation})
+            if len(hits) >= n_results:
+                break
+        return hits
+
+    def query_context(self, task_query, n_results=3, **filters):
+        """
+        Retrieves relevant snippets for a given task (filters: see retrieve).
+        """
+        if self.is_empty():
             return ""
             
-        results = self.collection.query(
-            query_texts=[task_query],
-            n_results=n_results
-        )
+        hits = self.retrieve(task_query, n_results=n_results, **filters)
         
         context_str = "\nRELEVANT CONTEXT FROM YOUR NOTES:\n"
-        documents = results.get('documents', [[]])[0]
-        metadatas = results.get('metadatas', [[]])[0]
-        
-        for doc, meta in zip(documents, metadatas):
-            filename = os.path.basename(meta['path'])
-            # Take a small snippet for the prompt
-            snippet = doc[:300].replace("\n", " ")
+        # The background summary when there is one, else a small raw snippet
+        snippets = get_summary_store(self.db_path).snippets(hits)
+        for hit, snippet in zip(hits, snippets):
+            filename = os.path.basename(hit['metadata'].get('path', hit['id']))
+            snippet = snippet.replace("\n", " ")
             context_str += f"- From '{filename}': ...{snippet}...\n"
             
         return context_str
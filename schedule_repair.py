@@ -0,0 +1,75 @@
+import datetime
+from config_utils import get_config_value
+from intervals import IntervalSet, parse_time, workday
+
+def normalize_item(item):
+    """Copy of a schedule item with timezone-aware ISO 8601 start/end (naive times are local), or None if unparseable."""
+    try:
+        start, end = parse_time(item['start']), parse_time(item['end'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return dict(item, start=start.isoformat(), end=end.isoformat())
+
+def _nearest_fit(windows, start, length):
+    """Start time closest to `start` at which `length` fits into one of the windows, or None."""
+    best = None
+    for window_start, window_end in windows:
+        if window_end - window_start < length:
+            continue
+        candidate = min(max(start, window_start), window_end - length)
+        if best is None or abs(candidate - start) < abs(best - start):
+            best = candidate
+    return best
+
+def repair_schedule(schedule, busy_slots, now=None, min_minutes=None):
+    """
+    Fixes a schedule proposed by the LLM before it is booked. Returns (placed, unplaced).
+
+    Timestamps are normalized to aware ISO 8601. Items that fit where they were put
+    keep their slot. Items that overlap a busy slot or another item are shifted to the nearest free window of the same workday
+    (WORKDAY_START/END, never into the past) that fits them. If none does, they
+    are truncated into the nearest window of at least half their length (and at
+    least min_minutes). Items that cannot be placed are returned in `unplaced`.
+    """
+    min_minutes = min_minutes if min_minutes is not None else int(get_config_value("REPAIR_MIN_MINUTES", "15"))
+    now = parse_time(now) if now else datetime.datetime.now().astimezone()
+    occupied = IntervalSet(list(IntervalSet.from_slots(busy_slots)))
+    placed, unplaced, items = [], [], []
+    for item in schedule:
+        normalized = normalize_item(item)
+        if normalized is None or parse_time(normalized['end']) <= parse_time(normalized['start']):
+            print(f"⚠️ Schedule item has invalid times: {item.get('task')}")
+            unplaced.append(item)
+        else:
+            items.append(normalized)
+
+    # Items that fit where the LLM put them keep their slot; the others are repaired around them
+    conflicting = []
+    for item in sorted(items, key=lambda i: parse_time(i['start'])):
+        start, end = parse_time(item['start']), parse_time(item['end'])
+        if occupied.overlaps(start, end):
+            conflicting.append(item)
+        else:
+            occupied.add(start, end)
+            placed.append(item)
+
+    for item in conflicting:
+        start, end = parse_time(item['start']), parse_time(item['end'])
+        day_start, day_end = workday(start.astimezone().date())
+        windows = occupied.free_windows(max(day_start, now), day_end)
+        length = end - start
+        new_start = _nearest_fit(windows, start, length)
+        if new_start is None:
+            shorter = max(length / 2, datetime.timedelta(minutes=min_minutes))
+            new_start = _nearest_fit(windows, start, shorter)
+            if new_start is not None:
+                window_end = next(e for s, e in windows if s <= new_start < e)
+                length = min(length, window_end - new_start)
+        if new_start is None:
+            unplaced.append(item)
+            continue
+        new_end = new_start + length
+        print(f"🔧 Moved '{item.get('task')}' to {new_start.strftime('%H:%M')}-{new_end.strftime('%H:%M')} (conflict).")
+        occupied.add(new_start, new_end)
+        placed.append(dict(item, start=new_start.isoformat(), end=new_end.isoformat()))
+    return sorted(placed, key=lambda i: parse_time(i['start'])), unplaced
@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+# Ensure the root directory is in sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from vector_store import NumpyVectorStore, open_collection
+
+def rss_mb():
+    """Current resident set size in MB (Linux /proc, falls back to peak RSS elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except Exception:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+def make_corpus(n, dim, n_queries, seed=42):
+    """Clustered synthetic vectors with a MiniLM-like scale, plus held-out queries."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n // 100, 1), dim)).astype(np.float32)
+    assign = rng.integers(0, len(centers), size=n + n_queries)
+    data = centers[assign] + 0.35 * rng.normal(size=(n + n_queries, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    return data[:n], data[n:]
+
+def exact_top_k(corpus, queries, k):
+    truth = []
+    norms = np.einsum("ij,ij->i", corpus, corpus)
+    for q in queries:
+        dist = norms - 2.0 * corpus @ q
+        truth.append(set(np.argpartition(dist, k - 1)[:k].tolist()))
+    return truth
+
+def run_backend(label, build, reopen, queries, truth, k):
+    started = time.perf_counter()
+    store = build()
+    build_s = time.perf_counter() - started
+    del store
+
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    store = reopen()
+    store.count()
+    open_ms = (time.perf_counter() - started) * 1000
+
+    latencies = []
+    hits = 0
+    for q, expected in zip(queries, truth):
+        started = time.perf_counter()
+        result = store.query(query_embeddings=[q.tolist()], n_results=k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len({int(i) for i in result["ids"][0]} & expected)
+    rss_after = rss_mb()
+
+    latencies.sort()
+    print(f"{label:18} build {build_s:7.1f}s | open {open_ms:8.1f}ms | "
+          f"recall@{k} {hits / (k * len(queries)):.3f} | "
+          f"p50 {latencies[len(latencies) // 2]:6.2f}ms | p95 {latencies[int(len(latencies) * 0.95)]:6.2f}ms | "
+          f"RSS +{rss_after - rss_before:6.1f}MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the NumPy vector store against Chroma (recall@k and latency).")
+    parser.add_argument("--n", type=int, default=20000, help="Corpus size (use 100000 for personal-scale libraries)")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension (all-MiniLM-L6-v2 = 384)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=2000)
+    args = parser.parse_args()
+
+    corpus, queries = make_corpus(args.n, args.dim, args.queries)
+    truth = exact_top_k(corpus, queries, args.k)
+    ids = [str(i) for i in range(args.n)]
+    workdir = tempfile.mkdtemp(prefix="vector_bench_")
+    print(f"Corpus: {args.n} x {args.dim}, {args.queries} queries, k={args.k}\n")
+
+    def build_with(store):
+        for start in range(0, args.n, args.batch):
+            end = min(start + args.batch, args.n)
+            store.upsert(ids=ids[start:end], embeddings=corpus[start:end].tolist(),
+                         documents=[f"passage {i}" for i in range(start, end)])
+        return store
+
+    try:
+        for dtype in ("float16", "int8"):
+            path = os.path.join(workdir, f"numpy_{dtype}")
+            run_backend(f"numpy ({dtype})",
+                        lambda: build_with(NumpyVectorStore(path, dtype=dtype)),
+                        lambda: NumpyVectorStore(path),
+                        queries, truth, args.k)
+        try:
+            chroma_dir = os.path.join(workdir, "chroma")
+            run_backend("chroma (hnsw)",
+                        lambda: build_with(open_collection(chroma_dir, "bench", backend="chroma")),
+                        lambda: open_collection(chroma_dir, "bench", backend="chroma"),
+                        queries, truth, args.k)
+        except Exception as e:
+            print(f"chroma            skipped: {e}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from config_utils import get_config_value
+from embedding_cache import text_hash
+from file_utils import write_atomic
+
+def task_text(task):
+    return task['task'] if isinstance(task, dict) else str(task)
+
+def task_entry(task):
+    """What the store keeps of a task: its text and category (the link graph uses both)."""
+    if isinstance(task, dict):
+        return {"task": task['task'], "category": task.get('category')}
+    return {"task": str(task), "category": None}
+
+def task_id(task):
+    """Stable ID of a backlog task: a hash of its source and normalized text."""
+    source = task.get('source', '') if isinstance(task, dict) else ''
+    text = " ".join(task_text(task).lower().split())
+    return hashlib.sha1(f"{source}\0{text}".encode('utf-8')).hexdigest()[:16]
+
+class TaskLinkStore:
+    """
+    Backlog tasks and their precomputed context links, in <db_path>/task_links.json:
+
+        {"tasks": {task_id: {"task": text, "category": category}},
+         "links": {task_id: {"hits": [...], "versions": {source: [physical_name, version]}, "computed": ts}}}
+
+    Written atomically and reloaded when another process saved it (one stat otherwise).
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.path = os.path.join(db_path, "task_links.json")
+        self.data = {"tasks": {}, "links": {}}
+        self.mtime = None
+
+    def reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self.mtime:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.data = json.load(f)
+            self.mtime = mtime
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        write_atomic(self.path, lambda f: json.dump(self.data, f))
+        self.mtime = os.path.getmtime(self.path)
+
+    @property
+    def tasks(self):
+        return self.data["tasks"]
+
+    @property
+    def links(self):
+        return self.data["links"]
+
+class TaskLinker:
+    """
+    Materializes, for every backlog task, its top-k note chunks and book passages
+    (a FederatedSearch over the task text), so scheduling reads them instead of
+    running one retrieval per task. Notes connected to the task in the link graph
+    (RAGAgent.related_notes) are added to what the search found.
+
+    A link records the index version of each source it was computed against and the
+    content hash of every passage it holds (which also keys its summary). refresh()
+    (run by the background indexer) only recomputes links for new tasks, links whose
+    passages changed or vanished, links from a replaced generation, and links older
+    than max_age_hours (which also picks up notes that became relevant since).
+    """
+    def __init__(self, search, db_path="vector_db", k=None, max_age_hours=None, filters=None, snippet_chars=300):
+        self.search = search
+        self.store = TaskLinkStore(db_path)
+        self.k = k or int(get_config_value("TASK_LINKS_K", "5"))
+        self.max_age = 3600 * (max_age_hours or float(get_config_value("TASK_LINKS_MAX_AGE_HOURS", "24")))
+        self.filters = filters
+        self.snippet_chars = snippet_chars
+        self.graph_weight = float(get_config_value("TASK_LINKS_GRAPH_WEIGHT", "0.8"))
+        self.lock = threading.RLock()
+        self.checked_versions = None
+        self.stats = {"computed": 0, "reused": 0}
+
+    def _versions(self):
+        return {source.name: source.sync() for source in self.search.sources}
+
+    def _fresh(self, link):
+        return link is not None and time.time() - link.get("computed", 0) < self.max_age
+
+    def _graph_hits(self, task):
+        notes = self.search.source("markdown_notes")
+        if notes is None or not hasattr(notes.agent, "related_notes"):
+            return []
+        return [
+            dict(hit, source=notes.name, score=hit["score"] * self.graph_weight)
+            for hit in notes.agent.related_notes(task, n_results=self.k)
+        ]
+
+    def _compute(self, tid, task, versions=None):
+        task = task if isinstance(task, dict) else task_entry(task)
+        hits = self.search.search(task["task"], n_results=self.k, filters=self.filters)
+        best = {(hit["source"], hit["id"]): hit for hit in hits}
+        for hit in self._graph_hits(task):
+            key = (hit["source"], hit["id"])
+            if key not in best or hit["score"] > best[key]["score"]:
+                best[key] = hit
+        hits = sorted(best.values(), key=lambda h: h["score"], reverse=True)[:self.k]
+        link = {
+            "hits": [{
+                "source": hit["source"],
+                "id": hit["id"],
+                "score": hit["score"],
+                "document": hit["document"][:self.snippet_chars],
+                "metadata": hit["metadata"],
+                "content_hash": text_hash(hit["document"]),
+            } for hit in hits],
+            "versions": versions or self._versions(),
+            "computed": time.time(),
+        }
+        self.store.links[tid] = link
+        self.stats["computed"] += 1
+        return link
+
+    def _is_stale(self, link, versions):
+        if not self._fresh(link):
+            return True
+        if link.get("versions") == versions:
+            return False
+        for name, (physical, _) in versions.items():
+            if link["versions"].get(name, [physical])[0] != physical:
+                return True  # the collection was rebuilt into a new generation
+        for hit in link["hits"]:
+            source = self.search.source(hit["source"])
+            doc = source.agent.lexical_index.get(hit["id"]) if source else None
+            if doc is None or text_hash(doc["text"]) != hit.get("content_hash"):
+                return True
+        # Linked passages are unchanged: keep the link, now valid for these versions
+        link["versions"] = versions
+        return False
+
+    def track(self, tasks):
+        """Records the current backlog: new tasks get linked on the next refresh, removed ones are dropped."""
+        current = {task_id(t): task_entry(t) for t in tasks}
+        with self.lock:
+            self.store.reload()
+            if current == self.store.tasks:
+                return
+            self.store.data["tasks"] = current
+            for tid in list(self.store.links):
+                if tid not in current:
+                    del self.store.links[tid]
+            self.store.save()
+
+    def refresh(self):
+        """Recomputes stale and missing links. Returns how many were recomputed."""
+        with self.lock:
+            self.store.reload()
+            versions = self._versions()
+            missing = [tid for tid in self.store.tasks if not self._fresh(self.store.links.get(tid))]
+            if versions == self.checked_versions and not missing:
+                return 0
+            stale = missing + [
+                tid for tid, link in self.store.links.items()
+                if tid not in missing and self._is_stale(link, versions)
+            ]
+            for tid in stale:
+                self._compute(tid, self.store.tasks[tid], versions)
+            self.checked_versions = versions
+            self.store.save()
+            return len(stale)
+
+    def hits(self, tasks, n_results=5):
+        """
+        Merged hits for a list of tasks, read from the stored links. A task that was
+        never linked (or whose link expired) is linked inline, once.
+        """
+        best = {}
+        with self.lock:
+            self.store.reload()
+            computed = False
+            for task in tasks:
+                tid = task_id(task)
+                link = self.store.links.get(tid)
+                if self._fresh(link):
+                    self.stats["reused"] += 1
+                else:
+                    self.store.tasks[tid] = task_entry(task)
+                    link = self._compute(tid, task_entry(task))
+                    computed = True
+                for hit in link["hits"]:
+                    key = (hit["source"], hit["id"])
+                    if key not in best or hit["score"] > best[key]["score"]:
+                        best[key] = hit
+            if computed:
+                self.store.save()
+        return self.search._merge(best.values(), n_results)
+
+    def context(self, tasks, n_results=5):
+        """Context block for the prompt, built from the stored links ("" when nothing matched)."""
+        return self.search.format_context(self.hits(tasks, n_results=n_results))
+
+_linkers = {}
+_linkers_lock = threading.Lock()
+
+def get_task_linker(workspace_dir=None, logseq_dir=None, books_dir=None, db_path="vector_db"):
+    """
+    Returns the process-wide TaskLinker over the shared federated search. Links are
+    computed with the scheduling filters (recent journal notes boosted).
+    """
+    from federated_search import get_federated_search
+
+    key = (workspace_dir, logseq_dir, books_dir, os.path.abspath(db_path))
+    with _linkers_lock:
+        if key not in _linkers:
+            search = get_federated_search(workspace_dir, logseq_dir, books_dir=books_dir, db_path=db_path)
+            filters = {"markdown_notes": {"recency_boost": float(get_config_value("SCHEDULING_RECENCY_BOOST", "0"))}}
+            _linkers[key] = TaskLinker(search, db_path=db_path, filters=filters)
+        return _linkers[key]
@@ -0,0 +1,81 @@
+import os
+import pytest
+from unittest.mock import patch
+from book_agent import BookAgent
+from book_catalog import BookCatalog, trigrams
+
+EXTENSIONS = {".pdf", ".epub"}
+
+@pytest.fixture
+def books(tmp_path):
+    root = tmp_path / "books"
+    (root / "languages").mkdir(parents=True)
+    (root / "languages" / "Thai Grammar.epub").write_bytes(b"epub")
+    (root / "Deep Work.pdf").write_bytes(b"pdf")
+    (root / "notes.txt").write_text("not a book")
+    return root
+
+def make_catalog(tmp_path, books):
+    return BookCatalog(str(books), str(tmp_path / "db" / "book_catalog.json"), EXTENSIONS)
+
+def test_trigrams():
+    assert trigrams("Thai") == {"tha", "hai"}
+    assert trigrams("ab") == set()
+
+def test_catalog_lists_books_recursively(tmp_path, books):
+    catalog = make_catalog(tmp_path, books)
+    assert [b["relative_path"] for b in catalog.list()] == [
+        "Deep Work.pdf", os.path.join("languages", "Thai Grammar.epub")
+    ]
+
+def test_catalog_only_relists_changed_directories(tmp_path, books):
+    make_catalog(tmp_path, books).list()
+
+    # A fresh process loads the persisted catalog; nothing changed, so nothing is listed
+    catalog = make_catalog(tmp_path, books)
+    with patch("book_catalog.os.scandir", wraps=os.scandir) as scandir:
+        assert len(catalog.list()) == 2
+        scandir.assert_not_called()
+
+        (books / "languages" / "Thai Vocabulary.pdf").write_bytes(b"pdf")
+        (books / "Deep Work.pdf").unlink()
+        names = [b["name"] for b in catalog.list()]
+        assert names == ["Thai Grammar.epub", "Thai Vocabulary.pdf"]
+        assert scandir.call_count == 2
+
+def test_catalog_picks_up_new_and_removed_subdirectories(tmp_path, books):
+    catalog = make_catalog(tmp_path, books)
+    catalog.list()
+    (books / "history" / "asia").mkdir(parents=True)
+    (books / "history" / "asia" / "Siam.pdf").write_bytes(b"pdf")
+    assert catalog.get(str(books / "history" / "asia" / "Siam.pdf"))["extension"] == ".pdf"
+
+    (books / "history" / "asia" / "Siam.pdf").unlink()
+    (books / "history" / "asia").rmdir()
+    (books / "history").rmdir()
+    assert len(catalog.list()) == 2
+    assert not any("history" in d for d in catalog.dirs)
+
+def test_trigram_title_search(tmp_path, books):
+    catalog = make_catalog(tmp_path, books)
+    assert [b["name"] for b in catalog.search("grammar")] == ["Thai Grammar.epub"]
+    assert [b["name"] for b in catalog.search("W")] == ["Deep Work.pdf"]
+    assert catalog.search("mandarin") == []
+
+def test_summary_reports_index_status(tmp_path, write_pdf):
+    books = tmp_path / "books"
+    books.mkdir()
+    write_pdf(books / "Thai Grammar.pdf", [f"Page {i} explains Thai tones and the classifier system in detail" for i in range(3)])
+    (books / "Cover.png").write_bytes(b"png")
+
+    agent = BookAgent(books_dir=str(books), db_path=str(tmp_path / "db"), retrieval_mode="lexical")
+    agent.index_library(workers=0)
+
+    # Summaries come from the catalog; the lexical index is never loaded
+    agent = BookAgent(books_dir=str(books), db_path=str(tmp_path / "db"), retrieval_mode="lexical")
+    summary = agent.get_summary()
+    assert "Found 2 books" in summary
+    assert "Deep Search Index: 3 passages stored (1 books indexed)." in summary
+    assert agent._lexical_index is None
+    assert agent.catalog.get(str(books / "Thai Grammar.pdf"))["status"] == "indexed"
+    assert [b["name"] for b in agent.query_books("thai")] == ["Thai Grammar.pdf"]
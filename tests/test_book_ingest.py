@@ -0,0 +1,59 @@
+import os
+import pytest
+from unittest.mock import patch, MagicMock
+from book_agent import BookAgent
+from book_ingest import IngestPipeline, extract_pdf_range, extract_epub_range, count_units
+
+@pytest.fixture
+def sample_pdf(tmp_path, write_pdf):
+    path = tmp_path / "Thai Grammar.pdf"
+    pages = [f"Page {i} explains Thai tones and the classifier system in enough detail to index" for i in range(40)]
+    pages[5] = "short"
+    write_pdf(path, pages)
+    return path
+
+def test_extract_pdf_range(sample_pdf):
+    pages = extract_pdf_range(str(sample_pdf), 2, 4)
+    assert [i for i, _ in pages] == [2, 3]
+    assert "Page 2" in pages[0][1]
+
+def test_an_epub_is_parsed_once_for_all_its_ranges(tmp_path):
+    path = tmp_path / "Thai Stories.epub"
+    path.write_bytes(b"epub")
+    items = [MagicMock(**{"get_body_content.return_value": f"<p>Story {i}</p>"}) for i in range(40)]
+    epub = MagicMock(**{"read_epub.return_value.get_items_of_type.return_value": items})
+    soup = lambda html, parser: MagicMock(**{"get_text.return_value": html[3:-4]})
+    with patch("book_ingest.epub", epub, create=True), patch("book_ingest.ebooklib", MagicMock(), create=True), \
+         patch("book_ingest.BeautifulSoup", soup, create=True):
+        assert count_units(str(path)) == 40
+        sections = extract_epub_range(str(path), 0, 16) + extract_epub_range(str(path), 16, 32)
+        assert sections[17] == (17, "Story 17")
+        epub.read_epub.assert_called_once()
+        # A rewritten book is parsed again
+        os.utime(path, (os.path.getmtime(path) + 10, os.path.getmtime(path) + 10))
+        extract_epub_range(str(path), 32, 40)
+        assert epub.read_epub.call_count == 2
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_pipeline_indexes_all_pages(sample_pdf, tmp_path, workers):
+    agent = BookAgent(books_dir=str(tmp_path), db_path=str(tmp_path / f"db{workers}"), retrieval_mode="lexical")
+    pipeline = IngestPipeline(agent, workers=workers, pages_per_task=8, batch_size=4, queue_size=8)
+    sections = pipeline.run(str(sample_pdf))
+
+    assert sections == 39  # the near-empty page is skipped
+    assert agent.lexical_index.get("Thai Grammar.pdf_p0")["metadata"]["page"] == 0
+    assert agent.lexical_index.get("Thai Grammar.pdf_p5") is None
+    assert pipeline.stats["extract"].items == 40
+    assert pipeline.stats["upsert"].items == 39
+
+def test_long_pages_are_chunked(sample_pdf, tmp_path):
+    agent = BookAgent(books_dir=str(tmp_path), db_path=str(tmp_path / "db"), retrieval_mode="lexical")
+    pipeline = IngestPipeline(agent, workers=0, chunk_chars=40)
+    pipeline.run(str(sample_pdf))
+    assert agent.lexical_index.get("Thai Grammar.pdf_p1_c1")["metadata"]["page"] == 1
+
+def test_index_library(sample_pdf, tmp_path):
+    agent = BookAgent(books_dir=str(tmp_path), db_path=str(tmp_path / "db"), retrieval_mode="lexical")
+    results = agent.index_library(workers=0)
+    assert results == ["Successfully indexed 39 sections from 'Thai Grammar.pdf'."]
+    assert "Thai Grammar.pdf" in agent.search_books("classifier tones")
@@ -0,0 +1,106 @@
+import os
+import shutil
+import pytest
+from book_agent import BookAgent
+from book_manifest import ManifestStore, file_hash, is_unchanged
+from book_ingest import IngestPipeline, EXTRACTOR_VERSION
+
+@pytest.fixture
+def make_book(write_pdf):
+    def make(path, n_pages=40, topic="Thai tones"):
+        write_pdf(path, [f"Page {i} explains {topic} and the classifier system in enough detail to index" for i in range(n_pages)])
+        return path
+    return make
+
+@pytest.fixture
+def library(tmp_path, make_book):
+    books = tmp_path / "books"
+    books.mkdir()
+    make_book(books / "Thai Grammar.pdf")
+    return books
+
+def make_agent(tmp_path, library):
+    return BookAgent(books_dir=str(library), db_path=str(tmp_path / "db"), retrieval_mode="lexical")
+
+def test_unchanged_book_is_skipped(tmp_path, library):
+    agent = make_agent(tmp_path, library)
+    assert agent.index_library(workers=0) == ["Successfully indexed 40 sections from 'Thai Grammar.pdf'."]
+
+    # A fresh agent reads the manifest from disk
+    agent = make_agent(tmp_path, library)
+    assert agent.index_library(workers=0) == ["Skipped 'Thai Grammar.pdf' (unchanged since last index)."]
+    manifest = agent.manifests.for_path(str(library / "Thai Grammar.pdf"))
+    assert manifest["complete"] and manifest["page_count"] == 40 and manifest["last_page_committed"] == 39
+
+def test_duplicate_content_at_second_path_is_not_reindexed(tmp_path, library):
+    agent = make_agent(tmp_path, library)
+    agent.index_library(workers=0)
+    (library / "copies").mkdir()
+    shutil.copy(library / "Thai Grammar.pdf", library / "copies" / "Thai Grammar (1).pdf")
+
+    results = agent.index_library(workers=0)
+    assert "Skipped 'Thai Grammar (1).pdf' (same content as 'Thai Grammar.pdf', already indexed)." in results
+    assert agent.lexical_index.count() == 40
+    assert len(agent.manifests.all()) == 1
+
+def test_interrupted_index_resumes_from_last_committed_page(tmp_path, library):
+    path = str(library / "Thai Grammar.pdf")
+    agent = make_agent(tmp_path, library)
+    manifest = agent.manifests.create(file_hash(path), path, EXTRACTOR_VERSION)
+    manifest["last_page_committed"] = 24
+    agent.manifests.save(manifest)
+
+    assert agent.index_book(path, workers=0) == "Successfully indexed 15 sections from 'Thai Grammar.pdf'."
+    assert agent.lexical_index.get("Thai Grammar.pdf_p24") is None
+    assert agent.lexical_index.get("Thai Grammar.pdf_p25") is not None
+    assert agent.manifests.for_path(path)["complete"]
+
+def test_pipeline_reports_commits_in_page_order(tmp_path, library):
+    agent = make_agent(tmp_path, library)
+    committed = []
+    IngestPipeline(agent, workers=0, batch_size=4).run(str(library / "Thai Grammar.pdf"), start_page=10,
+                                                       on_commit=committed.append, commit_interval=0)
+    assert committed == sorted(committed)
+    assert committed[0] >= 10 and committed[-1] == 39
+
+def test_changed_and_removed_books_drop_stale_passages(tmp_path, library, make_book):
+    agent = make_agent(tmp_path, library)
+    agent.index_library(workers=0)
+
+    path = library / "Thai Grammar.pdf"
+    make_book(path, n_pages=10, topic="Thai vowels")
+    os.utime(path, (1, 1))
+    assert agent.index_library(workers=0) == ["Successfully indexed 10 sections from 'Thai Grammar.pdf'."]
+    assert agent.lexical_index.count() == 10
+    assert len(agent.manifests.all()) == 1
+
+    os.remove(path)
+    assert agent.index_library(workers=0) == ["Removed 'Thai Grammar.pdf' (no longer in the library)."]
+    assert agent.lexical_index.count() == 0
+    assert ManifestStore(str(tmp_path / "db" / "book_manifests")).all() == []
+
+def test_force_reindexes(tmp_path, library):
+    agent = make_agent(tmp_path, library)
+    agent.index_library(workers=0)
+    assert agent.index_library(workers=0, force=True) == ["Successfully indexed 40 sections from 'Thai Grammar.pdf'."]
+    assert agent.manifests.all()[0]["sections"] == 40
+
+def test_run_started_at_another_path_resumes_at_the_new_one(tmp_path, library):
+    path = str(library / "Thai Grammar.pdf")
+    old_path = str(library / "Inbox" / "Thai Grammar.pdf")
+    agent = make_agent(tmp_path, library)
+    manifest = agent.manifests.create(file_hash(path), path, EXTRACTOR_VERSION)
+    manifest["paths"] = {old_path: manifest["paths"][path]}
+    manifest["last_page_committed"] = 24
+    agent.manifests.save(manifest)
+
+    assert agent.index_book(path, workers=0) == "Successfully indexed 15 sections from 'Thai Grammar.pdf'."
+    assert set(agent.manifests.get(file_hash(path))["paths"]) == {old_path, path}
+    assert agent.lexical_index.get("Thai Grammar.pdf_p25")["metadata"]["path"] == path
+
+def test_unchanged_check_compares_absolute_paths(tmp_path, library, monkeypatch):
+    agent = make_agent(tmp_path, library)
+    agent.index_library(workers=0)
+    monkeypatch.chdir(library)
+    manifest = agent.manifests.for_path("Thai Grammar.pdf")
+    assert is_unchanged(manifest, "Thai Grammar.pdf", EXTRACTOR_VERSION)
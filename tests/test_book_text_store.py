@@ -0,0 +1,72 @@
+import pytest
+from unittest.mock import patch
+from book_agent import BookAgent
+from book_text_store import BookText, open_book_text
+from book_ingest import EXTRACTOR_VERSION
+from book_manifest import file_hash
+
+@pytest.fixture
+def book(tmp_path, write_pdf):
+    books = tmp_path / "books"
+    books.mkdir()
+    path = books / "Thai Grammar.pdf"
+    write_pdf(path, [f"Page {i} explains Thai tones and the classifier system in enough detail to index" for i in range(30)])
+    return path
+
+def make_agent(tmp_path, book):
+    return BookAgent(books_dir=str(book.parent), db_path=str(tmp_path / "db"), retrieval_mode="lexical")
+
+def test_book_text_round_trip_and_crash_recovery(tmp_path):
+    text = BookText(str(tmp_path), "abc", "2")
+    for i in range(3):
+        text.append(i, f"page {i} " * 50)
+    text.flush()
+    text.append(3, "never flushed")
+
+    reopened = BookText(str(tmp_path), "abc", "2")
+    assert reopened.units == 3 and not reopened.complete
+    assert reopened.read(1, 3)[0] == (1, "page 1 " * 50)
+    reopened.append(3, "page 3")
+    reopened.finish(4)
+    assert BookText(str(tmp_path), "abc", "2").read(3, 10) == [(3, "page 3")]
+
+    with pytest.raises(ValueError):
+        reopened.append(6, "out of order")
+
+def test_opening_for_reads_never_trims_the_writer(tmp_path):
+    writer = BookText(str(tmp_path), "abc", "2")
+    writer.append(0, "page 0")
+    writer.flush()
+    writer.append(1, "page 1")
+
+    reader = BookText(str(tmp_path), "abc", "2")
+    assert reader.read(0, 5) == [(0, "page 0")]
+    writer.flush()
+    assert writer.read(1, 2) == [(1, "page 1")]
+    assert open_book_text(str(tmp_path), "abc", "2") is open_book_text(str(tmp_path), "abc", "2")
+
+def test_read_book_content_extracts_once(tmp_path, book):
+    agent = make_agent(tmp_path, book)
+    with patch("book_ingest.PyPDF2.PdfReader", wraps=__import__("PyPDF2").PdfReader) as reader:
+        first = agent.read_book_content(str(book), max_chars=500)
+        parses = reader.call_count
+        second = agent.read_book_content(str(book), max_chars=500)
+        assert reader.call_count == parses
+    assert first == second
+    assert first.startswith("Page 0 explains") and first.endswith("...")
+
+    later = agent.read_book_content(str(book), max_chars=200, start=20)
+    assert later.startswith("Page 20 explains")
+
+def test_index_book_fills_the_store_and_reindex_reads_it(tmp_path, book):
+    agent = make_agent(tmp_path, book)
+    agent.index_book(str(book), workers=0)
+    text = open_book_text(agent.db_path, file_hash(str(book)), EXTRACTOR_VERSION)
+    assert text.complete and text.units == 30
+
+    with patch("book_ingest.extract_pdf_range") as extract:
+        assert agent.index_book(str(book), workers=0, force=True) == "Successfully indexed 30 sections from 'Thai Grammar.pdf'."
+        extract.assert_not_called()
+    with patch("book_ingest.PyPDF2.PdfReader") as reader:
+        assert "Page 29 explains" in agent.read_book_content(str(book), start=29)
+        reader.assert_not_called()
@@ -1,8 +1,13 @@
 import pytest
 import os
+import json
+import time
 import yaml
+import datetime
+import urllib.request
+import urllib.error
 from unittest.mock import patch, MagicMock
-from calendar_agent import CalendarAgent
+from calendar_agent import CalendarAgent, CalendarRefreshScheduler
 
 def test_calendar_agent_init(tmp_path):
     # Test with a temporary data directory
@@ -12,8 +17,11 @@ def test_calendar_agent_init(tmp_path):
     assert agent.yml_path == os.path.join(str(data_dir), "googlecalendar.yml")
 
 @patch('calendar_manager.get_calendar_service')
+@patch('focus_analytics.refresh_focus_analytics')
+@patch('calendar_manager.sync_calendars', return_value=1)
+@patch('calendar_agent.planning_dates', side_effect=lambda: [datetime.date.today()])
 @patch('calendar_manager.get_busy_slots')
-def test_fetch_and_store_calendar(mock_get_slots, mock_get_service, tmp_path):
+def test_fetch_and_store_calendar(mock_get_slots, mock_dates, mock_sync, mock_focus, mock_get_service, tmp_path):
     data_dir = tmp_path / "datainput"
     agent = CalendarAgent(data_dir=str(data_dir))
     
@@ -25,11 +33,28 @@ def test_fetch_and_store_calendar(mock_get_slots, mock_get_service, tmp_path):
     
     agent.fetch_and_store_calendar()
     
+    with open(agent.json_path, 'r') as f:
+        assert json.load(f)["busy_slots"] == test_slots
+    # The YAML export is still written for humans
     assert os.path.exists(agent.yml_path)
     with open(agent.yml_path, 'r') as f:
         data = yaml.safe_load(f)
         assert data["busy_slots"] == test_slots
         assert "last_updated" in data
+    assert agent.get_busy_slots_from_yml() == test_slots
+    mock_sync.assert_called_once()
+
+@patch('calendar_manager.get_calendar_service')
+@patch('focus_analytics.refresh_focus_analytics')
+@patch('calendar_manager.sync_calendars', return_value=0)
+@patch('calendar_manager.get_busy_slots', side_effect=lambda service, date_str, **kwargs: [{"day": date_str}])
+def test_after_the_workday_tomorrow_is_stored_too(mock_get_slots, mock_sync, mock_focus, mock_get_service, tmp_path):
+    agent = CalendarAgent(data_dir=str(tmp_path / "datainput"))
+    today = datetime.date.today()
+    tomorrow = today + datetime.timedelta(days=1)
+    with patch('calendar_agent.planning_dates', return_value=[tomorrow]):
+        agent.fetch_and_store_calendar()
+    assert agent.get_busy_slots_from_yml() == [{"day": today.isoformat()}, {"day": tomorrow.isoformat()}]
 
 def test_get_busy_slots_from_yml(tmp_path):
     data_dir = tmp_path / "datainput"
@@ -48,3 +73,108 @@ def test_get_busy_slots_from_yml(tmp_path):
     slots = agent.get_busy_slots_from_yml()
     assert len(slots) == 1
     assert slots[0]["summary"] == "Stored Event"
+
+def test_busy_slots_are_cached_until_the_file_changes(tmp_path):
+    agent = CalendarAgent(data_dir=str(tmp_path / "datainput"))
+    with open(agent.json_path, 'w') as f:
+        json.dump({"busy_slots": [{"summary": "First"}]}, f)
+    assert agent.get_busy_slots_from_yml() == [{"summary": "First"}]
+
+    # Another agent (or process) reading the same cache does not parse it again
+    with patch('calendar_agent.json.load') as mock_load:
+        assert CalendarAgent(data_dir=str(tmp_path / "datainput")).get_busy_slots_from_yml() == [{"summary": "First"}]
+        mock_load.assert_not_called()
+
+    with open(agent.json_path, 'w') as f:
+        json.dump({"busy_slots": [{"summary": "Second"}]}, f)
+    os.utime(agent.json_path, (time.time() + 10, time.time() + 10))
+    assert agent.get_busy_slots_from_yml() == [{"summary": "Second"}]
+
+def test_planning_refreshes_a_stale_snapshot_first(tmp_path):
+    agent = CalendarAgent(data_dir=str(tmp_path / "datainput"))
+    with open(agent.json_path, 'w') as f:
+        json.dump({"busy_slots": [{"summary": "Stored"}]}, f)
+
+    def refresh():
+        with open(agent.json_path, 'w') as f:
+            json.dump({"busy_slots": [{"summary": "Fresh"}]}, f)
+        os.utime(agent.json_path, (time.time() + 10, time.time() + 10))
+
+    with patch.object(agent, 'fetch_and_store_calendar', side_effect=refresh) as mock_fetch:
+        assert agent.get_fresh_busy_slots(max_age=60) == [{"summary": "Stored"}]
+        mock_fetch.assert_not_called()
+        os.utime(agent.json_path, (time.time() - 120, time.time() - 120))
+        assert agent.get_fresh_busy_slots(max_age=60) == [{"summary": "Fresh"}]
+        mock_fetch.assert_called_once()
+
+    # Without a working calendar the stored slots are still used
+    os.utime(agent.json_path, (time.time() - 120, time.time() - 120))
+    with patch.object(agent, 'fetch_and_store_calendar', side_effect=RuntimeError("offline")):
+        assert agent.get_fresh_busy_slots(max_age=60) == [{"summary": "Fresh"}]
+
+def noon(minutes=0):
+    return datetime.datetime.now().replace(hour=12, minute=0, second=0, microsecond=0).timestamp() + 60 * minutes
+
+def make_scheduler(now, next_event=None, planning_times=()):
+    scheduler = CalendarRefreshScheduler(agent=MagicMock(), min_interval=60, max_interval=1800,
+                                         planning_times=list(planning_times), lead_minutes=15, clock=lambda: now)
+    store = MagicMock()
+    store.next_start.return_value = next_event
+    return scheduler, patch('calendar_manager.get_event_store', return_value=store)
+
+def test_refresh_interval_backs_off_and_resets_on_changes():
+    scheduler, store = make_scheduler(noon())
+    with store:
+        assert [scheduler.next_delay(0) for _ in range(6)] == [120, 240, 480, 960, 1800, 1800]
+        assert scheduler.next_delay(3) == 60
+
+def test_refresh_speeds_up_before_planning_times_and_events():
+    scheduler, store = make_scheduler(noon(), planning_times=["12:10"])
+    with store:
+        assert scheduler.next_delay(0) == 60
+    scheduler, store = make_scheduler(noon(), planning_times=["12:40"])
+    with store:
+        for _ in range(5):
+            delay = scheduler.next_delay(0)
+        # Wakes up 15 minutes before 12:40 rather than sleeping the full 30
+        assert delay == 25 * 60
+    scheduler, store = make_scheduler(noon(), next_event=noon(20))
+    with store:
+        scheduler.interval = 1800
+        assert scheduler.next_delay(0) == 5 * 60
+
+def test_trigger_wakes_the_background_loop():
+    agent = MagicMock()
+    agent.fetch_and_store_calendar.return_value = 0
+    scheduler = CalendarRefreshScheduler(agent=agent, min_interval=3600, max_interval=3600, planning_times=[], lead_minutes=0)
+    with patch('calendar_manager.get_event_store', return_value=MagicMock(**{"next_start.return_value": None})):
+        scheduler.start()
+        try:
+            deadline = time.time() + 5
+            while scheduler.stats["refreshes"] < 1 and time.time() < deadline:
+                time.sleep(0.01)
+            scheduler.trigger()
+            while scheduler.stats["refreshes"] < 2 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            scheduler.stop()
+    assert scheduler.stats["refreshes"] >= 2
+
+def test_webhook_triggers_a_refresh():
+    scheduler = CalendarRefreshScheduler(agent=MagicMock(), min_interval=60, max_interval=60, planning_times=[])
+    port = scheduler.start_webhook(port=0, token="secret")
+    try:
+        def post(headers):
+            request = urllib.request.Request(f"http://127.0.0.1:{port}/calendar", data=b"", headers=headers, method="POST")
+            try:
+                return urllib.request.urlopen(request, timeout=5).status
+            except urllib.error.HTTPError as e:
+                return e.code
+        assert post({}) == 403
+        assert post({"X-Goog-Channel-Token": "secret", "X-Goog-Resource-State": "sync"}) == 202
+        assert scheduler.stats["triggered"] == 0
+        assert post({"X-Goog-Channel-Token": "secret", "X-Goog-Resource-State": "exists"}) == 202
+        assert scheduler.stats["triggered"] == 1
+        assert scheduler.wakeup.is_set()
+    finally:
+        scheduler.stop()
@@ -0,0 +1,250 @@
+import pytest
+import datetime
+from unittest.mock import MagicMock, patch
+from googleapiclient.errors import HttpError
+import calendar_manager
+from event_store import CalendarEventStore
+
+@pytest.fixture(autouse=True)
+def event_store(tmp_path):
+    store = CalendarEventStore(str(tmp_path / "calendar_events.sqlite3"))
+    with patch("calendar_manager.get_event_store", return_value=store):
+        yield store
+
+def http_error(status, reason="error"):
+    return HttpError(MagicMock(status=status), f'{{"error": {{"message": "{reason}"}}}}'.encode())
+
+class FakeService:
+    """Records batches; outcomes[attempt][summary] is an exception to return for that event."""
+    def __init__(self, outcomes=None):
+        self.outcomes = outcomes or []
+        self.batches = []
+
+    def events(self):
+        events = MagicMock()
+        events.insert.side_effect = lambda calendarId, body: {"calendarId": calendarId, "body": body}
+        return events
+
+    def new_batch_http_request(self, callback):
+        service = self
+        attempt = len(self.batches)
+
+        class Batch:
+            def __init__(self):
+                self.requests = []
+                service.batches.append(self.requests)
+
+            def add(self, request, request_id):
+                self.requests.append((request_id, request))
+
+            def execute(self):
+                failures = service.outcomes[attempt] if attempt < len(service.outcomes) else {}
+                for request_id, request in self.requests:
+                    error = failures.get(request["body"]["summary"])
+                    callback(request_id, None if error else {"id": request_id, "htmlLink": "link"}, error)
+        return Batch()
+
+def schedule(n):
+    return [{"task": f"Task {i}", "start": "2026-10-19T09:00:00", "end": "2026-10-19T10:00:00"} for i in range(n)]
+
+def test_day_plan_is_one_batch():
+    service = FakeService()
+    results = calendar_manager.create_events(service, schedule(12), calendar_id="work")
+    assert len(service.batches) == 1
+    assert len(service.batches[0]) == 12
+    assert all(r["error"] is None for r in results)
+    assert [r["item"]["task"] for r in results] == [f"Task {i}" for i in range(12)]
+    assert service.batches[0][0][1]["body"]["start"]["dateTime"].startswith("2026-10-19T09:00:00")
+    assert service.batches[0][0][1]["calendarId"] == "work"
+
+def test_large_plans_are_chunked():
+    service = FakeService()
+    calendar_manager.create_events(service, schedule(120))
+    assert [len(b) for b in service.batches] == [50, 50, 20]
+
+@patch("calendar_manager.time.sleep")
+def test_only_failed_items_are_retried(mock_sleep):
+    service = FakeService(outcomes=[
+        {"AI: Task 3": http_error(503), "AI: Task 5": http_error(400, "bad request")},
+        {},
+    ])
+    results = calendar_manager.create_events(service, schedule(8))
+    assert len(service.batches) == 2
+    assert [request_id for request_id, _ in service.batches[1]] == ["3"]
+    assert results[3]["error"] is None
+    assert "bad request" in results[5]["error"]
+    assert [r["error"] is None for r in results].count(True) == 7
+
+def test_inserts_carry_a_stable_id_and_a_conflict_is_settled_by_update():
+    service = FakeService(outcomes=[{"AI: Task 1": http_error(409, "duplicate")}])
+    service.updates = []
+
+    def update(calendarId, eventId, body):
+        service.updates.append((eventId, body["status"]))
+        return {"calendarId": calendarId, "body": body}
+    events = service.events
+    service.events = lambda: MagicMock(insert=events().insert, update=MagicMock(side_effect=update))
+
+    results = calendar_manager.create_events(service, schedule(2))
+
+    ids = [request["body"]["id"] for _, request in service.batches[0]]
+    assert ids == [build["id"] for build in map(calendar_manager.build_event, schedule(2))]
+    assert len(set(ids)) == 2 and all(set(i) <= set("0123456789abcdefghijklmnopqrstuv") for i in ids)
+    assert service.updates == [(ids[1], "confirmed")]
+    assert all(r["error"] is None for r in results)
+
+def test_rate_limits_are_retried_but_permission_errors_are_not():
+    assert calendar_manager._is_retriable(http_error(403, "Rate Limit Exceeded (rateLimitExceeded)"))
+    assert not calendar_manager._is_retriable(http_error(403, "forbidden"))
+    assert calendar_manager._is_retriable(http_error(429))
+
+def test_free_busy_is_one_request_and_merges_calendars():
+    service = MagicMock()
+    service.freebusy().query().execute.return_value = {"calendars": {
+        "primary": {"busy": [{"start": "2026-10-19T09:00:00Z", "end": "2026-10-19T10:00:00Z"}]},
+        "team": {"busy": [{"start": "2026-10-19T09:30:00Z", "end": "2026-10-19T11:00:00Z"},
+                          {"start": "2026-10-19T14:00:00Z", "end": "2026-10-19T15:00:00Z"}]},
+        "family": {"busy": [], "errors": [{"domain": "global", "reason": "notFound"}]},
+    }}
+    service.freebusy().query.reset_mock()
+
+    slots = calendar_manager.get_busy_slots(service, ["primary", "team", "family", "primary"],
+                                            date_str="2026-10-19", include_summaries=False)
+
+    service.freebusy().query.assert_called_once()
+    body = service.freebusy().query.call_args.kwargs["body"]
+    assert [item["id"] for item in body["items"]] == ["primary", "team", "family"]
+    utc = lambda hour, minute=0: datetime.datetime(2026, 10, 19, hour, minute, tzinfo=datetime.timezone.utc)
+    parsed = [(datetime.datetime.fromisoformat(s["start"]), datetime.datetime.fromisoformat(s["end"])) for s in slots]
+    assert parsed == [(utc(9), utc(11)), (utc(14), utc(15))]
+    service.events().list.assert_not_called()
+
+def test_summaries_come_from_own_calendars_and_shared_ones_use_free_busy():
+    service = MagicMock()
+    service.freebusy().query().execute.return_value = {"calendars": {
+        "team": {"busy": [{"start": "2026-10-19T14:00:00Z", "end": "2026-10-19T15:00:00Z"}]},
+    }}
+    service.freebusy().query.reset_mock()
+    own = [{"calendar_id": "primary", "summary": "Dentist", "start": "2026-10-19T09:00:00Z",
+            "end": "2026-10-19T10:00:00Z", "all_day": False}]
+    with patch("calendar_manager._day_events", return_value=own) as mock_events:
+        slots = calendar_manager.get_busy_slots(service, ["primary", "team"], date_str="2026-10-19",
+                                                summary_calendar_ids=["primary", "primary"])
+    mock_events.assert_called_once_with(service, ["primary"], "2026-10-19")
+    body = service.freebusy().query.call_args.kwargs["body"]
+    assert [item["id"] for item in body["items"]] == ["team"]
+    assert slots[0] == {"summary": "Dentist", "start": "2026-10-19T09:00:00Z", "end": "2026-10-19T10:00:00Z",
+                        "source_calendar": "primary"}
+    assert len(slots) == 2 and "summary" not in slots[1]
+
+def test_merge_busy_normalizes_timezones():
+    merged = calendar_manager.merge_busy([
+        {"start": "2026-10-19T10:00:00+02:00", "end": "2026-10-19T11:00:00+02:00"},
+        {"start": "2026-10-19T09:00:00Z", "end": "2026-10-19T09:30:00Z"},
+    ])
+    assert len(merged) == 1
+    assert datetime.datetime.fromisoformat(merged[0]["end"]) == datetime.datetime(2026, 10, 19, 9, 30, tzinfo=datetime.timezone.utc)
+
+@patch("calendar_manager.get_config_value", side_effect=lambda key, default=None: {
+    "CALENDAR_ID": "work", "BUSY_CALENDAR_IDS": "team, primary ,family"}.get(key, default))
+def test_busy_calendar_ids_include_shared_calendars(mock_config):
+    assert calendar_manager.busy_calendar_ids() == ["primary", "work", "team", "family"]
+
+class RecordingService:
+    """Batched events().insert/patch/delete that succeed and are recorded as (method, event id, body)."""
+    def __init__(self):
+        self.calls = []
+
+    def events(self):
+        events = MagicMock()
+        events.insert.side_effect = lambda calendarId, body: ("insert", None, body)
+        events.patch.side_effect = lambda calendarId, eventId, body: ("patch", eventId, body)
+        events.delete.side_effect = lambda calendarId, eventId: ("delete", eventId, None)
+        return events
+
+    def new_batch_http_request(self, callback):
+        service = self
+
+        class Batch:
+            requests = []
+
+            def add(self, request, request_id):
+                self.requests = self.requests + [(request_id, request)]
+
+            def execute(self):
+                for request_id, (method, event_id, body) in self.requests:
+                    service.calls.append((method, event_id, body))
+                    event_id = event_id or f"new-{len(service.calls)}"
+                    callback(request_id, dict(body, id=event_id) if body else "", None)
+        return Batch()
+
+def today_at(hour):
+    return datetime.datetime.now().replace(hour=hour, minute=0, second=0, microsecond=0).astimezone().isoformat()
+
+def plan():
+    return [
+        {"task": "Write", "start": today_at(9), "end": today_at(10)},
+        {"task": "Read", "start": today_at(11), "end": today_at(12)},
+    ]
+
+def fresh(store, calendar_id="primary"):
+    start, end = store.window()
+    store._save_state(calendar_id, "token", start.timestamp(), end.timestamp())
+
+def test_reconcile_inserts_once_and_repeats_are_no_ops(event_store):
+    fresh(event_store)
+    service = RecordingService()
+    first = calendar_manager.reconcile_events(service, plan(), replace=True)
+    assert [r["action"] for r in first] == ["insert", "insert"]
+    assert first[0]["event"]["extendedProperties"]["private"]["ai_task_id"] == calendar_manager.managed_task_id("Write")
+
+    service.calls.clear()
+    second = calendar_manager.reconcile_events(service, plan(), replace=True)
+    assert [r["action"] for r in second] == ["unchanged", "unchanged"]
+    assert service.calls == []
+
+def test_reconcile_patches_moves_and_deletes_what_left_the_plan(event_store):
+    fresh(event_store)
+    legacy = {"id": "old-write", "summary": "AI: Write", "start": {"dateTime": today_at(8)}, "end": {"dateTime": today_at(9)}}
+    duplicate = dict(legacy, id="dup-write")
+    dropped = {"id": "old-gym", "summary": "AI: Gym", "start": {"dateTime": today_at(17)}, "end": {"dateTime": today_at(18)}}
+    meeting = {"id": "meeting", "summary": "Standup", "start": {"dateTime": today_at(10)}, "end": {"dateTime": today_at(11)}}
+    event_store.upsert_events("primary", [legacy, duplicate, dropped, meeting])
+    service = RecordingService()
+
+    results = calendar_manager.reconcile_events(service, plan(), replace=True, now=today_at(7))
+
+    assert [r["action"] for r in results] == ["patch", "insert"]
+    methods = sorted((method, event_id) for method, event_id, _ in service.calls)
+    assert methods == [("delete", "dup-write"), ("delete", "old-gym"), ("insert", None), ("patch", "old-write")]
+    remaining = sorted(e["event"]["id"] for e in event_store.events(["primary"], *calendar_manager.day_bounds()))
+    assert remaining == ["meeting", "new-2", "old-write"]
+
+def test_reconcile_replace_keeps_events_that_already_started(event_store):
+    fresh(event_store)
+    done = {"id": "gym-done", "summary": "AI: Gym", "start": {"dateTime": today_at(7)}, "end": {"dateTime": today_at(8)}}
+    later = {"id": "gym-later", "summary": "AI: Gym", "start": {"dateTime": today_at(17)}, "end": {"dateTime": today_at(18)}}
+    event_store.upsert_events("primary", [done, later])
+    service = RecordingService()
+    afternoon = [{"task": "Write", "start": today_at(14), "end": today_at(15)}]
+    calendar_manager.reconcile_events(service, afternoon, replace=True, now=today_at(12))
+    methods = sorted((method, event_id) for method, event_id, _ in service.calls)
+    assert methods == [("delete", "gym-later"), ("insert", None)]
+
+def test_reconcile_without_replace_keeps_other_managed_events(event_store):
+    fresh(event_store)
+    gym = {"id": "gym", "summary": "AI: Gym", "start": {"dateTime": today_at(17)}, "end": {"dateTime": today_at(18)}}
+    event_store.upsert_events("primary", [gym])
+    service = RecordingService()
+    calendar_manager.reconcile_events(service, plan()[:1])
+    assert [method for method, _, _ in service.calls] == ["insert"]
+
+def test_reconcile_patches_a_changed_category(event_store):
+    fresh(event_store)
+    service = RecordingService()
+    item = dict(plan()[0], category="writing academic papers")
+    calendar_manager.reconcile_events(service, [item])
+    service.calls.clear()
+    results = calendar_manager.reconcile_events(service, [dict(item, category="Personal")])
+    assert [r["action"] for r in results] == ["patch"]
+    assert service.calls[0][2]["extendedProperties"]["private"]["ai_category"] == "Personal"
@@ -0,0 +1,74 @@
+import pytest
+from unittest.mock import MagicMock
+from chunk_summaries import SummaryStore, ChunkSummarizer, pick_local_provider
+from embedding_cache import text_hash
+from federated_search import SearchSource, describe_note
+from rag_agent import RAGAgent
+
+LONG_NOTE = "# Thesis\n" + "Chapter two needs the survey results from March and a rewrite of the method section. " * 8
+
+@pytest.fixture
+def vault(tmp_path):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    (vault / "thesis.md").write_text(LONG_NOTE)
+    (vault / "short.md").write_text("# Short\nBuy limes.")
+    return vault
+
+def make_agent(vault, tmp_path):
+    return RAGAgent(str(vault), db_path=str(tmp_path / "db"), retrieval_mode="lexical")
+
+def fake_provider(calls):
+    def generate(prompt):
+        calls.append(prompt)
+        return "  Chapter two needs March survey results\nand a new method section. "
+    return ("fake/model", generate)
+
+def test_store_reuses_summaries_by_content(tmp_path):
+    store = SummaryStore(str(tmp_path / "summaries.sqlite3"))
+    store.put(text_hash("Some  long text"), "A summary.", "fake/model")
+    hits = [{"document": "Some long text"}, {"document": "Unsummarized passage text"}]
+    assert store.snippets(hits, snippet_chars=11) == ["A summary.", "Unsummarize"]
+
+def test_background_pass_summarizes_long_chunks_once(vault, tmp_path):
+    agent = make_agent(vault, tmp_path)
+    agent.index_vault()
+    calls = []
+    summarizer = ChunkSummarizer([SearchSource("markdown_notes", "Notes", make_agent(vault, tmp_path), describe_note)],
+                                 db_path=str(tmp_path / "db"), provider=fake_provider(calls))
+
+    assert summarizer.run_pending() == 1  # short.md is used as it is
+    assert summarizer.run_pending() == 0
+    assert len(calls) == 1
+
+    context = agent.query_context("survey results method")
+    assert "Chapter two needs March survey results and a new method section." in context
+
+    # Edited text gets a new summary; a restarted job does not redo finished ones
+    (vault / "thesis.md").write_text(LONG_NOTE + "Also add the appendix.")
+    agent.index_file(str(vault / "thesis.md"))
+    agent._flush()
+    assert summarizer.run_pending() == 1
+    restarted = ChunkSummarizer(summarizer.sources, db_path=str(tmp_path / "db"), provider=fake_provider(calls))
+    assert restarted.run_pending() == 0
+    assert len(calls) == 2
+
+def test_failures_keep_chunks_pending(vault, tmp_path):
+    make_agent(vault, tmp_path).index_vault()
+    broken = MagicMock(side_effect=ConnectionError("ollama went away"))
+    summarizer = ChunkSummarizer([SearchSource("markdown_notes", "Notes", make_agent(vault, tmp_path), describe_note)],
+                                 db_path=str(tmp_path / "db"), provider=("fake/model", broken))
+    assert summarizer.run_pending() == 0
+    assert summarizer.stats["failed"] == 1
+    assert len(summarizer.pending) == 1
+
+def test_only_local_providers_are_used():
+    monitor = MagicMock(ollama_host="http://localhost:11434", openclaw_endpoint="https://api.openclaw.ai/v1")
+    monitor.check_ollama.return_value = False
+    assert pick_local_provider(monitor) is None
+
+    monitor.openclaw_endpoint = "http://127.0.0.1:8080/v1"
+    assert pick_local_provider(monitor)[0].startswith("openclaw/")
+
+    monitor.check_ollama.return_value = True
+    assert pick_local_provider(monitor)[0].startswith("ollama/")
@@ -0,0 +1,56 @@
+import pytest
+from unittest.mock import patch
+from embedding_cache import CachedEmbeddingFunction, EmbeddingCache, text_hash
+from rag_agent import RAGAgent
+
+class FakeModel:
+    """Deterministic stand-in for the sentence-transformers model."""
+    def __init__(self):
+        self.calls = 0
+        self.texts = 0
+
+    def __call__(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        return [[float(len(t)), float(t.count("a")), 1.0] for t in texts]
+
+def test_text_hash_ignores_whitespace_differences():
+    assert text_hash("Chapter  1\n\nIntro") == text_hash("Chapter 1 Intro")
+    assert text_hash("Chapter 1") != text_hash("Chapter 2")
+
+def test_cached_embeddings_survive_restart(tmp_path):
+    cache_path = str(tmp_path / "emb.sqlite3")
+    model = FakeModel()
+    fn = CachedEmbeddingFunction(cache_path=cache_path, base_fn=model)
+    first = fn(["alpha page", "beta page", "alpha page"])
+    assert model.texts == 2  # duplicate text embedded once
+
+    restarted_model = FakeModel()
+    restarted = CachedEmbeddingFunction(cache_path=cache_path, base_fn=restarted_model)
+    second = restarted(["alpha  page", "beta page"])
+    assert restarted_model.calls == 0
+    assert second == [first[0], first[1]]
+
+def test_cache_is_keyed_by_model_version(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite3"))
+    cache.put_many("all-MiniLM-L6-v2", "v1", [("h1", [0.5, 0.25])])
+    assert cache.get_many("all-MiniLM-L6-v2", "v1", ["h1"]) == {"h1": [0.5, 0.25]}
+    assert cache.get_many("all-MiniLM-L6-v2", "v2", ["h1"]) == {}
+
+def test_rag_agent_rebuild_uses_cache(tmp_path):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    (vault / "a.md").write_text("WineDragons wireframes")
+    (vault / "b.md").write_text("Thai lessons")
+    model = FakeModel()
+    fn = CachedEmbeddingFunction(cache_path=str(tmp_path / "emb.sqlite3"), base_fn=model)
+
+    with patch("rag_agent.get_embedding_function", return_value=fn):
+        RAGAgent(str(vault), db_path=str(tmp_path / "db1"), retrieval_mode="hybrid").index_vault()
+        embedded = model.texts
+        # A full rebuild into a fresh vector_db only reads vectors from the cache
+        agent = RAGAgent(str(vault), db_path=str(tmp_path / "db2"), retrieval_mode="hybrid")
+        agent.index_vault()
+        assert model.texts == embedded
+        assert agent.collection.count() == 2
+        assert "a.md" in agent.query_context("WineDragons wireframes", n_results=1)
@@ -0,0 +1,105 @@
+import datetime
+from unittest.mock import MagicMock, patch
+from googleapiclient.errors import HttpError
+import calendar_manager
+from event_store import CalendarEventStore, unique_calendars
+
+def at(hour, days=0):
+    day = datetime.datetime.now().replace(hour=hour, minute=0, second=0, microsecond=0) + datetime.timedelta(days=days)
+    return day.astimezone().isoformat()
+
+def event(event_id, summary, hour, days=0, status="confirmed"):
+    return {"id": event_id, "status": status, "summary": summary,
+            "start": {"dateTime": at(hour, days)}, "end": {"dateTime": at(hour + 1, days)}}
+
+class FakeCalendar:
+    """events().list() over per-calendar event lists, with sync tokens and pagination (2 items per page)."""
+    def __init__(self, events):
+        self.events_by_calendar = events
+        self.changes = {}
+        self.calls = []
+        self.expired = False
+
+    def events(self):
+        api = MagicMock()
+        api.list.side_effect = self.list
+        return api
+
+    def list(self, calendarId, pageToken=None, syncToken=None, **params):
+        self.calls.append(dict(params, calendarId=calendarId, pageToken=pageToken, syncToken=syncToken))
+        request = MagicMock()
+        if syncToken and self.expired:
+            request.execute.side_effect = HttpError(MagicMock(status=410), b'{"error": {"message": "Gone"}}')
+            return request
+        items = self.changes.pop(calendarId, []) if syncToken else self.events_by_calendar.get(calendarId, [])
+        start = int(pageToken or 0)
+        response = {"items": items[start:start + 2]}
+        if start + 2 < len(items):
+            response["nextPageToken"] = str(start + 2)
+        else:
+            response["nextSyncToken"] = f"token-{len(self.calls)}"
+        request.execute.return_value = response
+        return request
+
+def make_store(tmp_path):
+    return CalendarEventStore(str(tmp_path / "calendar_events.sqlite3"), past_days=1, future_days=7)
+
+def test_first_sync_lists_the_window_then_only_changes(tmp_path):
+    store = make_store(tmp_path)
+    service = FakeCalendar({"primary": [event("a", "Standup", 9), event("b", "AI: Write", 10), event("c", "Lunch", 12)]})
+    assert store.sync(service, ["primary"]) == 3
+    assert len(service.calls) == 2  # two pages
+    assert service.calls[0]["timeMin"] and service.calls[0]["syncToken"] is None
+
+    service.calls.clear()
+    service.changes["primary"] = [event("b", "AI: Write more", 11), {"id": "c", "status": "cancelled"}]
+    assert store.sync(service, ["primary"]) == 2
+    assert service.calls[0]["syncToken"] == "token-2"
+    assert "timeMin" not in service.calls[0]
+
+    start, end = store.window()
+    events = store.events(["primary"], start.timestamp(), end.timestamp())
+    assert [(e["event"]["id"], e["summary"]) for e in events] == [("a", "Standup"), ("b", "AI: Write more")]
+    assert store.stats == {"full_syncs": 1, "incremental_syncs": 1, "changes": 5}
+
+def test_expired_sync_token_triggers_a_full_resync(tmp_path):
+    store = make_store(tmp_path)
+    service = FakeCalendar({"primary": [event("a", "Standup", 9)]})
+    store.sync(service, ["primary"])
+    service.events_by_calendar["primary"] = [event("z", "Review", 15)]
+    service.expired = True
+    store.sync(service, ["primary"])
+    start, end = store.window()
+    assert [e["event"]["id"] for e in store.events(["primary"], start.timestamp(), end.timestamp())] == ["z"]
+    assert store.stats["full_syncs"] == 2
+
+def test_a_moved_window_resyncs_and_a_fresh_store_does_not(tmp_path):
+    store = make_store(tmp_path)
+    service = FakeCalendar({"primary": []})
+    store.sync(service, ["primary"])
+    assert store.is_fresh(["primary"], max_age=60)
+    assert not store.is_fresh(["primary", "work"], max_age=60)
+    store.future_days = 14
+    assert not store.is_fresh(["primary"], max_age=60)
+    store.sync(service, ["primary"])
+    assert store.stats["full_syncs"] == 2
+
+def test_calendar_ids_are_synced_once():
+    assert unique_calendars(["primary", "primary", "work"]) == ["primary", "work"]
+    assert unique_calendars("primary") == ["primary"]
+
+def test_reads_come_from_the_store(tmp_path):
+    store = make_store(tmp_path)
+    service = FakeCalendar({
+        "primary": [event("a", "Standup", 9), event("b", "AI: Deep work", 13), event("t", "Tomorrow", 9, days=1)],
+        "work": [event("w", "Planning", 15)],
+    })
+    with patch("calendar_manager.get_event_store", return_value=store):
+        slots = calendar_manager.get_busy_slots(service, calendar_ids=["primary", "work", "primary"])
+        managed = calendar_manager.get_managed_events(service, calendar_id="primary")
+    assert [s["summary"] for s in slots] == ["Standup", "AI: Deep work", "Planning"]
+    assert slots[-1]["source_calendar"] == "work"
+    assert [m["task"] for m in managed] == ["Deep work"]
+    # Both calendars were listed once; the second read was served locally
+    assert sorted({c["calendarId"] for c in service.calls}) == ["primary", "work"]
+    assert len(service.calls) == 3
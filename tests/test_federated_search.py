@@ -0,0 +1,97 @@
+import time
+import threading
+import pytest
+from unittest.mock import MagicMock
+from federated_search import FederatedSearch, SearchSource, describe_note, describe_book, parse_quotas, get_federated_search
+from book_agent import BookAgent
+from rag_agent import RAGAgent
+
+def fake_source(name, hits, delay=0.0):
+    agent = MagicMock()
+    agent.lexical_index.count.return_value = len(hits)
+    agent.is_empty.return_value = not hits
+
+    def retrieve(query, n_results):
+        time.sleep(delay)
+        return [dict(h) for h in hits][:n_results]
+    agent.retrieve.side_effect = retrieve
+    describe = describe_book if name == "book_library" else describe_note
+    return SearchSource(name, name.title(), agent, describe)
+
+def hit(doc_id, score, **meta):
+    return {"id": doc_id, "document": f"text of {doc_id}", "metadata": meta, "score": score}
+
+def test_parse_quotas():
+    assert parse_quotas("markdown_notes=3, book_library=2") == {"markdown_notes": 3, "book_library": 2}
+    assert parse_quotas("") == {}
+
+def test_merge_respects_quotas_and_keeps_every_source():
+    notes = fake_source("markdown_notes", [hit(f"n{i}", 1.0 - i * 0.1) for i in range(5)])
+    books = fake_source("book_library", [hit("b0", 0.3), hit("b1", 0.2)])
+    search = FederatedSearch([notes, books], quotas={"markdown_notes": 3})
+
+    hits = search.search("thai", n_results=4)
+    assert [h["id"] for h in hits] == ["n0", "n1", "n2", "b0"]
+    assert {h["source"] for h in hits} == {"markdown_notes", "book_library"}
+
+def test_sources_run_in_parallel_and_slow_ones_are_dropped():
+    fast = fake_source("markdown_notes", [hit("n0", 1.0)], delay=0.2)
+    also_fast = fake_source("book_library", [hit("b0", 1.0)], delay=0.2)
+    started = time.time()
+    assert len(FederatedSearch([fast, also_fast], quotas={}).search("q")) == 2
+    assert time.time() - started < 0.35
+
+    slow = fake_source("slow_source", [hit("s0", 1.0)], delay=1.0)
+    hits = FederatedSearch([fake_source("markdown_notes", [hit("n0", 0.5)]), slow], quotas={}, timeout=0.3).search("q")
+    assert [h["id"] for h in hits] == ["n0"]
+
+def test_multiple_queries_keep_best_score_per_passage():
+    source = fake_source("markdown_notes", [hit("n0", 0.4), hit("n1", 0.2)])
+    source.agent.retrieve.side_effect = lambda query, n_results: (
+        [hit("n0", 0.4)] if query == "a" else [hit("n0", 0.9), hit("n1", 0.2)]
+    )
+    hits = FederatedSearch([source], quotas={}).search(["a", "b"])
+    assert [(h["id"], h["score"]) for h in hits] == [("n0", 0.9), ("n1", 0.2)]
+
+def test_reloads_wait_for_a_running_query():
+    source = fake_source("markdown_notes", [hit("n0", 1.0)], delay=0.2)
+    events = []
+    source.agent.lexical_index.refresh.side_effect = lambda: events.append("refresh")
+    source.agent.retrieve.side_effect = lambda query, n_results: (
+        events.append("query"), time.sleep(0.2), events.append("done"), [hit("n0", 1.0)])[-1]
+    worker = threading.Thread(target=source.search, args=("q", 1))
+    worker.start()
+    time.sleep(0.05)
+    source.sync()
+    worker.join()
+    assert events == ["refresh", "query", "done", "refresh"]
+
+def test_context_block_over_real_indexes(tmp_path):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    (vault / "thai.md").write_text("# Thai\nPractice Thai tones with the classifier drills.")
+    (vault / "groceries.md").write_text("# Groceries\nBuy rice and limes.")
+    db = str(tmp_path / "db")
+    RAGAgent(str(vault), db_path=db, retrieval_mode="lexical").index_vault()
+    books = BookAgent(books_dir=str(tmp_path), db_path=db, retrieval_mode="lexical")
+    books._upsert("Thai Grammar.pdf_p3", "Thai tones: mid, low, falling, high and rising.",
+                  {"path": "Thai Grammar.pdf", "page": 3, "book": "Thai Grammar.pdf"})
+    books._flush()
+
+    search = FederatedSearch([
+        SearchSource("markdown_notes", "Notes", RAGAgent(str(vault), db_path=db, retrieval_mode="lexical"), describe_note),
+        SearchSource("book_library", "Books", BookAgent(books_dir=str(tmp_path), db_path=db, retrieval_mode="lexical"), describe_book),
+    ], quotas={})
+    context = search.context("thai tones", n_results=2)
+    assert "[Notes] From 'thai.md'" in context
+    assert "[Books] From 'Thai Grammar.pdf' (Page 3)" in context
+
+    # A note indexed later (e.g. by the background indexer) is picked up by the long-lived agents
+    (vault / "tones.md").write_text("# Tones\nThai tones drill schedule for the week.")
+    RAGAgent(str(vault), db_path=db, retrieval_mode="lexical").index_vault()
+    assert "tones.md" in search.context("drill schedule", n_results=2)
+
+def test_get_federated_search_is_shared(tmp_path):
+    first = get_federated_search(str(tmp_path), None, books_dir=str(tmp_path), db_path=str(tmp_path / "db"))
+    assert first is get_federated_search(str(tmp_path), None, books_dir=str(tmp_path), db_path=str(tmp_path / "db"))
+    assert [s.name for s in first.sources] == ["markdown_notes", "book_library"]
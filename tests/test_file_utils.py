@@ -0,0 +1,38 @@
+import os
+import threading
+import pytest
+from file_utils import write_atomic
+
+def test_concurrent_writers_each_get_their_own_temp_file(tmp_path):
+    path = str(tmp_path / "state.json")
+    errors = []
+
+    def write(n):
+        try:
+            for _ in range(50):
+                write_atomic(path, lambda f: f.write(str(n) * 1000))
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert errors == []
+    with open(path) as f:
+        content = f.read()
+    # One writer's whole content, never a mix
+    assert len(set(content)) == 1 and len(content) == 1000
+    assert os.listdir(tmp_path) == ["state.json"]
+
+def test_failed_write_leaves_the_file_and_no_temp_file(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text("old")
+    def fail(f):
+        f.write("half")
+        raise ValueError("boom")
+    with pytest.raises(ValueError):
+        write_atomic(str(path), fail)
+    assert path.read_text() == "old"
+    assert os.listdir(tmp_path) == ["state.json"]
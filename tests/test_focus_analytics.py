@@ -0,0 +1,97 @@
+import datetime
+import threading
+from unittest.mock import MagicMock
+from focus_analytics import FocusStore, event_category, week_of, refresh_focus_analytics
+from event_store import CalendarEventStore
+
+def at(day, hour):
+    return datetime.datetime.combine(day, datetime.time(hour)).astimezone()
+
+def managed(event_id, task, day, hour, hours=1, category=None):
+    event = {"id": event_id, "summary": f"AI: {task}",
+             "start": {"dateTime": at(day, hour).isoformat()},
+             "end": {"dateTime": (at(day, hour) + datetime.timedelta(hours=hours)).isoformat()}}
+    if category:
+        event["extendedProperties"] = {"private": {"ai_category": category}}
+    return event
+
+def bounds(first, last):
+    return at(first, 0).timestamp(), at(last + datetime.timedelta(days=1), 0).timestamp()
+
+def test_event_category_prefers_the_stored_category():
+    assert event_category({"summary": "AI: Dev sprint", "extendedProperties": {"private": {"ai_category": "budgeting app"}}}) == "budgeting app"
+    assert event_category({"summary": "AI: Writing chapter 3"}) == "Writing"
+    assert event_category({"summary": "AI: Groceries"}) == "General"
+
+def test_rollups_follow_added_moved_and_removed_sessions(tmp_path):
+    store = FocusStore(str(tmp_path / "focus.sqlite3"))
+    monday = datetime.date(2026, 10, 19)
+    tuesday = monday + datetime.timedelta(days=1)
+    events = [
+        managed("a", "Draft paper", monday, 9, 2, "writing academic papers"),
+        managed("b", "Thai lesson", monday, 14, 1, "learning Thai"),
+        managed("c", "Revise paper", tuesday, 9, 1.5, "writing academic papers"),
+    ]
+    assert store.sync("primary", events, *bounds(monday, tuesday)) == 3
+    assert store.sync("primary", events, *bounds(monday, tuesday)) == 0
+    assert store.day(monday) == {"learning Thai": 1.0, "writing academic papers": 2.0}
+    assert store.week(monday) == {"learning Thai": 1.0, "writing academic papers": 3.5}
+
+    # The lesson moves to Tuesday and gets longer, the revision is cancelled
+    events = [events[0], managed("b", "Thai lesson", tuesday, 10, 2, "learning Thai")]
+    store.sync("primary", events, *bounds(monday, tuesday))
+    assert store.day(monday) == {"writing academic papers": 2.0}
+    assert store.day(tuesday) == {"learning Thai": 2.0}
+    assert store.week(tuesday) == {"learning Thai": 2.0, "writing academic papers": 2.0}
+    assert store.month(2026, 10) == store.week(monday)
+    assert store.hours("2026-11-01", "2026-11-30") == {}
+
+def test_history_outside_the_synced_range_is_kept(tmp_path):
+    store = FocusStore(str(tmp_path / "focus.sqlite3"))
+    today = datetime.date.today()
+    last_week = today - datetime.timedelta(weeks=1)
+    store.sync("primary", [managed("old", "Dev sprint", last_week, 9)], *bounds(last_week, last_week))
+    store.sync("primary", [managed("new", "Dev review", today, 9)], *bounds(today, today))
+    trend = store.trend(periods=2, by="week")
+    assert trend == [(week_of(last_week), "Dev", 1.0), (week_of(today), "Dev", 1.0)]
+
+def test_refresh_reads_the_local_event_store(tmp_path):
+    events = CalendarEventStore(str(tmp_path / "events.sqlite3"), past_days=1, future_days=1)
+    today = datetime.date.today()
+    events.upsert_events("primary", [
+        managed("a", "Dev sprint", today, 9, 1, "budgeting app"),
+        {"id": "m", "summary": "Standup", "start": {"dateTime": at(today, 10).isoformat()},
+         "end": {"dateTime": at(today, 11).isoformat()}},
+    ])
+    focus = FocusStore(str(tmp_path / "focus.sqlite3"))
+    assert refresh_focus_analytics("primary", event_store=events, focus_store=focus) == 1
+    assert focus.day() == {"budgeting app": 1.0}
+
+def test_refresh_syncs_a_stale_store_when_given_a_service(tmp_path):
+    events = CalendarEventStore(str(tmp_path / "events.sqlite3"), past_days=1, future_days=1)
+    today = datetime.date.today()
+    service = MagicMock()
+    service.events().list().execute.return_value = {"items": [managed("a", "Dev sprint", today, 9, 1, "budgeting app")],
+                                                    "nextSyncToken": "token"}
+    focus = FocusStore(str(tmp_path / "focus.sqlite3"))
+    # Without a service nothing is fetched (the background sync keeps the store current)
+    assert refresh_focus_analytics("primary", event_store=events, focus_store=focus) == 0
+    assert refresh_focus_analytics("primary", event_store=events, focus_store=focus, service=service) == 1
+    assert focus.day() == {"budgeting app": 1.0}
+    # Fresh now: no further API call
+    service.events().list.reset_mock()
+    refresh_focus_analytics("primary", event_store=events, focus_store=focus, service=service)
+    service.events().list.assert_not_called()
+
+def test_processes_syncing_the_same_range_count_sessions_once(tmp_path):
+    # Two stores on one file stand in for the bot and the dashboard
+    stores = [FocusStore(str(tmp_path / "focus.sqlite3")) for _ in range(2)]
+    monday = datetime.date(2026, 10, 19)
+    events = [managed(f"e{i}", "Dev sprint", monday, 8 + i, 1, "budgeting app") for i in range(8)]
+    workers = [threading.Thread(target=store.sync, args=("primary", events, *bounds(monday, monday))) for store in stores * 3]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert stores[0].day(monday) == {"budgeting app": 8.0}
+    assert stores[1].week(monday) == {"budgeting app": 8.0}
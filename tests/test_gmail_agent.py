@@ -2,20 +2,14 @@ import pytest
 from unittest.mock import MagicMock, patch
 import gmail_agent
 
-@patch('gmail_agent.os.path.exists')
-@patch('gmail_agent.Credentials.from_authorized_user_file')
-@patch('gmail_agent.build')
-def test_get_gmail_service(mock_build, mock_creds, mock_exists):
-    mock_exists.return_value = True
-    mock_creds.return_value = MagicMock(valid=True)
-    
+@patch('gmail_agent.get_service')
+def test_get_gmail_service(mock_get_service):
     service = gmail_agent.get_gmail_service()
-    
-    assert service is not None
-    mock_build.assert_called_with('gmail', 'v1', credentials=mock_creds.return_value)
 
-@patch('gmail_agent.build')
-def test_get_snoozed_emails(mock_build):
+    assert service is mock_get_service.return_value
+    mock_get_service.assert_called_with('gmail', 'v1')
+
+def test_get_snoozed_emails():
     mock_service = MagicMock()
     mock_service.users().messages().list().execute.return_value = {
         'messages': [{'id': '123'}]
@@ -38,8 +32,7 @@ def test_get_snoozed_emails(mock_build):
     assert emails[0]['from'] == 'test@example.com'
     assert emails[0]['type'] == 'snoozed'
 
-@patch('gmail_agent.build')
-def test_get_filtered_emails(mock_build):
+def test_get_filtered_emails():
     mock_service = MagicMock()
     mock_service.users().messages().list().execute.return_value = {
         'messages': [{'id': '456'}]
@@ -0,0 +1,66 @@
+import os
+import json
+import datetime
+import pytest
+from unittest.mock import patch
+from google.oauth2.credentials import Credentials
+from google_clients import GoogleClientManager
+
+def write_token(path, token="ya29.first", minutes=60):
+    expiry = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=minutes)
+    path.write_text(json.dumps({
+        "token": token, "refresh_token": "1//refresh", "client_id": "id.apps.googleusercontent.com",
+        "client_secret": "secret", "expiry": expiry.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+    }))
+
+@pytest.fixture
+def manager(tmp_path):
+    write_token(tmp_path / "token.json")
+    manager = GoogleClientManager(str(tmp_path / "token.json"), str(tmp_path / "credentials.json"),
+                                  cache_dir=str(tmp_path / "discovery"))
+    yield manager
+    manager.close()
+
+def test_services_are_built_once_from_the_bundled_discovery_doc(manager):
+    with patch("google_clients.requests.get", side_effect=AssertionError("no discovery fetch")):
+        calendar = manager.service("calendar", "v3")
+        assert manager.service("calendar", "v3") is calendar
+        assert manager.service("gmail", "v1") is not None
+    assert manager.stats == {"loads": 1, "refreshes": 0, "builds": 2}
+
+    # Each request gets its own connection, so the shared service is thread-safe
+    first = calendar.events().list(calendarId="primary")
+    second = calendar.events().list(calendarId="primary")
+    assert first.http is not second.http
+    assert first.http.credentials is manager.creds
+
+def test_refresh_happens_ahead_of_expiry(tmp_path):
+    write_token(tmp_path / "token.json", minutes=2)
+    manager = GoogleClientManager(str(tmp_path / "token.json"), refresh_margin=300)
+
+    def refresh(creds, request):
+        creds.token = "ya29.refreshed"
+        creds.expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+
+    try:
+        with patch.object(Credentials, "refresh", refresh):
+            assert manager.credentials().token == "ya29.refreshed"
+            assert manager.credentials().token == "ya29.refreshed"
+        assert manager.stats["refreshes"] == 1
+        assert json.loads((tmp_path / "token.json").read_text())["token"] == "ya29.refreshed"
+        # The next refresh is already scheduled before the new token expires
+        assert manager.timer is not None and manager.timer.interval > 3000
+    finally:
+        manager.close()
+
+def test_token_rewritten_by_another_process_is_picked_up(manager, tmp_path):
+    calendar = manager.service("calendar", "v3")
+    write_token(tmp_path / "token.json", token="ya29.other-process")
+    os.utime(tmp_path / "token.json", (1, 1))
+    assert manager.credentials().token == "ya29.other-process"
+    assert manager.service("calendar", "v3") is calendar
+
+def test_missing_authorization(tmp_path, capsys):
+    manager = GoogleClientManager(str(tmp_path / "token.json"), str(tmp_path / "credentials.json"))
+    assert manager.service("calendar", "v3") is None
+    assert "credentials.json' not found" in capsys.readouterr().out
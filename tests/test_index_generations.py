@@ -0,0 +1,109 @@
+import os
+import time
+import pytest
+from unittest.mock import patch, MagicMock
+from index_generations import CollectionPointer, physical_name, collect_garbage
+from rag_agent import RAGAgent
+from book_agent import BookAgent
+
+@pytest.fixture
+def vault(tmp_path):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    (vault / "thai.md").write_text("# Thai\nPractice tones every day.")
+    return vault
+
+def make_agent(vault, tmp_path, **kwargs):
+    return RAGAgent(str(vault), db_path=str(tmp_path / "db"), retrieval_mode="lexical", **kwargs)
+
+def test_physical_name():
+    assert physical_name("markdown_notes", 0) == "markdown_notes"
+    assert physical_name("markdown_notes", 3) == "markdown_notes__v3"
+
+def test_pointer_swap_and_collect(tmp_path):
+    pointer = CollectionPointer(str(tmp_path))
+    assert pointer.current("markdown_notes") == 0
+    generation = pointer.next_generation("markdown_notes")
+    assert generation == 1
+    assert pointer.swap("markdown_notes", generation) == 0
+
+    # Another process sees the switch
+    assert CollectionPointer(str(tmp_path)).current("markdown_notes") == 1
+    assert pointer.collect("markdown_notes", grace_seconds=60) == []
+    assert pointer.collect("markdown_notes", grace_seconds=0) == [0]
+
+def test_crashed_build_is_collected(tmp_path):
+    pointer = CollectionPointer(str(tmp_path))
+    pointer.next_generation("book_library")  # never swapped or abandoned
+    assert pointer.next_generation("book_library") == 2
+    assert pointer.collect("book_library", grace_seconds=60) == [1]
+
+def test_rebuild_swaps_atomically(vault, tmp_path):
+    live = make_agent(vault, tmp_path)
+    live.index_vault()
+    assert live.generation == 1
+    assert "thai.md" in live.query_context("tones")
+
+    (vault / "thai.md").unlink()
+    (vault / "cooking.md").write_text("# Cooking\nGreen curry with basil.")
+
+    original_index_all = RAGAgent._index_all
+    def index_all_and_query(shadow):
+        original_index_all(shadow)
+        # Mid-rebuild, live queries still see the complete previous generation
+        assert "thai.md" in live.query_context("tones")
+        assert "cooking.md" not in live.query_context("curry basil")
+
+    with patch.object(RAGAgent, "_index_all", index_all_and_query):
+        make_agent(vault, tmp_path).index_vault()
+
+    assert "cooking.md" in live.query_context("curry basil")
+    assert live.generation == 2
+    assert "thai.md" not in live.query_context("tones")
+
+    # Replaced generations are dropped once past the grace period
+    db = tmp_path / "db"
+    assert (db / "markdown_notes__v1_bm25.json").exists()
+    assert collect_garbage(RAGAgent, str(db), grace_seconds=0) == [0, 1]
+    assert not (db / "markdown_notes__v1_bm25.json").exists()
+
+def test_replaced_generation_is_dropped_after_the_grace_period(vault, tmp_path):
+    make_agent(vault, tmp_path).index_vault()
+    timers = MagicMock()
+    with patch("index_generations.threading.Timer", timers):
+        make_agent(vault, tmp_path).index_vault()
+    db = tmp_path / "db"
+    # Still inside the grace period right after the swap
+    assert (db / "markdown_notes__v1_bm25.json").exists()
+
+    delay, collect = timers.call_args[0]
+    assert delay > 60
+    with patch("index_generations.time.time", return_value=time.time() + delay):
+        collect()
+    assert not (db / "markdown_notes__v1_bm25.json").exists()
+    assert (db / "markdown_notes__v2_bm25.json").exists()
+
+def test_failed_rebuild_keeps_live_index(vault, tmp_path):
+    live = make_agent(vault, tmp_path)
+    live.index_vault()
+
+    with patch.object(RAGAgent, "_index_all", side_effect=RuntimeError("disk full")):
+        with pytest.raises(RuntimeError):
+            make_agent(vault, tmp_path).index_vault()
+
+    assert live.generation == 1
+    assert "thai.md" in live.query_context("tones")
+    assert not os.path.exists(tmp_path / "db" / "markdown_notes__v2_bm25.json")
+
+def test_book_library_force_reindex_uses_a_new_generation(tmp_path, write_pdf):
+    books = tmp_path / "books"
+    books.mkdir()
+    write_pdf(books / "Thai Grammar.pdf", [f"Page {i} explains Thai tones and the classifier system in detail" for i in range(3)])
+
+    agent = BookAgent(books_dir=str(books), db_path=str(tmp_path / "db"), retrieval_mode="lexical")
+    agent.index_library(workers=0)
+    assert agent.generation == 0
+    assert agent.index_library(workers=0, force=True) == ["Successfully indexed 3 sections from 'Thai Grammar.pdf'."]
+    assert agent.generation == 1
+    assert agent.manifests.directory.endswith("book_manifests__v1")
+    assert "Thai Grammar.pdf" in agent.search_books("classifier")
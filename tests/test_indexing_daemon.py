@@ -0,0 +1,109 @@
+import os
+import time
+import pytest
+from unittest.mock import MagicMock
+from rag_agent import RAGAgent
+from indexing_daemon import BackgroundIndexer, IndexingEventHandler, PRIORITY_BACKFILL
+
+@pytest.fixture
+def vault(tmp_path):
+    d = tmp_path / "vault"
+    d.mkdir()
+    (d / "project.md").write_text("WineDragons wireframes review")
+    (d / "daily_note.md").write_text("## Tasks\n- [ ] Call the printer")
+    return d
+
+def make_indexer(vault, tmp_path):
+    agent = RAGAgent(str(vault), db_path=str(tmp_path / "db"), retrieval_mode="lexical")
+    return BackgroundIndexer(agent, duty_cycle=1.0, max_files_per_second=1000, settle_seconds=0, flush_interval=0.05)
+
+def test_queue_orders_by_priority_and_dedupes(vault, tmp_path):
+    indexer = make_indexer(vault, tmp_path)
+    indexer.running = True
+    indexer.enqueue(str(vault / "project.md"), priority=PRIORITY_BACKFILL)
+    indexer.enqueue(str(vault / "project.md"), priority=PRIORITY_BACKFILL)
+    indexer.enqueue(str(vault / "daily_note.md"))
+    assert indexer.queue_size() == 2
+
+    first, _ = indexer._next(timeout=0.1)
+    assert os.path.basename(first) == "daily_note.md"
+    second, _ = indexer._next(timeout=0.1)
+    assert os.path.basename(second) == "project.md"
+    assert indexer._next(timeout=0.01) is None
+
+def test_enqueue_vault_only_queues_stale_notes(vault, tmp_path):
+    indexer = make_indexer(vault, tmp_path)
+    assert indexer.enqueue_vault() == 2
+
+    indexer.rag_agent.index_vault()
+    fresh = make_indexer(vault, tmp_path)
+    assert fresh.enqueue_vault() == 0
+
+def test_worker_indexes_and_removes_in_background(vault, tmp_path):
+    indexer = make_indexer(vault, tmp_path)
+    indexer.start()
+    try:
+        indexer.enqueue(str(vault / "project.md"))
+        deadline = time.time() + 5
+        while indexer.rag_agent.lexical_index.count() < 1 and time.time() < deadline:
+            time.sleep(0.02)
+        assert indexer.rag_agent.lexical_index.get("project.md")
+
+        os.remove(vault / "project.md")
+        handler = IndexingEventHandler(indexer)
+        handler.on_deleted(MagicMock(src_path=str(vault / "project.md")))
+        deadline = time.time() + 5
+        while indexer.rag_agent.lexical_index.get("project.md") and time.time() < deadline:
+            time.sleep(0.02)
+        assert indexer.rag_agent.lexical_index.get("project.md") is None
+    finally:
+        indexer.stop()
+    assert indexer.stats["indexed"] == 1
+    assert indexer.stats["removed"] == 1
+
+def test_task_links_refresh_when_queue_drains(vault, tmp_path):
+    indexer = make_indexer(vault, tmp_path)
+    indexer.task_linker = MagicMock()
+    indexer.task_linker.refresh.return_value = 2
+    indexer.start()
+    try:
+        indexer.enqueue(str(vault / "project.md"))
+        deadline = time.time() + 5
+        while not indexer.task_linker.refresh.called and time.time() < deadline:
+            time.sleep(0.02)
+        assert indexer.rag_agent.lexical_index.get("project.md")
+        assert indexer.stats["links"] >= 2
+    finally:
+        indexer.stop()
+
+def test_slow_summaries_do_not_hold_up_indexing(vault, tmp_path):
+    indexer = make_indexer(vault, tmp_path)
+    indexer.summarizer = MagicMock()
+    indexer.summarizer.run_pending.side_effect = lambda: time.sleep(1.0) or 1
+    indexer.start()
+    try:
+        deadline = time.time() + 5
+        while not indexer.summarizer.run_pending.called and time.time() < deadline:
+            time.sleep(0.02)
+        # A summary pass is running; a new edit is indexed right away anyway
+        indexer.enqueue(str(vault / "project.md"))
+        deadline = time.time() + 0.5
+        while not indexer.rag_agent.lexical_index.get("project.md") and time.time() < deadline:
+            time.sleep(0.02)
+        assert indexer.rag_agent.lexical_index.get("project.md")
+    finally:
+        indexer.stop()
+
+def test_wait_until_drained_covers_what_was_queued(vault, tmp_path):
+    indexer = make_indexer(vault, tmp_path)
+    indexer.start()
+    try:
+        assert indexer.enqueue_vault() == 2
+        assert indexer.wait_until_drained(5)
+        # Drained means saved too: a fresh agent sees both notes
+        fresh = RAGAgent(str(vault), db_path=str(tmp_path / "db"), retrieval_mode="lexical")
+        assert fresh.lexical_index.count() == 2
+        indexer.enqueue(str(vault / "project.md"), priority=PRIORITY_BACKFILL)
+        assert not indexer.drained.is_set()
+    finally:
+        indexer.stop()
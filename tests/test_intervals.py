@@ -0,0 +1,71 @@
+import datetime
+from unittest.mock import patch
+from intervals import IntervalSet, merge, to_intervals, free_windows, describe_calendar, find_conflicts, planning_dates
+
+def local(hour, minute=0, day=19):
+    return datetime.datetime(2026, 10, day, hour, minute).astimezone()
+
+def slot(start, end):
+    return {"start": start.isoformat(), "end": end.isoformat()}
+
+def test_merge_joins_overlapping_and_touching_intervals():
+    merged = merge([(local(9), local(10)), (local(13), local(14)), (local(9, 30), local(11)), (local(11), local(12))])
+    assert merged == [(local(9), local(12)), (local(13), local(14))]
+
+def test_intervals_from_different_timezones_are_comparable():
+    utc = datetime.timezone.utc
+    plus2 = datetime.timezone(datetime.timedelta(hours=2))
+    pairs = to_intervals([
+        {"start": "2026-10-19T10:00:00+02:00", "end": "2026-10-19T11:00:00+02:00"},
+        {"start": "2026-10-19T08:30:00Z", "end": "2026-10-19T08:45:00Z"},
+        {"summary": "Stored without times"},
+    ])
+    assert merge(pairs) == [(datetime.datetime(2026, 10, 19, 8, 0, tzinfo=utc), datetime.datetime(2026, 10, 19, 11, 0, tzinfo=plus2))]
+
+def test_conflicts_and_add_keep_the_set_merged():
+    busy = IntervalSet([(local(9), local(10)), (local(12), local(13)), (local(15), local(16))])
+    assert busy.conflicts(local(9, 30), local(12, 30)) == [(local(9), local(10)), (local(12), local(13))]
+    assert busy.overlaps(local(9, 30), local(9, 45))
+    assert not busy.overlaps(local(10), local(12))
+    assert not busy.overlaps(local(8), local(9))
+
+    busy.add(local(10), local(12, 30))
+    assert list(busy) == [(local(9), local(13)), (local(15), local(16))]
+    busy.add(local(7), local(8))
+    busy.add(local(17), local(18))
+    assert busy.starts == [local(7), local(9), local(15), local(17)]
+
+def test_free_windows_stay_within_the_workday():
+    busy = [slot(local(7), local(9)), slot(local(10), local(10, 10)), slot(local(12), local(13))]
+    with patch("intervals.get_config_value", side_effect=lambda key, default=None: default):
+        windows = free_windows(busy, [local(0).date()], min_minutes=15, now=local(6))
+    assert windows[local(0).date()] == [(local(9), local(10)), (local(10, 10), local(12)), (local(13), local(20))]
+
+def test_describe_calendar_lists_busy_and_free_time():
+    busy = [slot(local(9), local(10)), slot(local(9, 30), local(11)), slot(local(14), local(15))]
+    with patch("intervals.get_config_value", side_effect=lambda key, default=None: default):
+        text = describe_calendar(busy, now=local(8, 30))
+    assert "2026-10-19 busy: 09:00-11:00, 14:00-15:00 | free: 08:30-09:00, 11:00-14:00, 15:00-20:00" in text
+
+def test_describe_calendar_moves_on_to_tomorrow_after_the_workday():
+    busy = [slot(local(14), local(15)), slot(local(9, day=20), local(10, day=20))]
+    with patch("intervals.get_config_value", side_effect=lambda key, default=None: default):
+        assert planning_dates(now=local(19)) == [local(0).date()]
+        assert planning_dates(now=local(21), days=2) == [local(0, day=20).date(), local(0, day=21).date()]
+        text = describe_calendar(busy, now=local(21))
+        both = describe_calendar(busy, now=local(8), dates=["2026-10-20", local(0).date()])
+    assert "2026-10-19" not in text
+    assert "2026-10-20 busy: 09:00-10:00 | free: 08:00-09:00, 10:00-20:00" in text
+    assert both.splitlines()[1].startswith("2026-10-19 busy: 14:00-15:00")
+    assert both.splitlines()[2].startswith("2026-10-20 busy: 09:00-10:00")
+
+def test_find_conflicts_reports_busy_and_double_bookings():
+    schedule = [
+        {"task": "A", "start": local(8).isoformat(), "end": local(9).isoformat()},
+        {"task": "B", "start": local(9, 30).isoformat(), "end": local(10, 30).isoformat()},
+        {"task": "C", "start": local(8, 30).isoformat(), "end": local(8, 45).isoformat()},
+        {"task": "D", "start": local(11).isoformat(), "end": local(10).isoformat()},
+        {"task": "E", "start": "2026-10-19T11:00:00", "end": "2026-10-19T12:00:00"},
+    ]
+    conflicts = find_conflicts(schedule, [slot(local(9), local(10))])
+    assert conflicts == [(1, "overlaps a busy slot"), (2, "overlaps another scheduled task"), (3, "ends before it starts")]
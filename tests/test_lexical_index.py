@@ -0,0 +1,124 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from lexical_index import BM25Index, tokenize, hybrid_retrieve
+from rag_agent import RAGAgent
+from vector_store import NumpyVectorStore
+
+def test_tokenize_splits_camel_case():
+    tokens = tokenize("Review WineDragons wireframes #winedragons")
+    assert "winedragons" in tokens
+    assert "wine" in tokens
+    assert "dragons" in tokens
+    assert "review" in tokens
+
+def test_bm25_ranks_exact_project_name_first(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25.json"))
+    index.upsert("a.md", "Notes about grocery shopping and cooking", {"path": "a.md"})
+    index.upsert("b.md", "WineDragons wireframes feedback from the client", {"path": "b.md"})
+    index.upsert("c.md", "Wireframes for the budgeting app", {"path": "c.md"})
+
+    results = index.search("Review WineDragons wireframes", n_results=3)
+    assert results[0][0] == "b.md"
+    assert "a.md" not in [doc_id for doc_id, _ in results]
+
+def test_bm25_persists_and_deletes(tmp_path):
+    path = str(tmp_path / "bm25.json")
+    index = BM25Index(path)
+    index.upsert("a.md", "learning Thai vocabulary", {"path": "a.md"})
+    index.upsert("b.md", "academic paper draft", {"path": "b.md"})
+    index.save()
+
+    reloaded = BM25Index(path)
+    assert reloaded.count() == 2
+    assert reloaded.search("thai")[0][0] == "a.md"
+
+    reloaded.delete("a.md")
+    assert reloaded.search("thai") == []
+    assert "thai" not in reloaded.postings
+
+def test_two_writers_on_one_file_keep_each_others_changes(tmp_path):
+    path = str(tmp_path / "notes_bm25.json")
+    seed = BM25Index(path)
+    seed.upsert("old", "Grocery list")
+    seed.upsert("shared", "Standup notes")
+    seed.save()
+
+    # The observer and a cron run each hold their own copy
+    observer, cron = BM25Index(path), BM25Index(path)
+    observer.upsert("thai", "Practice Thai tones")
+    observer.delete("old")
+    observer.save()
+    cron.upsert("curry", "Green curry with basil")
+    cron.upsert("shared", "Standup notes, moved to 10:00")
+    cron.save()
+
+    merged = BM25Index(path)
+    assert sorted(merged.docs) == ["curry", "shared", "thai"]
+    assert merged.get("shared")["text"] == "Standup notes, moved to 10:00"
+    assert merged.search("tones")[0][0] == "thai"
+    assert cron.count() == 3
+
+def test_hybrid_retrieve_combines_scores(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25.json"))
+    index.upsert("a.md", "winedragons launch plan", {"path": "a.md"})
+    index.upsert("b.md", "unrelated cooking notes", {"path": "b.md"})
+
+    collection = MagicMock()
+    collection.count.return_value = 2
+    collection.query.return_value = {
+        'ids': [["b.md", "a.md"]],
+        'documents': [["unrelated cooking notes", "winedragons launch plan"]],
+        'metadatas': [[{"path": "b.md"}, {"path": "a.md"}]],
+        'distances': [[0.2, 0.4]]
+    }
+
+    hits = hybrid_retrieve(index, collection, "winedragons", n_results=2, alpha=0.3)
+    assert hits[0]["id"] == "a.md"
+
+    vector_only = hybrid_retrieve(index, collection, "winedragons", n_results=2, alpha=1.0)
+    assert vector_only[0]["id"] == "b.md"
+
+def test_hybrid_retrieve_pushes_filters_down(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25.json"))
+    index.upsert("a.md", "winedragons launch plan", {"path": "/vault/a.md", "source": "Obsidian"})
+    index.upsert("j.md", "winedragons standup", {"path": "/logseq/journals/j.md", "source": "Logseq"})
+
+    collection = MagicMock()
+    collection.count.return_value = 2
+    collection.query.return_value = {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+
+    where = {"source": {"$eq": "Logseq"}}
+    hits = hybrid_retrieve(index, collection, "winedragons", n_results=2, alpha=0.3, where=where)
+    assert [h["id"] for h in hits] == ["j.md"]
+    assert collection.query.call_args.kwargs["where"] == where
+
+    hits = hybrid_retrieve(index, collection, "winedragons", n_results=2, alpha=0.3, path_prefix="/vault")
+    assert [h["id"] for h in hits] == ["a.md"]
+    assert "where" not in collection.query.call_args.kwargs
+
+def test_rag_agent_lexical_mode_skips_embeddings(tmp_path):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    (vault / "winedragons.md").write_text("# WineDragons\nWireframes need review before launch.")
+    (vault / "thai.md").write_text("# Thai\nPractice tones every day.")
+
+    agent = RAGAgent(str(vault), db_path=str(tmp_path / "db"), retrieval_mode="lexical")
+    agent.index_vault()
+
+    assert agent.collection is None
+    assert agent.embedding_fn is None
+    context = agent.query_context("Review WineDragons wireframes", n_results=1)
+    assert "winedragons.md" in context
+
+def test_vector_only_index_is_copied_into_bm25(tmp_path):
+    # An index written before the BM25 index existed: documents only in the vector store
+    store = NumpyVectorStore(str(tmp_path / "db" / "numpy" / "markdown_notes"))
+    store.upsert(ids=["a.md", "b.md"], embeddings=[[1.0, 0.0], [0.0, 1.0]],
+                 documents=["WineDragons wireframes", "Thai lessons"], metadatas=[{"path": "a.md"}, {"path": "b.md"}])
+    store.close()
+    with patch("rag_agent.get_vector_backend", return_value="numpy"), \
+         patch("rag_agent.get_embedding_function", return_value=MagicMock()):
+        agent = RAGAgent(str(tmp_path), db_path=str(tmp_path / "db"), retrieval_mode="hybrid")
+        assert not agent.is_empty()
+    assert agent.lexical_index.search("wireframes")[0][0] == "a.md"
+    assert BM25Index(agent.lexical_index.path).count() == 2
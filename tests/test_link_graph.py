@@ -0,0 +1,79 @@
+import pytest
+from unittest.mock import patch
+from link_graph import LinkGraph, extract_links, page_name, task_key
+from rag_agent import RAGAgent
+
+def test_extract_links():
+    links = extract_links(
+        "- [ ] Review [[Wireframes|wf]] #winedragons ^2026-02-01\n"
+        "- LATER call [[Clients/ACME#Contacts]] #[[Big Deal]]\n"
+        "tags:: project, client\n"
+        "id:: 64f1a2b3-1111-2222-3333-444455556666\n"
+        "see ((64f1a2b3-1111-2222-3333-aaaabbbbcccc))\n"
+        "```\n[[not a link]]\n```\n"
+    )
+    assert links["links"] == ["big deal", "clients/acme", "wireframes"]
+    assert links["tags"] == ["big deal", "client", "project", "winedragons"]
+    assert links["refs"] == ["64f1a2b3-1111-2222-3333-aaaabbbbcccc"]
+    assert links["blocks"] == ["64f1a2b3-1111-2222-3333-444455556666"]
+    assert task_key("Review [[Wireframes|wf]]") in links["tasks"]
+
+def test_page_names():
+    assert page_name("pages/Clients___ACME.md") == "clients/acme"
+    assert page_name("pages/a%2Fb.md") == "a/b"
+    assert page_name("Projects/Wine Dragons.md") == "wine dragons"
+
+def test_graph_is_incremental_and_persisted(tmp_path):
+    path = str(tmp_path / "graph.json")
+    graph = LinkGraph(path)
+    graph.upsert("daily_note.md", "- [ ] Review [[Wireframes]]\nSee ((64f1a2b3-1111-2222-3333-444455556666))")
+    graph.upsert("Projects/Wireframes.md", "# Wireframes\n#winedragons")
+    graph.upsert("clients.md", "id:: 64f1a2b3-1111-2222-3333-444455556666\nAcme, #winedragons")
+    graph.save()
+
+    reloaded = LinkGraph(path)
+    assert reloaded.neighbours("daily_note.md") == {
+        "Projects/Wireframes.md": (1.0, "link"), "clients.md": (1.0, "block-ref")
+    }
+    assert reloaded.neighbours("Projects/Wireframes.md") == {
+        "daily_note.md": (0.8, "backlink"), "clients.md": (0.4, "shared-tag")
+    }
+
+    reloaded.upsert("daily_note.md", "- [ ] Call the printer")
+    assert reloaded.backlinks == {}
+    reloaded.delete("clients.md")
+    assert reloaded.by_block == {} and reloaded.by_tag == {"winedragons": {"Projects/Wireframes.md"}}
+
+@pytest.fixture
+def vault(tmp_path):
+    vault = tmp_path / "vault"
+    (vault / "Projects").mkdir(parents=True)
+    (vault / "daily_note.md").write_text("## Tasks\n- [ ] Review [[Wireframes]] feedback\n- [ ] Call the printer")
+    (vault / "Projects" / "Wireframes.md").write_text("# Wireframes\nClient wants a darker header. Owner: [[Mai]]")
+    (vault / "Mai.md").write_text("# Mai\nDesigner, prefers async feedback on Figma.")
+    (vault / "winedragons.md").write_text("# WineDragons\nLaunch is in March.")
+    (vault / "groceries.md").write_text("# Groceries\nRice and limes.")
+    return vault
+
+def test_related_notes_expand_without_embeddings(vault, tmp_path):
+    RAGAgent(str(vault), db_path=str(tmp_path / "db"), retrieval_mode="lexical").index_vault()
+
+    fresh = RAGAgent(str(vault), db_path=str(tmp_path / "db"), retrieval_mode="hybrid")
+    with patch("rag_agent.get_embedding_function", side_effect=AssertionError("no embedding call")):
+        hits = fresh.related_notes({"task": "Review [[Wireframes]] feedback", "category": "winedragons"}, n_results=5)
+    ids = [h["id"] for h in hits]
+    assert set(ids[:2]) == {"Projects/Wireframes.md", "winedragons.md"}
+    assert "daily_note.md" in ids
+    assert "groceries.md" not in ids
+    assert hits[ids.index("daily_note.md")]["relation"] == "task-note"
+
+    # The task's own note leads on to what it links to
+    hits = fresh.related_notes({"task": "Call the printer", "category": "Uncategorized"}, n_results=5)
+    assert [h["id"] for h in hits] == ["daily_note.md", "Projects/Wireframes.md"]
+
+def test_notes_indexed_before_the_graph_are_picked_up(vault, tmp_path):
+    agent = RAGAgent(str(vault), db_path=str(tmp_path / "db"), retrieval_mode="lexical")
+    agent.index_vault()
+    assert not any(agent.needs_indexing(path, root) for root, path in agent.iter_vault_files())
+    agent.link_graph.delete("Mai.md")
+    assert [p for root, p in agent.iter_vault_files() if agent.needs_indexing(p, root)] == [str(vault / "Mai.md")]
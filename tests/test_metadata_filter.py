@@ -0,0 +1,79 @@
+import os
+import datetime
+import sqlite3
+import json
+from metadata_filter import build_where, matches, to_sql, journal_date, to_timestamp
+from rag_agent import RAGAgent
+
+def test_build_where():
+    assert build_where(source=None) is None
+    assert build_where(source="Logseq") == {"source": {"$eq": "Logseq"}}
+    assert build_where(source="Logseq", last_modified=("$gte", 10)) == {
+        "$and": [{"source": {"$eq": "Logseq"}}, {"last_modified": {"$gte": 10}}]
+    }
+
+def test_matches_and_sql_agree():
+    rows = [{"source": "Logseq", "last_modified": 5}, {"source": "Obsidian", "last_modified": 20},
+            {"source": "Logseq", "last_modified": 30}]
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE rows (row INTEGER, metadata TEXT)")
+    conn.executemany("INSERT INTO rows VALUES (?, ?)", [(i, json.dumps(m)) for i, m in enumerate(rows)])
+
+    for where in [
+        build_where(source="Logseq", last_modified=("$gte", 10)),
+        {"$or": [{"source": "Obsidian"}, {"last_modified": {"$lt": 10}}]},
+        {"source": {"$in": ["Obsidian"]}},
+    ]:
+        expected = [i for i, m in enumerate(rows) if matches(m, where)]
+        clause, params = to_sql(where)
+        assert [r[0] for r in conn.execute(f"SELECT row FROM rows WHERE {clause}", params)] == expected
+
+def test_journal_date():
+    assert journal_date("/vault/journals/2026_10_19.md") == datetime.date(2026, 10, 19)
+    assert journal_date("Daily/2026-10-19.md") == datetime.date(2026, 10, 19)
+    assert journal_date("projects/2026 roadmap.md") is None
+    assert to_timestamp(datetime.date(2026, 1, 1)) == datetime.datetime(2026, 1, 1).timestamp()
+
+def test_rag_filters_and_recency_boost(tmp_path):
+    vault = tmp_path / "vault"
+    logseq = tmp_path / "logseq"
+    (logseq / "journals").mkdir(parents=True)
+    vault.mkdir()
+    today = datetime.date.today()
+    old = today - datetime.timedelta(days=60)
+    (vault / "standup.md").write_text("Standup notes: review sprint board and standup agenda")
+    (logseq / "journals" / f"{today.strftime('%Y_%m_%d')}.md").write_text("- standup moved, review sprint board")
+    (logseq / "journals" / f"{old.strftime('%Y_%m_%d')}.md").write_text("- standup review sprint board agenda retro")
+    archived = vault / "archive.md"
+    archived.write_text("Old standup review sprint board agenda from last year")
+    os.utime(archived, (1, 1))
+
+    agent = RAGAgent(str(vault), str(logseq), db_path=str(tmp_path / "db"), retrieval_mode="lexical")
+    agent.index_vault()
+
+    logseq_hits = agent.retrieve("standup review", n_results=5, source="Logseq")
+    assert logseq_hits and all(h["metadata"]["source"] == "Logseq" for h in logseq_hits)
+
+    recent = agent.retrieve("standup review", n_results=5, modified_after=datetime.datetime(2000, 1, 1))
+    assert "archive.md" not in [h["id"] for h in recent]
+
+    prefix = agent.retrieve("standup review", n_results=5, path_prefix=str(logseq / "journals"))
+    assert {h["id"] for h in prefix} == {os.path.join("journals", p.name) for p in (logseq / "journals").iterdir()}
+
+    unboosted = agent.retrieve("standup review sprint agenda", n_results=4, recency_boost=0)
+    boosted = agent.retrieve("standup review sprint agenda", n_results=4, recency_boost=5)
+    todays = os.path.join("journals", f"{today.strftime('%Y_%m_%d')}.md")
+    rank = lambda hits: [h["id"] for h in hits].index(todays)
+    assert rank(boosted) == 0 and rank(unboosted) > 0
+    # Only journal notes are boosted: other notes keep their relevance score
+    scores = lambda hits: {h["id"]: h["score"] for h in hits}
+    assert scores(boosted)["standup.md"] <= scores(unboosted)["standup.md"]
+    assert all(0 <= h["score"] <= 1 for h in boosted)
+
+def test_boost_leaves_other_notes_alone(tmp_path):
+    agent = RAGAgent(str(tmp_path), db_path=str(tmp_path / "db"), retrieval_mode="lexical")
+    today = datetime.date.today().strftime('%Y_%m_%d')
+    hits = [{"id": "projects/plan.md", "metadata": {}, "score": 0.8},
+            {"id": f"journals/{today}.md", "metadata": {}, "score": 0.2}]
+    boosted = agent._boost_recent(hits, 0.5)
+    assert [(h["id"], h["score"]) for h in boosted] == [("projects/plan.md", 0.8), (f"journals/{today}.md", 0.7)]
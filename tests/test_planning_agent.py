@@ -1,11 +1,14 @@
 import pytest
 import os
+import datetime
 from unittest.mock import patch, MagicMock
 from planning_agent import PlanningAgent
+from schedule_repair import normalize_item
 
-@patch('calendar_manager.create_events')
+@patch('calendar_manager.get_busy_slots', return_value=[])
+@patch('calendar_manager.reconcile_events')
 @patch('planning_agent.update_markdown_plan')
-def test_execute_plan(mock_update_md, mock_create_events, tmp_path):
+def test_execute_plan(mock_update_md, mock_reconcile_events, mock_busy, tmp_path):
     mock_service = MagicMock()
     agent = PlanningAgent(mock_service, "test_cal_id")
     
@@ -16,9 +19,93 @@ def test_execute_plan(mock_update_md, mock_create_events, tmp_path):
     success = agent.execute_plan(test_schedule, str(test_obsidian_path))
     
     assert success is True
-    mock_create_events.assert_called_once_with(mock_service, test_schedule, calendar_id="test_cal_id")
-    mock_update_md.assert_called_once_with(str(test_obsidian_path), test_schedule)
+    # Timestamps are booked with the local timezone offset
+    booked = [dict(test_schedule[0], start=normalize_item(test_schedule[0])["start"], end=normalize_item(test_schedule[0])["end"])]
+    assert booked[0]["start"] != test_schedule[0]["start"]
+    mock_reconcile_events.assert_called_once_with(mock_service, booked, calendar_id="test_cal_id", replace=False)
+    mock_update_md.assert_called_once_with(str(test_obsidian_path), booked)
 
 def test_execute_plan_no_schedule():
     agent = PlanningAgent(None, "primary")
     assert agent.execute_plan([], "path.md") is False
+
+def at(hour, minute=0):
+    return datetime.datetime(2026, 10, 19, hour, minute).astimezone().isoformat()
+
+@patch('calendar_manager.get_busy_slots', return_value=[
+    {"summary": "Standup", "start": at(9), "end": at(10)},
+    {"summary": "AI: Old plan", "start": at(13), "end": at(14)},
+])
+@patch('schedule_repair.get_config_value', side_effect=lambda key, default=None: default)
+@patch('intervals.get_config_value', side_effect=lambda key, default=None: {"WORKDAY_START": "08:00", "WORKDAY_END": "11:00"}.get(key, default))
+def test_validate_repairs_locally_and_replans_only_what_does_not_fit(mock_workday, mock_config, mock_busy):
+    agent = PlanningAgent(MagicMock(), "primary")
+    schedule = [
+        {"task": "Write", "category": "writing", "start": at(9, 30), "end": at(10, 30)},
+        {"task": "Email", "category": "Personal", "start": at(8), "end": at(8, 30)},
+        {"task": "Read", "category": "learning", "start": at(8), "end": at(11)},
+    ]
+    replanned = {"schedule": [{"task": "Read", "category": "learning", "start": at(13), "end": at(14)}]}
+    with patch('ai_orchestration.generate_schedule', return_value=replanned) as mock_generate:
+        result = agent.validate(schedule, replace=True, now=at(7))
+
+    # Upcoming AI events are replaced, so they are not busy time; Write moves after the standup, Email stays
+    assert [(item["task"], item["start"], item["end"]) for item in result] == [
+        ("Email", at(8), at(8, 30)),
+        ("Write", at(10), at(11)),
+        ("Read", at(13), at(14)),
+    ]
+    # Only the task that did not fit went back to the LLM
+    assert mock_generate.call_args[0][0] == [{"task": "Read", "category": "learning"}]
+
+@patch('calendar_manager.get_busy_slots', return_value=[
+    {"summary": "AI: Morning run", "start": at(7), "end": at(8)},
+    {"summary": "AI: Old plan", "start": at(13), "end": at(14)},
+])
+@patch('schedule_repair.get_config_value', side_effect=lambda key, default=None: default)
+@patch('intervals.get_config_value', side_effect=lambda key, default=None: default)
+def test_validate_keeps_ai_events_busy_unless_they_are_replaced(mock_workday, mock_config, mock_busy):
+    agent = PlanningAgent(MagicMock(), "primary")
+    schedule = [
+        {"task": "Write", "start": at(7, 30), "end": at(8, 30)},
+        {"task": "Read", "start": at(13), "end": at(14)},
+    ]
+    # Added on top of the calendar: every AI event there stays
+    added = agent.validate(schedule, now=at(7, 30))
+    assert [(item["start"], item["end"]) for item in added] == [(at(8), at(9)), (at(12), at(13))]
+    # Replacing the plan: only the run that already started stays
+    replaced = agent.validate(schedule, replace=True, now=at(7, 30))
+    assert [(item["start"], item["end"]) for item in replaced] == [(at(8), at(9)), (at(13), at(14))]
+
+@patch('calendar_manager.get_busy_slots', return_value=[{"summary": "Standup", "start": at(9), "end": at(11)}])
+@patch('schedule_repair.get_config_value', side_effect=lambda key, default=None: default)
+@patch('intervals.get_config_value', side_effect=lambda key, default=None: {"WORKDAY_START": "08:00", "WORKDAY_END": "11:00"}.get(key, default))
+def test_replan_is_shown_the_schedule_days_and_nothing_else_is_booked(mock_workday, mock_config, mock_busy):
+    agent = PlanningAgent(MagicMock(), "primary")
+    schedule = [
+        {"task": "Write", "start": at(8), "end": at(9)},
+        {"task": "Read", "start": at(8), "end": at(9)},
+    ]
+    tomorrow = datetime.datetime(2026, 10, 20, 9).astimezone()
+    replanned = {"schedule": [{"task": "Read", "start": tomorrow.isoformat(), "end": (tomorrow + datetime.timedelta(hours=1)).isoformat()}]}
+    with patch('ai_orchestration.generate_schedule', return_value=replanned) as mock_generate:
+        result = agent.validate(schedule, now=at(7))
+    assert mock_generate.call_args.kwargs["dates"] == ["2026-10-19"]
+    # Tomorrow's busy time was never read, so the task is not booked there
+    assert [item["task"] for item in result] == ["Write"]
+
+def test_shared_calendars_are_read_with_free_busy_only(tmp_path):
+    from event_store import CalendarEventStore
+    service = MagicMock()
+    service.events().list().execute.return_value = {"items": [], "nextSyncToken": "token"}
+    service.freebusy().query().execute.return_value = {"calendars": {"team": {"busy": [{"start": at(9), "end": at(10)}]}}}
+    store = CalendarEventStore(str(tmp_path / "events.sqlite3"), past_days=1, future_days=1)
+    config = {"BUSY_CALENDAR_IDS": "team@group.calendar.google.com"}
+    with patch('calendar_manager.get_event_store', return_value=store), \
+         patch('calendar_manager.get_config_value', side_effect=lambda key, default=None: config.get(key, default)):
+        slots = PlanningAgent(service, "work")._busy_slots([at(9)[:10]])
+    listed = {call.kwargs.get("calendarId") for call in service.events().list.call_args_list if call.kwargs}
+    assert listed == {"primary", "work"}
+    body = service.freebusy().query.call_args.kwargs["body"]
+    assert [item["id"] for item in body["items"]] == ["team@group.calendar.google.com"]
+    assert len(slots) == 1
@@ -0,0 +1,68 @@
+import pytest
+from unittest.mock import patch
+import lexical_index
+from query_cache import QueryCache, IndexVersion, make_key, query_cache
+from rag_agent import RAGAgent
+
+def hits(doc_id):
+    return [{"id": doc_id, "score": 1.0}]
+
+def test_lru_evicts_least_recently_used():
+    cache = QueryCache(max_entries=2)
+    cache.put("a", hits("a"))
+    cache.put("b", hits("b"))
+    assert cache.get("a") == hits("a")
+    cache.put("c", hits("c"))
+    assert cache.get("b") is None
+    assert cache.get("a") == hits("a")
+    assert cache.get("c") == hits("c")
+
+def test_cached_hits_are_copies():
+    cache = QueryCache()
+    cache.put("a", hits("a"))
+    cache.get("a")[0]["source"] = "markdown_notes"
+    assert cache.get("a") == hits("a")
+
+def test_make_key_normalizes_query():
+    assert make_key("notes", "  Review   WineDragons ", 3) == make_key("notes", "review winedragons", 3)
+    assert make_key("notes", "review", 3) != make_key("notes", "review", 5)
+    assert make_key("notes", "review", 3, version=1) != make_key("notes", "review", 3, version=2)
+
+def test_index_version_persists_across_instances(tmp_path):
+    first = IndexVersion(str(tmp_path))
+    first.bump("markdown_notes")
+    first.bump("markdown_notes")
+    first.flush()
+
+    second = IndexVersion(str(tmp_path))
+    assert second.get("markdown_notes") == 2
+    assert second.get("book_library") == 0
+
+def test_a_collection_version_is_only_persisted_by_its_own_flush(tmp_path):
+    writer = IndexVersion(str(tmp_path))
+    writer.bump("markdown_notes")
+    writer.bump("book_library")
+    # The books were saved; the notes' BM25 index is not on disk yet
+    writer.flush("book_library")
+    reader = IndexVersion(str(tmp_path))
+    assert (reader.get("markdown_notes"), reader.get("book_library")) == (0, 1)
+    writer.flush("markdown_notes")
+    assert reader.get("markdown_notes") == 1
+
+def test_rag_agent_caches_until_reindex(tmp_path):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    (vault / "cheers.md").write_text("Cheers bar menu planning")
+    agent = RAGAgent(str(vault), db_path=str(tmp_path / "db"), retrieval_mode="lexical")
+    agent.index_vault()
+    query_cache.clear()
+
+    with patch("rag_agent.hybrid_retrieve", wraps=lexical_index.hybrid_retrieve) as mock_retrieve:
+        agent.query_context("cheers menu")
+        agent.query_context("Cheers   MENU")
+        assert mock_retrieve.call_count == 1
+
+        (vault / "cheers.md").write_text("Cheers bar menu planning, new cocktails")
+        agent.index_vault()
+        agent.query_context("cheers menu")
+        assert mock_retrieve.call_count == 2
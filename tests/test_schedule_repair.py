@@ -0,0 +1,39 @@
+import datetime
+from unittest.mock import patch
+from schedule_repair import repair_schedule, normalize_item
+
+def at(hour, minute=0):
+    return datetime.datetime(2026, 10, 19, hour, minute).astimezone()
+
+def item(task, start, end):
+    return {"task": task, "start": start.isoformat(), "end": end.isoformat()}
+
+def repair(schedule, busy):
+    with patch("intervals.get_config_value", side_effect=lambda key, default=None: default):
+        return repair_schedule(schedule, busy, now=at(7), min_minutes=15)
+
+def test_normalize_item_adds_the_local_offset():
+    normalized = normalize_item({"task": "A", "start": "2026-10-19T09:00:00", "end": "2026-10-19T10:00:00Z"})
+    assert datetime.datetime.fromisoformat(normalized["start"]) == at(9)
+    assert normalized["end"].endswith("+00:00")
+    assert normalize_item({"task": "B", "start": "tomorrow"}) is None
+
+def test_conflicting_items_move_to_the_nearest_free_window():
+    busy = [item("Standup", at(9), at(10)), item("Lunch", at(12), at(13))]
+    placed, unplaced = repair([item("Write", at(9, 30), at(10, 30)), item("Read", at(11, 30), at(12, 30))], busy)
+    assert unplaced == []
+    assert [(p["task"], p["start"], p["end"]) for p in placed] == [
+        ("Write", at(10).isoformat(), at(11).isoformat()),
+        ("Read", at(11).isoformat(), at(12).isoformat()),
+    ]
+
+def test_items_are_truncated_or_left_for_the_llm():
+    busy = [item("Busy", at(8), at(19, 30))]
+    placed, unplaced = repair([
+        item("Short", at(10), at(10, 50)),
+        item("Long", at(11), at(14)),
+        item("Broken", at(11), at(10)),
+    ], busy)
+    # 30 free minutes are left: Short is cut to fit, Long cannot be placed
+    assert [(p["task"], p["start"], p["end"]) for p in placed] == [("Short", at(19, 30).isoformat(), at(20).isoformat())]
+    assert [u["task"] for u in unplaced] == ["Broken", "Long"]
@@ -0,0 +1,86 @@
+import pytest
+from unittest.mock import patch
+from federated_search import FederatedSearch, SearchSource, describe_note, describe_book
+from rag_agent import RAGAgent
+from book_agent import BookAgent
+from task_links import TaskLinker, task_id
+
+@pytest.fixture
+def linker(tmp_path):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    (vault / "thai.md").write_text("# Thai\nPractice Thai tones with classifier drills.")
+    (vault / "paper.md").write_text("# Paper\nDraft the related work section of the paper.")
+    db = str(tmp_path / "db")
+    RAGAgent(str(vault), db_path=db, retrieval_mode="lexical").index_vault()
+    books = BookAgent(books_dir=str(tmp_path), db_path=db, retrieval_mode="lexical")
+    books._upsert("Thai Grammar.pdf_p3", "Thai tones: mid, low, falling, high and rising.",
+                  {"path": "Thai Grammar.pdf", "page": 3, "book": "Thai Grammar.pdf"})
+    books._flush()
+
+    search = FederatedSearch([
+        SearchSource("markdown_notes", "Notes", RAGAgent(str(vault), db_path=db, retrieval_mode="lexical"), describe_note),
+        SearchSource("book_library", "Books", BookAgent(books_dir=str(tmp_path), db_path=db, retrieval_mode="lexical"), describe_book),
+    ], quotas={})
+    linker = TaskLinker(search, db_path=db, k=3)
+    linker.vault = vault
+    return linker
+
+TASKS = [
+    {"task": "Practice Thai tones", "category": "thai", "source": "Obsidian"},
+    {"task": "Draft related work for the paper", "category": "research", "source": "Obsidian"},
+]
+
+def test_task_id_is_stable():
+    assert task_id(TASKS[0]) == task_id(dict(TASKS[0], category="other"))
+    assert task_id(TASKS[0]) == task_id({"task": "practice  thai TONES", "source": "Obsidian"})
+    assert task_id(TASKS[0]) != task_id(TASKS[1])
+
+def test_scheduler_reads_precomputed_links(linker):
+    linker.track(TASKS)
+    assert linker.refresh() == 2
+
+    with patch.object(FederatedSearch, "search", side_effect=AssertionError("no retrieval in the hot path")):
+        context = linker.context(TASKS, n_results=4)
+    assert "[Notes] From 'thai.md'" in context
+    assert "[Books] From 'Thai Grammar.pdf' (Page 3)" in context
+    assert "[Notes] From 'paper.md'" in context
+
+    # Another process (the scheduler) reads the links the indexer saved
+    other = TaskLinker(linker.search, db_path=linker.store.path.rsplit("/", 1)[0], k=3)
+    with patch.object(FederatedSearch, "search", side_effect=AssertionError("no retrieval in the hot path")):
+        assert other.context(TASKS[:1], n_results=2)
+
+def test_new_tasks_are_linked_inline_once(linker):
+    linker.context(TASKS[:1])
+    linker.context(TASKS[:1])
+    assert linker.stats == {"computed": 1, "reused": 1}
+
+def test_refresh_is_incremental(linker):
+    linker.track(TASKS)
+    linker.refresh()
+    assert linker.refresh() == 0
+
+    # Editing a note linked only to the Thai task recomputes that link alone
+    (linker.vault / "thai.md").write_text("# Thai\nPractice Thai tones and vowel length drills.")
+    indexer_agent = RAGAgent(str(linker.vault), db_path=linker.search.source("markdown_notes").agent.db_path, retrieval_mode="lexical")
+    indexer_agent.index_file(str(linker.vault / "thai.md"))
+    indexer_agent._flush()
+    with patch.object(linker, "_compute", wraps=linker._compute) as compute:
+        assert linker.refresh() == 1
+    assert compute.call_args.args[0] == task_id(TASKS[0])
+    assert "vowel length" in linker.context(TASKS[:1])
+
+    # Changed or removed tasks drop their links; the new text gets its own
+    linker.track([TASKS[0], {"task": "Review the Thai classifier drills", "source": "Obsidian"}])
+    assert task_id(TASKS[1]) not in linker.store.links
+    assert linker.refresh() == 1
+
+def test_links_include_graph_neighbours(linker):
+    (linker.vault / "advisor.md").write_text("# Advisor\nMeets on Thursdays, wants drafts a week ahead.")
+    notes = linker.search.source("markdown_notes").agent
+    notes.index_file(str(linker.vault / "advisor.md"))
+    notes._flush()
+
+    hits = linker.hits([{"task": "Send chapter to [[Advisor]]", "category": "research", "source": "Obsidian"}])
+    assert ("markdown_notes", "advisor.md") in [(h["source"], h["id"]) for h in hits]
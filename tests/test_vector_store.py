@@ -0,0 +1,76 @@
+import pytest
+import numpy as np
+from unittest.mock import patch
+from vector_store import NumpyVectorStore
+from embedding_cache import CachedEmbeddingFunction
+from rag_agent import RAGAgent
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_numpy_store_upsert_query_delete(tmp_path, dtype):
+    store = NumpyVectorStore(str(tmp_path / "store"), dtype=dtype)
+    store.upsert(
+        ids=["a", "b", "c"],
+        embeddings=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.7, 0.7, 0.0]],
+        documents=["doc a", "doc b", "doc c"],
+        metadatas=[{"page": 1}, {"page": 2}, {"page": 3}]
+    )
+    assert store.count() == 3
+
+    result = store.query(query_embeddings=[[0.9, 0.1, 0.0]], n_results=2)
+    assert result["ids"][0] == ["a", "c"]
+    assert result["documents"][0][0] == "doc a"
+    assert result["metadatas"][0][0] == {"page": 1}
+    assert result["distances"][0][0] < result["distances"][0][1]
+
+    assert store.get(ids=[]) == {"ids": [], "documents": [], "metadatas": []}
+
+    store.delete(ids=["a"])
+    assert store.count() == 2
+    assert store.query(query_embeddings=[[0.9, 0.1, 0.0]], n_results=1)["ids"][0] == ["c"]
+
+def test_numpy_store_persists_and_grows(tmp_path):
+    path = str(tmp_path / "store")
+    store = NumpyVectorStore(path, dtype="int8", block_size=64)
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(1500, 8)).astype(np.float32)
+    store.upsert(ids=[str(i) for i in range(1500)], embeddings=vectors.tolist())
+    # Re-upserting an existing id overwrites its row instead of appending
+    store.upsert(ids=["7"], embeddings=[vectors[8].tolist()], documents=["moved"])
+
+    reopened = NumpyVectorStore(path)
+    assert reopened.dtype == "int8"
+    assert reopened.count() == 1500
+    assert reopened.get(ids=["7"])["documents"] == ["moved"]
+    top = reopened.query(query_embeddings=[vectors[42].tolist()], n_results=1)
+    assert top["ids"][0] == ["42"]
+
+def test_rag_agent_with_numpy_backend(tmp_path):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    (vault / "a.md").write_text("WineDragons wireframes")
+    (vault / "b.md").write_text("Thai lessons")
+    fake_fn = CachedEmbeddingFunction(
+        cache_path=str(tmp_path / "emb.sqlite3"),
+        base_fn=lambda texts: [[float(len(t)), float(t.count("e")), 1.0] for t in texts]
+    )
+    with patch("rag_agent.get_vector_backend", return_value="numpy"), \
+         patch("rag_agent.get_embedding_function", return_value=fake_fn):
+        agent = RAGAgent(str(vault), db_path=str(tmp_path / "db"), retrieval_mode="vector")
+        agent.index_vault()
+        assert isinstance(agent.collection, NumpyVectorStore)
+        assert agent.collection.count() == 2
+        assert "a.md" in agent.query_context("WineDragons wireframes", n_results=1)
+
+def test_numpy_store_pushes_down_where_filters(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "store"), block_size=2)
+    store.upsert(
+        ids=["a", "b", "c", "d"],
+        embeddings=[[1.0, 0.0], [0.9, 0.1], [0.0, 1.0], [0.8, 0.2]],
+        metadatas=[{"book": "x.pdf", "page": 1}, {"book": "y.pdf", "page": 2},
+                   {"book": "y.pdf", "page": 3}, {"book": "x.pdf", "page": 9}]
+    )
+    result = store.query(query_embeddings=[[1.0, 0.0]], n_results=3, where={"book": {"$eq": "y.pdf"}})
+    assert result["ids"][0] == ["b", "c"]
+
+    where = {"$and": [{"book": {"$eq": "x.pdf"}}, {"page": {"$gte": 5}}]}
+    assert store.query(query_embeddings=[[1.0, 0.0]], n_results=3, where=where)["ids"][0] == ["d"]
@@ -0,0 +1,324 @@
+import os
+import json
+import shutil
+import sqlite3
+import threading
+from config_utils import get_config_value
+from metadata_filter import to_sql
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import chromadb
+except ImportError:
+    chromadb = None
+
+SUPPORTED_BACKENDS = ("chroma", "numpy")
+
+class NumpyVectorStore:
+    """
+    Lightweight vector store backed by memory-mapped NumPy arrays.
+
+    Implements the subset of the Chromadb collection API the agents use
+    (upsert, query, get, delete, count), so it can replace a collection as-is.
+
+    Layout of <path>/:
+        vectors.bin  - float16 or int8 matrix (capacity x dim), memory-mapped
+        scales.bin   - float32 per-row scale (int8 only)
+        norms.bin    - float32 squared L2 norm per row (inf marks a deleted row)
+        meta.sqlite3 - sidecar table: row -> id, document, metadata
+    Queries run a blocked brute-force L2 search, the same distance Chroma uses by default;
+    `where` filters are evaluated against the sidecar table before scoring.
+    """
+    def __init__(self, path, dtype=None, block_size=16384):
+        if np is None:
+            raise ImportError("NumPy is required for the numpy vector store backend.")
+        self.path = path
+        self.block_size = block_size
+        os.makedirs(path, exist_ok=True)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(os.path.join(path, "meta.sqlite3"), check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                document TEXT,
+                metadata TEXT
+            )
+        """)
+        self.conn.commit()
+
+        settings = dict(self.conn.execute("SELECT key, value FROM settings").fetchall())
+        self.dtype = settings.get("dtype") or dtype or get_config_value("VECTOR_QUANTIZATION", "float16")
+        if self.dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported vector quantization: {self.dtype}")
+        self.dim = int(settings.get("dim", 0))
+        self.size = int(settings.get("size", 0))
+        self.capacity = int(settings.get("capacity", 0))
+        self.vectors = self.scales = self.norms = None
+        if self.dim:
+            self._map()
+
+    # --- storage ---------------------------------------------------------
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _map(self):
+        """(Re)opens the memory maps for the current capacity."""
+        def mmap(name, dtype, shape):
+            return np.memmap(self._file(name), dtype=dtype, mode="r+", shape=shape)
+        self.vectors = mmap("vectors.bin", self.dtype, (self.capacity, self.dim))
+        self.norms = mmap("norms.bin", "float32", (self.capacity,))
+        self.scales = mmap("scales.bin", "float32", (self.capacity,)) if self.dtype == "int8" else None
+
+    def _grow(self, needed):
+        """Extends the backing files (capacity doubling) without copying existing rows."""
+        if needed <= self.capacity:
+            return
+        new_capacity = max(needed, self.capacity * 2, 1024)
+        files = [("vectors.bin", np.dtype(self.dtype).itemsize * self.dim), ("norms.bin", 4)]
+        if self.dtype == "int8":
+            files.append(("scales.bin", 4))
+        self._release()
+        for name, row_bytes in files:
+            with open(self._file(name), "ab") as f:
+                f.truncate(new_capacity * row_bytes)
+        self.capacity = new_capacity
+        self._map()
+
+    def _release(self):
+        for arr in (self.vectors, self.norms, self.scales):
+            if arr is not None:
+                arr.flush()
+        self.vectors = self.scales = self.norms = None
+
+    def _save_settings(self):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO settings VALUES (?, ?)",
+            [("dtype", self.dtype), ("dim", str(self.dim)), ("size", str(self.size)), ("capacity", str(self.capacity))]
+        )
+
+    def _quantize(self, matrix):
+        """Returns (stored rows, per-row scales or None) for a float32 matrix."""
+        if self.dtype == "float16":
+            return matrix.astype(np.float16), None
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    # --- collection API --------------------------------------------------
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2 or len(matrix) != len(ids):
+            raise ValueError("NumpyVectorStore.upsert needs one embedding per id.")
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        with self.lock:
+            if not self.dim:
+                self.dim = matrix.shape[1]
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match store dimension {self.dim}.")
+
+            rows = []
+            for doc_id in ids:
+                found = self.conn.execute("SELECT row FROM rows WHERE id=?", (doc_id,)).fetchone()
+                if found:
+                    rows.append(found[0])
+                else:
+                    rows.append(self.size)
+                    self.size += 1
+            self._grow(self.size)
+
+            stored, scales = self._quantize(matrix)
+            rows_arr = np.asarray(rows)
+            self.vectors[rows_arr] = stored
+            if scales is not None:
+                self.scales[rows_arr] = scales
+            # Norms are computed from the quantized values so distances stay consistent
+            restored = stored.astype(np.float32) * (scales[:, None] if scales is not None else 1.0)
+            self.norms[rows_arr] = np.einsum("ij,ij->i", restored, restored)
+
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO rows (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                [(row, doc_id, doc, json.dumps(meta) if meta is not None else None)
+                 for row, doc_id, doc, meta in zip(rows, ids, documents, metadatas)]
+            )
+            self._save_settings()
+            self.conn.commit()
+            self.vectors.flush()
+            self.norms.flush()
+
+    def delete(self, ids=None):
+        if not ids:
+            return
+        with self.lock:
+            for doc_id in ids:
+                found = self.conn.execute("SELECT row FROM rows WHERE id=?", (doc_id,)).fetchone()
+                if found:
+                    # Tombstone: an infinite norm can never be a nearest neighbour
+                    self.norms[found[0]] = np.inf
+                    self.conn.execute("DELETE FROM rows WHERE row=?", (found[0],))
+            self.conn.commit()
+            if self.norms is not None:
+                self.norms.flush()
+
+    def close(self):
+        """Releases the memory maps and the sidecar connection."""
+        with self.lock:
+            self._release()
+            self.conn.close()
+
+    def _fetch(self, rows):
+        """Loads ids, documents and metadatas for the given rows from the sidecar table."""
+        if not rows:
+            return {}
+        placeholders = ",".join("?" * len(rows))
+        found = self.conn.execute(
+            f"SELECT row, id, document, metadata FROM rows WHERE row IN ({placeholders})", [int(r) for r in rows]
+        ).fetchall()
+        return {row: (doc_id, doc, json.loads(meta) if meta else None) for row, doc_id, doc, meta in found}
+
+    def get(self, ids=None, include=None):
+        with self.lock:
+            if ids is None:
+                found = self.conn.execute("SELECT id, document, metadata FROM rows ORDER BY row").fetchall()
+            elif not ids:
+                # Like Chroma, asking for no ids returns nothing
+                found = []
+            else:
+                placeholders = ",".join("?" * len(ids))
+                found = self.conn.execute(
+                    f"SELECT id, document, metadata FROM rows WHERE id IN ({placeholders})", list(ids)
+                ).fetchall()
+        return {
+            "ids": [r[0] for r in found],
+            "documents": [r[1] for r in found],
+            "metadatas": [json.loads(r[2]) if r[2] else None for r in found],
+        }
+
+    def _allowed_rows(self, where):
+        """Boolean mask of the rows whose metadata matches a `where` filter (evaluated in SQLite)."""
+        clause, params = to_sql(where)
+        rows = [r[0] for r in self.conn.execute(f"SELECT row FROM rows WHERE {clause}", params).fetchall()]
+        mask = np.zeros(self.size, dtype=bool)
+        if rows:
+            mask[np.asarray(rows)] = True
+        return mask
+
+    def search(self, query, n_results=10, mask=None):
+        """
+        Blocked brute-force top-k. Returns (rows, squared L2 distances) best first.
+        With a mask, only the rows marked True are candidates.
+        """
+        q = np.asarray(query, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+        best_dist = np.empty(0, dtype=np.float32)
+        for start in range(0, self.size, self.block_size):
+            end = min(start + self.block_size, self.size)
+            block = self.vectors[start:end].astype(np.float32)
+            dots = block @ q
+            if self.scales is not None:
+                dots *= self.scales[start:end]
+            # ||x - q||^2 without the constant ||q||^2 term
+            dist = self.norms[start:end] - 2.0 * dots
+            if mask is not None:
+                dist = np.where(mask[start:end], dist, np.inf)
+            k = min(n_results, end - start)
+            top = np.argpartition(dist, k - 1)[:k]
+            best_rows = np.concatenate([best_rows, top + start])
+            best_dist = np.concatenate([best_dist, dist[top]])
+            if len(best_rows) > n_results:
+                keep = np.argpartition(best_dist, n_results - 1)[:n_results]
+                best_rows, best_dist = best_rows[keep], best_dist[keep]
+        order = np.argsort(best_dist)
+        best_rows, best_dist = best_rows[order], best_dist[order]
+        alive = np.isfinite(best_dist)
+        return best_rows[alive], best_dist[alive] + float(q @ q)
+
+    def query(self, query_embeddings=None, n_results=10, query_texts=None, where=None, include=None):
+        if query_embeddings is None:
+            raise ValueError("NumpyVectorStore needs query_embeddings; it does not embed text itself.")
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self.lock:
+            # Filters are pushed down: non-matching rows are never scored as neighbours
+            mask = self._allowed_rows(where) if where and self.size else None
+            for query in query_embeddings:
+                rows, dists = self.search(query, n_results, mask) if self.size else ([], [])
+                fetched = self._fetch(list(rows))
+                ids, docs, metas, distances = [], [], [], []
+                for row, dist in zip(rows, dists):
+                    if int(row) not in fetched:
+                        continue
+                    doc_id, doc, meta = fetched[int(row)]
+                    ids.append(doc_id)
+                    docs.append(doc)
+                    metas.append(meta)
+                    distances.append(float(dist))
+                result["ids"].append(ids)
+                result["documents"].append(docs)
+                result["metadatas"].append(metas)
+                result["distances"].append(distances)
+        return result
+
+def get_vector_backend():
+    backend = get_config_value("VECTOR_BACKEND", "chroma").lower()
+    if backend not in SUPPORTED_BACKENDS:
+        print(f"⚠️ Unknown VECTOR_BACKEND '{backend}', using chroma.")
+        backend = "chroma"
+    if backend == "chroma" and not chromadb and np is not None:
+        backend = "numpy"
+    return backend
+
+def backend_available(backend=None):
+    backend = backend or get_vector_backend()
+    return (backend == "chroma" and chromadb is not None) or (backend == "numpy" and np is not None)
+
+_chroma_clients = {}
+
+def open_collection(db_path, name, backend=None):
+    """
+    Opens a vector collection with the configured backend (VECTOR_BACKEND=chroma|numpy).
+    Both return an object with the Chromadb collection API; embeddings are always
+    passed in explicitly by the caller.
+    """
+    backend = backend or get_vector_backend()
+    if backend == "numpy":
+        return NumpyVectorStore(os.path.join(db_path, "numpy", name))
+    key = os.path.abspath(db_path)
+    if key not in _chroma_clients:
+        _chroma_clients[key] = chromadb.PersistentClient(path=db_path)
+    # Embeddings are always passed in explicitly (see embedding_cache)
+    return _chroma_clients[key].get_or_create_collection(name=name, embedding_function=None)
+
+def collection_exists(db_path, name, backend=None):
+    """True if a collection may have been written (checked on disk, without opening a client)."""
+    backend = backend or get_vector_backend()
+    if backend == "numpy":
+        return os.path.isdir(os.path.join(db_path, "numpy", name))
+    return chromadb is not None and os.path.exists(os.path.join(db_path, "chroma.sqlite3"))
+
+def drop_collection(db_path, name, backend=None):
+    """Deletes a collection and its files (used to garbage-collect retired index generations)."""
+    backend = backend or get_vector_backend()
+    if backend == "numpy":
+        shutil.rmtree(os.path.join(db_path, "numpy", name), ignore_errors=True)
+        return
+    if chromadb is None or not os.path.exists(os.path.join(db_path, "chroma.sqlite3")):
+        return
+    key = os.path.abspath(db_path)
+    if key not in _chroma_clients:
+        _chroma_clients[key] = chromadb.PersistentClient(path=db_path)
+    try:
+        _chroma_clients[key].delete_collection(name)
+    except Exception:
+        pass  # never created (e.g. a lexical-only generation)